@@ -0,0 +1,436 @@
+"""Acquisizione in un processo separato: la seriale e il parsing non condividono il GIL con il rendering
+
+Il processo di acquisizione pubblica campioni e stato della connessione in un segmento di memoria
+condivisa; il renderer lo legge soltanto. Le scritture sono protette da un seqlock: il contatore
+di sequenza è dispari durante un aggiornamento e il lettore ripete la copia se è cambiato. Barriere
+di memoria tra contatore e dati impediscono ai processori ARM di riordinarli.
+Il processo resta attivo quando il renderer viene chiuso o riavviato.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from calibration import CalibrationCurve
+from protocol import PARSERS
+from sensor import SAMPLE_BUFFER_SIZE, SampleRing, SensorConnection
+
+# Nome del segmento di memoria condivisa
+SHARED_MEMORY_NAME = "alcoholpunch-samples"
+
+# Intestazione del segmento, seguita da timestamp e valori (float64) del buffer circolare
+SHARED_MAGIC = 0x4150534D454D3031
+SHARED_VERSION = 1
+HEADER = np.dtype([
+    ("magic", "<u8"), ("version", "<u4"), ("capacity", "<u4"), ("sequence", "<u8"), ("count", "<u8"),
+    ("heartbeat", "<f8"), ("pid", "<u4"), ("state", "u1"), ("pad", "V3"),
+    ("attempts", "<u8"), ("connections", "<u8"), ("samples", "<u8"), ("malformed", "<u8"),
+    ("out_of_range", "<u8"), ("errors", "<u8"), ("frames", "<u8"),
+    ("crc_errors", "<u8"), ("sequence_gaps", "<u8"), ("missing_frames", "<u8"), ("status", "S128"),
+])
+HEADER_SIZE = 256
+
+# Stati della connessione pubblicati (indici in SensorConnection)
+STATES = [SensorConnection.DISCONNECTED, SensorConnection.SEARCHING, SensorConnection.CONNECTED]
+
+# Intervallo di pubblicazione dello stato e del battito del processo di acquisizione (secondi)
+PUBLISH_INTERVAL = 0.1
+
+# Senza battito per questo tempo il processo di acquisizione è considerato terminato
+HEARTBEAT_TIMEOUT = 2.0
+
+# Lato renderer: intervallo di lettura dei campioni e attesa tra due tentativi di collegamento
+POLL_INTERVAL = 0.005
+ATTACH_RETRY = 1.0
+
+# Tentativi di copia prima di rinunciare per questo giro (scrittore in corso a ogni tentativo)
+SEQLOCK_RETRIES = 100
+
+# Lock usato solo come barriera di memoria (vedi memory_fence)
+FENCE_LOCK = threading.Lock()
+
+# Contatori della connessione copiati nell'intestazione
+COUNTERS = ["samples", "malformed", "out_of_range", "errors", "frames", "crc_errors",
+            "sequence_gaps", "missing_frames"]
+
+
+def memory_fence():
+    """Barriera completa: POSIX garantisce che acquisire e rilasciare un lock sincronizzi la memoria
+    (sem_wait/sem_post, pthread_mutex_*), quindi gli accessi prima e dopo non vengono riordinati"""
+    with FENCE_LOCK:
+        pass
+
+
+def segment_size(capacity):
+    return HEADER_SIZE + 2 * capacity * 8
+
+
+def attach_segment(name):
+    """Si collega a un segmento esistente senza diventarne responsabile"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        # Prima di Python 3.13 anche chi si collega registra il segmento e lo cancellerebbe all'uscita
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedLayout:
+    """Viste NumPy su intestazione e buffer circolare di un segmento"""
+
+    def __init__(self, segment):
+        self.segment = segment
+        self.header = np.ndarray((), dtype=HEADER, buffer=segment.buf)
+        capacity = int(self.header["capacity"])
+        self.timestamps = np.ndarray(capacity, dtype=np.float64, buffer=segment.buf, offset=HEADER_SIZE)
+        self.values = np.ndarray(capacity, dtype=np.float64, buffer=segment.buf,
+                                 offset=HEADER_SIZE + capacity * 8)
+
+    def alive(self):
+        """Il processo di acquisizione ha pubblicato di recente ed è ancora in esecuzione"""
+        header = self.header
+        return (int(header["magic"]) == SHARED_MAGIC and int(header["version"]) == SHARED_VERSION
+                and time.monotonic() - float(header["heartbeat"]) < HEARTBEAT_TIMEOUT
+                and process_alive(int(header["pid"])))
+
+    def close(self):
+        # Le viste vanno rilasciate prima di chiudere la mappatura
+        self.header = self.timestamps = self.values = None
+        self.segment.close()
+
+
+class SharedSampleRing(SampleRing):
+    """Buffer circolare in memoria condivisa, lato processo di acquisizione (unico scrittore).
+    SerialReader lo usa come un SampleRing; ogni scrittura è racchiusa nel seqlock."""
+
+    def __init__(self, name=SHARED_MEMORY_NAME, capacity=SAMPLE_BUFFER_SIZE):
+        self.segment = self.create_segment(name, capacity)
+        self.capacity = capacity
+        header = np.ndarray((), dtype=HEADER, buffer=self.segment.buf)
+        header["capacity"] = capacity
+        header["version"] = SHARED_VERSION
+        header["pid"] = os.getpid()
+        header["heartbeat"] = time.monotonic()
+        header["magic"] = SHARED_MAGIC
+        del header
+        self.layout = SharedLayout(self.segment)
+        self.header = self.layout.header
+        self.timestamps = self.layout.timestamps
+        self.values = self.layout.values
+        # Nessuno legge con snapshot() da questo lato: le perdite le conta il renderer
+        self.overruns = 0
+        # Serializza le scritture dei thread del processo (lettore seriale e pubblicazione dello stato)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def create_segment(name, capacity):
+        """Crea il segmento; uno lasciato da un processo terminato viene sostituito"""
+        try:
+            return shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        except FileExistsError:
+            pass
+        existing = attach_segment(name)
+        try:
+            layout = SharedLayout(existing)
+            running = layout.alive()
+            layout.close()
+        except (TypeError, ValueError):
+            # Segmento troppo piccolo o di un'altra versione
+            existing.close()
+            running = False
+        if running:
+            raise RuntimeError(f"Processo di acquisizione già in esecuzione su {name}")
+        # Collegamento registrato: unlink() lo toglie di nuovo dal resource tracker
+        stale = shared_memory.SharedMemory(name=name)
+        stale.unlink()
+        stale.close()
+        return shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+
+    @property
+    def count(self):
+        return int(self.header["count"])
+
+    @count.setter
+    def count(self, value):
+        self.header["count"] = value
+
+    def extend(self, timestamps, values):
+        """Come SampleRing.extend, tra le due metà del seqlock"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+        with self.lock:
+            self.header["sequence"] += 1
+            memory_fence()
+            start = (self.count + n - len(values)) % self.capacity
+            first = min(len(values), self.capacity - start)
+            self.timestamps[start:start + first] = timestamps[:first]
+            self.values[start:start + first] = values[:first]
+            if first < len(values):
+                self.timestamps[:len(values) - first] = timestamps[first:]
+                self.values[:len(values) - first] = values[first:]
+            self.count += n
+            memory_fence()
+            self.header["sequence"] += 1
+
+    def push(self, timestamp, value):
+        self.extend([timestamp], [value])
+
+    def publish(self, connection):
+        """Copia stato, contatori e testo di stato della connessione; aggiorna il battito"""
+        status = connection.status_text().encode("utf-8")
+        stats = connection.stats()
+        with self.lock:
+            self.header["sequence"] += 1
+            memory_fence()
+            self.header["state"] = STATES.index(connection.state)
+            self.header["attempts"] = connection.attempts
+            self.header["connections"] = connection.connections
+            for key in COUNTERS:
+                self.header[key] = stats.get(key, 0)
+            self.header["status"] = status
+            self.header["heartbeat"] = time.monotonic()
+            memory_fence()
+            self.header["sequence"] += 1
+
+    def close(self):
+        """Rimuove il segmento: i renderer collegati lo vedono fermo e attendono il successivo"""
+        self.header = self.timestamps = self.values = None
+        self.layout.close()
+        self.segment.unlink()
+
+
+class AcquisitionClient:
+    """Sorgente di campioni del renderer: copia nel proprio buffer circolare quelli pubblicati dal
+    processo di acquisizione. Si ricollega da sola se il processo viene riavviato; con command
+    avvia il processo (in una sessione separata, così sopravvive al renderer) se non è attivo.
+    on_state riceve True/False a ogni cambio di connessione, come per SensorConnection."""
+
+    def __init__(self, ring, name=SHARED_MEMORY_NAME, command=None, on_state=None):
+        self.ring = ring
+        self.name = name
+        self.command = command
+        self.on_state = on_state
+        self.layout = None
+        self.process = None
+        self.since = 0
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+
+        # Ultima copia coerente dell'intestazione
+        self.header = np.zeros((), dtype=HEADER)
+
+        # Contatori lato renderer
+        self.received = 0
+        self.overruns = 0
+        self.retries = 0
+        self.attaches = 0
+
+    @property
+    def connected(self):
+        return self.layout is not None and STATES[int(self.header["state"])] == SensorConnection.CONNECTED
+
+    def start(self):
+        if self.command and not self.attach():
+            self.process = subprocess.Popen(self.command, start_new_session=True)
+            print(f"Processo di acquisizione avviato (pid {self.process.pid})")
+        elif self.layout and self.on_state:
+            # Già collegato: run() segnala solo i cambi, lo stato iniziale va comunicato qui
+            self.on_state(self.connected)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ferma solo la lettura: il processo di acquisizione resta attivo"""
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.detach()
+
+    def attach(self):
+        """Si collega al segmento se il processo di acquisizione è attivo; True se collegato"""
+        try:
+            segment = attach_segment(self.name)
+        except FileNotFoundError:
+            return False
+        try:
+            layout = SharedLayout(segment)
+        except (TypeError, ValueError):
+            segment.close()
+            return False
+        if not layout.alive():
+            layout.close()
+            return False
+        self.layout = layout
+        self.attaches += 1
+        # Si parte dai campioni nuovi: quelli precedenti appartengono a un altro renderer
+        self.since = int(layout.header["count"])
+        self.header = layout.header.copy()
+        return True
+
+    def detach(self):
+        if self.layout:
+            self.layout.close()
+            self.layout = None
+
+    def read(self):
+        """Copia coerente (seqlock) dei campioni dopo since e dell'intestazione; None se lo
+        scrittore era sempre a metà di un aggiornamento"""
+        layout = self.layout
+        header = layout.header
+        capacity = len(layout.values)
+        for _ in range(SEQLOCK_RETRIES):
+            sequence = int(header["sequence"])
+            if sequence & 1:
+                self.retries += 1
+                time.sleep(0)
+                continue
+            memory_fence()
+            snapshot = header.copy()
+            count = int(snapshot["count"])
+            since = max(self.since, count - capacity)
+            start = since % capacity
+            end = start + count - since
+            if end <= capacity:
+                timestamps = layout.timestamps[start:end].copy()
+                values = layout.values[start:end].copy()
+            else:
+                wrap = end - capacity
+                timestamps = np.concatenate((layout.timestamps[start:], layout.timestamps[:wrap]))
+                values = np.concatenate((layout.values[start:], layout.values[:wrap]))
+            memory_fence()
+            if int(header["sequence"]) == sequence:
+                return snapshot, since, timestamps, values
+            self.retries += 1
+        return None
+
+    def poll(self):
+        """Un giro di lettura: False se il processo di acquisizione non risponde più"""
+        copy = self.read()
+        if copy is None:
+            return True
+        connected = self.connected
+        self.header, since, timestamps, values = copy
+        if self.on_state and self.connected != connected:
+            self.on_state(self.connected)
+        self.overruns += since - self.since
+        self.since = since + len(values)
+        if len(values):
+            self.received += len(values)
+            self.ring.extend(timestamps, values)
+        return self.layout.alive()
+
+    def run(self):
+        while self.running:
+            if self.layout is None:
+                if not self.attach():
+                    self.wakeup.wait(ATTACH_RETRY)
+                    continue
+                if self.on_state and self.connected:
+                    self.on_state(True)
+            if not self.poll():
+                print("Processo di acquisizione non attivo - in attesa del riavvio")
+                connected = self.connected
+                self.detach()
+                if self.on_state and connected:
+                    self.on_state(False)
+                continue
+            self.wakeup.wait(POLL_INTERVAL)
+
+    def status_text(self):
+        if self.layout is None:
+            return "Processo di acquisizione non attivo"
+        return self.header["status"].item().decode("utf-8", errors="ignore")
+
+    def stats(self):
+        """Contatori del processo di acquisizione più le perdite nella copia verso il renderer"""
+        stats = {key: int(self.header[key]) for key in COUNTERS}
+        stats["dropped"] = stats["out_of_range"] + self.overruns + self.ring.overruns
+        stats["connections"] = int(self.header["connections"])
+        return stats
+
+
+def acquisition_command(name=SHARED_MEMORY_NAME, ports=None, baud_rates=None, protocol="auto",
+                        calibration_file=None, device=None):
+    """Riga di comando per avviare questo modulo con le stesse opzioni seriali del renderer"""
+    command = [sys.executable, os.path.abspath(__file__), "--name", name, "--protocol", protocol]
+    for port in ports or []:
+        command += ["--port", port]
+    for baud_rate in baud_rates or []:
+        command += ["--baud", str(baud_rate)]
+    if calibration_file:
+        command += ["--calibration", os.path.abspath(calibration_file)]
+    if device:
+        command += ["--device", device]
+    return command
+
+
+def parse_args():
+    """Opzioni da riga di comando"""
+    parser = argparse.ArgumentParser(description="Processo di acquisizione dal sensore in memoria condivisa")
+    parser.add_argument("--name", default=SHARED_MEMORY_NAME, help="nome del segmento di memoria condivisa")
+    parser.add_argument("--port", action="append", dest="ports", help="porta seriale da provare (ripetibile)")
+    parser.add_argument("--baud", action="append", type=int, dest="baud_rates", help="baud rate da provare (ripetibile)")
+    parser.add_argument("--protocol", choices=sorted(PARSERS), default="auto", help="protocollo seriale")
+    parser.add_argument("--calibration", metavar="FILE",
+                        help="curva di calibrazione: fissa solo il fondo scala dei conteggi ADC accettati")
+    parser.add_argument("--device", help="sensore da usare nel file di calibrazione")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    curve = CalibrationCurve.load(args.calibration, args.device) if args.calibration else None
+    max_value = curve.max_raw if curve else 2.5
+    try:
+        ring = SharedSampleRing(args.name)
+    except RuntimeError as e:
+        print(e)
+        raise SystemExit(1)
+
+    # SIGTERM (systemd, kill) chiude come Ctrl+C: il segmento viene rimosso
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    connection = SensorConnection(ring, max_value, args.ports, args.baud_rates, protocol=args.protocol)
+    connection.start()
+    print(f"Acquisizione su /dev/shm/{args.name} (pid {os.getpid()}) - Ctrl+C per uscire")
+    try:
+        while True:
+            ring.publish(connection)
+            time.sleep(PUBLISH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.stop()
+        stats = connection.stats()
+        ring.close()
+        print(f"Acquisizione: {stats['samples']} campioni, {stats['dropped']} persi, "
+              f"{stats['connections']} connessioni")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,994 @@
+"""Benchmark headless delle funzioni di disegno di AlcoholMeter
+
+Uso: python benchmark.py [--frames N] [--json FILE] [--baseline FILE] [nome ...]
+
+Lo scenario "states" è deterministico (tempo simulato, input scriptato, seme fisso): con --json
+scrive i risultati in un file e con --baseline termina con codice 1 se FPS o allocazioni
+peggiorano rispetto a un'esecuzione precedente.
+
+Alcuni benchmark sono anche verifiche (il progetto non ha una suite di test): "allocations" fallisce
+se a regime un frame crea una Surface, "quality" se il governatore non scende di livello. Le
+verifiche fallite sono elencate come ERRORE alla fine e il codice di uscita è 1.
+"""
+import os
+
+# Driver SDL senza finestra: il benchmark gira anche su CI e via SSH
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import multiprocessing
+import math
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import acquisition
+import filters
+import game
+import inputs
+import profiler
+import protocol
+import recording
+import results
+import sensor
+import simulator
+import stats
+
+
+# Le misure confrontabili tra esecuzioni usano sempre gli effetti completi (niente governatore)
+FULL_QUALITY = game.QUALITY_TIERS[0].name
+
+
+def make_app(state=None, value=0.0):
+    """Crea un AlcoholMeter pronto per il benchmark nello stato richiesto"""
+    app = game.AlcoholMeter(record_file=None, results_file=None, quality=FULL_QUALITY)
+    if state is not None:
+        app.current_state = state
+    app.current_value = value
+    app.target_value = value
+    app.max_reached_value = value
+    return app
+
+
+def measure(fn, frames):
+    """Esegue fn per N frame e restituisce il tempo medio in millisecondi"""
+    fn()  # riscaldamento: costruisce eventuali cache
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def report(name, before, after):
+    """Stampa il confronto prima/dopo"""
+    gain = before / after if after > 0 else float("inf")
+    print(f"{name:<24} prima: {before:7.3f} ms/frame   dopo: {after:7.3f} ms/frame   (x{gain:.1f})")
+
+
+# --- Implementazioni originali, mantenute solo per il confronto ---
+
+def legacy_draw_background(app):
+    """draw_background originale: 768 linee e overlay SRCALPHA a ogni frame"""
+    for y in range(game.SCREEN_HEIGHT):
+        ratio = y / game.SCREEN_HEIGHT
+        r = int(20 + ratio * 20)
+        g = int(25 + ratio * 25)
+        b = int(40 + ratio * 30)
+        pygame.draw.line(app.screen, (r, g, b), (0, y), (game.SCREEN_WIDTH, y))
+
+    if app.current_value > 1.0 and app.current_state in [app.STATE_READING, app.STATE_RESULT]:
+        pulse = abs(math.sin(app.pulse_time)) * 30
+        overlay = pygame.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT), pygame.SRCALPHA)
+        color = (*app.get_status_color()[:3], int(pulse))
+        overlay.fill(color)
+        app.screen.blit(overlay, (0, 0))
+
+
+def legacy_draw_gauge(app):
+    """draw_gauge originale: trigonometria, render dei numeri e glow SRCALPHA a ogni frame"""
+    glow_radius = app.radius + 30
+    glow_surface = pygame.Surface((glow_radius * 2, glow_radius * 2), pygame.SRCALPHA)
+    glow_color = (*app.get_status_color()[:3], 50 + app.glow_intensity)
+    pygame.draw.arc(glow_surface, glow_color, (0, 0, glow_radius * 2, glow_radius * 2), 0, math.pi, 20)
+    app.screen.blit(glow_surface, (app.center_x - glow_radius, app.center_y - glow_radius))
+
+    gauge_rect = pygame.Rect(app.center_x - app.radius, app.center_y - app.radius, app.radius * 2, app.radius * 2)
+    pygame.draw.arc(app.screen, game.DARK_GRAY, gauge_rect, 0, math.pi, 15)
+    pygame.draw.arc(app.screen, game.BLACK, gauge_rect, 0, math.pi, 8)
+
+    left_x = app.center_x - app.radius
+    right_x = app.center_x + app.radius
+    pygame.draw.line(app.screen, game.DARK_GRAY, (left_x, app.center_y), (left_x + 15, app.center_y), 8)
+    pygame.draw.line(app.screen, game.DARK_GRAY, (right_x - 15, app.center_y), (right_x, app.center_y), 8)
+
+    for i in range(11):
+        angle = math.radians(180 - (i * 18))
+        value = i * 0.25
+        if value < 0.5:
+            color = game.GREEN
+        elif value < 1.5:
+            color = game.YELLOW
+        elif value < 2.0:
+            color = game.ORANGE
+        else:
+            color = game.RED
+
+        if math.sin(angle) >= 0:
+            start_x = app.center_x + math.cos(angle) * (app.radius - 40)
+            start_y = app.center_y - math.sin(angle) * (app.radius - 40)
+            end_x = app.center_x + math.cos(angle) * (app.radius - 15)
+            end_y = app.center_y - math.sin(angle) * (app.radius - 15)
+            pygame.draw.line(app.screen, color, (start_x, start_y), (end_x, end_y), 5)
+
+            if i % 2 == 0:
+                text = app.text.font(*game.FONT_SMALL).render(f"{value:.1f}", True, game.WHITE)
+                text_x = app.center_x + math.cos(angle) * (app.radius - 60) - text.get_width() // 2
+                text_y = app.center_y - math.sin(angle) * (app.radius - 60) - text.get_height() // 2
+                app.screen.blit(text, (text_x, text_y))
+
+
+def legacy_draw_needle(app):
+    """draw_needle originale: glow su una Surface SRCALPHA grande quanto lo schermo"""
+    angle_rad = math.radians(max(0, min(180, app.needle_angle)))
+    needle_length = app.radius - 50
+
+    tip_x = app.center_x + math.cos(angle_rad) * needle_length
+    tip_y = app.center_y - math.sin(angle_rad) * needle_length
+    base_x = app.center_x + math.cos(angle_rad) * 40
+    base_y = app.center_y - math.sin(angle_rad) * 40
+    perp_angle = angle_rad - math.pi / 2
+    arrow_points = [
+        (tip_x, tip_y),
+        (base_x + math.cos(perp_angle) * 10, base_y + math.sin(perp_angle) * 10),
+        (base_x - math.cos(perp_angle) * 10, base_y - math.sin(perp_angle) * 10),
+    ]
+    needle_color = app.get_status_color()
+
+    glow_surface = pygame.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT), pygame.SRCALPHA)
+    for i in range(5):
+        glow_color = (*needle_color[:3], 30 - i * 5)
+        expanded_points = []
+        for px, py in arrow_points:
+            dx = px - app.center_x
+            dy = py - app.center_y
+            length = math.sqrt(dx * dx + dy * dy)
+            expansion = i * 1.5
+            expanded_points.append((px + (dx / length) * expansion, py + (dy / length) * expansion))
+        pygame.draw.polygon(glow_surface, glow_color, expanded_points)
+    app.screen.blit(glow_surface, (0, 0))
+
+    pygame.draw.polygon(app.screen, needle_color, arrow_points)
+    pygame.draw.polygon(app.screen, game.WHITE, arrow_points, 2)
+    pygame.draw.circle(app.screen, needle_color, (app.center_x, app.center_y), 12)
+    pygame.draw.circle(app.screen, game.WHITE, (app.center_x, app.center_y), 6)
+
+
+class LegacyParticle:
+    """ParticleEffect originale: un oggetto e una Surface SRCALPHA per particella"""
+
+    def __init__(self, x, y, color, speed=2):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.life = 255
+        self.size = random.randint(2, 5)
+        self.vel_x = random.uniform(-1, 1) * speed
+        self.vel_y = random.uniform(-2, -0.5) * speed
+
+    def update(self):
+        self.x += self.vel_x
+        self.y += self.vel_y
+        self.life -= 3
+        self.size = max(1, self.size - 0.1)
+        return self.life > 0
+
+    def draw(self, screen):
+        if self.life > 0:
+            temp_surface = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
+            pygame.draw.circle(
+                temp_surface, (*self.color[:3], self.life), (self.size, self.size), int(self.size)
+            )
+            screen.blit(temp_surface, (self.x - self.size, self.y - self.size))
+
+
+class MemorySerial:
+    """Porta seriale finta che restituisce dati preparati in memoria"""
+
+    def __init__(self, data, chunk=4096):
+        self.data = memoryview(data)
+        self.position = 0
+        self.chunk = chunk
+        # Chiamata quando i dati finiscono (es. per fermare il lettore)
+        self.on_eof = None
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk, len(self.data) - self.position)
+
+    def read(self, size=1):
+        if self.position >= len(self.data) and self.on_eof:
+            self.on_eof()
+        chunk = bytes(self.data[self.position:self.position + min(size, self.chunk)])
+        self.position += len(chunk)
+        return chunk
+
+
+# Scenario deterministico: livelli di BAC letti (uno per sessione), seme e campioni/s del sensore finto
+SCENARIO_LEVELS = (0.3, 1.2, 2.3)
+SCENARIO_SEED = 1234
+SCENARIO_RATE = 500
+
+# Avvio misurato in processi separati: ripetizioni e risultati già salvati nell'archivio
+STARTUP_RUNS = 5
+STARTUP_RESULTS = 50_000
+
+# Processo figlio del benchmark di avvio: stampa come ultima riga gli istanti (time.time) delle fasi
+STARTUP_SCRIPT = """
+import json, sys, time
+import game
+imported = time.time()
+app = game.AlcoholMeter(record_file=sys.argv[1], results_file=sys.argv[2])
+created = time.time()
+app.step(force_render=True)
+first_frame = time.time()
+while not app.startup.done:
+    app.step(force_render=True)
+ready = time.time()
+app.cleanup()
+print(json.dumps({"imported": imported, "created": created, "first_frame": first_frame, "ready": ready}))
+"""
+
+# Controlli falliti durante i benchmark: il processo termina con codice 1
+FAILURES = []
+
+# Tolleranza sul calo di FPS rispetto alla baseline (frazione)
+BASELINE_TOLERANCE = 0.15
+
+
+class ScriptedSensor:
+    """Sensore collegato finto: campioni sul tempo iniettato al livello deciso dallo scenario"""
+
+    def __init__(self, ring, clock, rate=SCENARIO_RATE, noise=0.01, seed=SCENARIO_SEED):
+        self.ring = ring
+        self.clock = clock
+        self.rate = rate
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.level = 0.0
+        self.last = None
+        self.samples = 0
+
+    @property
+    def connected(self):
+        return True
+
+    def start(self):
+        self.last = self.clock()
+
+    def stop(self):
+        pass
+
+    def feed(self):
+        """Scrive nel buffer i campioni maturati dall'ultima chiamata (nessun thread)"""
+        now = self.clock()
+        count = int((now - self.last) * self.rate)
+        if count:
+            timestamps = self.last + np.arange(1, count + 1) / self.rate
+            values = np.clip(self.level + self.rng.normal(0, self.noise, count), 0, None)
+            self.ring.extend(timestamps, values)
+            self.last = timestamps[-1]
+            self.samples += count
+
+    def status_text(self):
+        return "Sensore simulato (benchmark)"
+
+    def stats(self):
+        return {"samples": self.samples, "malformed": 0, "dropped": self.ring.overruns, "errors": 0,
+                "connections": 1, "frames": 0}
+
+
+class CountingSurface(pygame.Surface):
+    """pygame.Surface che conta le creazioni: sostituita a pygame.Surface durante lo scenario"""
+
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingSurface.created += 1
+        super().__init__(*args, **kwargs)
+
+
+def run_scenario(frames, levels=SCENARIO_LEVELS, seed=SCENARIO_SEED, trace=False, laps=1):
+    """Porta la macchina a stati in attesa, istruzioni, lettura (per ogni livello), risultato e
+    classifica, frames frame per stato a 60 Hz simulati; restituisce le misure per frame
+    (tempo, Surface create, testi renderizzati, byte allocati).
+
+    Con trace=True misura anche la memoria Python allocata in ogni frame (molto più lento).
+    Con laps > 1 lo scenario si ripete e si misura solo l'ultimo giro (cache a regime)."""
+    random.seed(seed)
+    clock = {"t": 0.0}
+    time_source = lambda: clock["t"]
+    app = game.AlcoholMeter(time_source=time_source, record_file=None, results_file=None, quality=FULL_QUALITY,
+                            sensor_factory=lambda ring: ScriptedSensor(ring, time_source, seed=seed))
+    source = app.sensor
+    app.stats = stats.ResultStats()  # classifica solo dello scenario
+    duration = frames * game.SIMULATION_DT
+    app.instructions_duration = app.reading_duration = app.result_duration = duration
+    app.leaderboard_duration = duration
+    app.attract_interval = float("inf")
+    names = app.state_names
+
+    measures = {}
+    peaks = []
+    pending = list(levels)
+    in_state = 0
+    previous = None
+    level = None
+    original_surface = pygame.Surface
+    pygame.Surface = CountingSurface
+    try:
+        while True:
+            state = app.current_state
+            in_state = in_state + 1 if state == previous else 1
+            previous = state
+            # Input scriptato: pulsante dopo frames frame di attesa, poi la classifica a fine scenario
+            if state == app.STATE_WAITING:
+                if len(measures.get(names[app.STATE_LEADERBOARD], ())) >= frames:
+                    laps -= 1
+                    if not laps:
+                        break
+                    measures.clear()
+                    peaks.clear()
+                    pending = list(levels)
+                    app.attract_interval = float("inf")
+                if in_state > frames:
+                    if pending:
+                        level = pending.pop(0)
+                        inputs.post_input(inputs.BUTTON, "benchmark")
+                    else:
+                        app.attract_interval = 0.0
+            source.level = level if state == app.STATE_READING else 0.0
+
+            key = names[state]
+            if state in (app.STATE_READING, app.STATE_RESULT):
+                key = f"{key}@{level}"
+            surfaces = CountingSurface.created
+            texts = app.text.misses
+            if trace:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter_ns()
+
+            clock["t"] += game.SIMULATION_DT
+            source.feed()
+            app.step(force_render=True)
+
+            elapsed = time.perf_counter_ns() - start
+            allocated = tracemalloc.get_traced_memory()[1] - base if trace else 0
+            measures.setdefault(key, []).append(
+                (elapsed, CountingSurface.created - surfaces, app.text.misses - texts, allocated))
+            if state == app.STATE_RESULT and app.state_timer >= app.result_duration - game.SIMULATION_DT:
+                if not peaks or peaks[-1][0] != level:
+                    peaks.append((level, round(app.max_reached_value, 6)))
+    finally:
+        pygame.Surface = original_surface
+        app.sensor.stop()
+    return measures, peaks
+
+
+def summarize(measures, traced):
+    """FPS, tempi e allocazioni per stato a partire dalle misure per frame"""
+    summary = {}
+    for key, rows in measures.items():
+        times = np.array([row[0] for row in rows]) / 1e6
+        summary[key] = {
+            "frames": len(rows),
+            "fps": round(1000 / times.mean(), 1),
+            "mean_ms": round(float(times.mean()), 4),
+            "p99_ms": round(float(np.percentile(times, 99)), 4),
+            "surfaces_per_frame": round(sum(row[1] + row[2] for row in rows) / len(rows), 3),
+        }
+        if traced:
+            summary[key]["alloc_kib_per_frame"] = round(sum(traced[key]) / len(traced[key]) / 1024, 2)
+    return summary
+
+
+def check_baseline(current, baseline, tolerance=BASELINE_TOLERANCE):
+    """Regressioni rispetto alla baseline: FPS sotto tolleranza o più allocazioni per frame"""
+    failures = []
+    for bench, entries in baseline.items():
+        for key, old in entries.items():
+            new = current.get(bench, {}).get(key)
+            if new is None:
+                continue
+            if "fps" in old and new["fps"] < old["fps"] * (1 - tolerance):
+                failures.append(f"{bench}/{key}: {new['fps']} FPS contro {old['fps']}")
+            if "surfaces_per_frame" in old and new["surfaces_per_frame"] > old["surfaces_per_frame"]:
+                failures.append(f"{bench}/{key}: {new['surfaces_per_frame']} superfici/frame "
+                                f"contro {old['surfaces_per_frame']}")
+            if "first_frame_ms" in old and new["first_frame_ms"] > old["first_frame_ms"] * (1 + tolerance):
+                failures.append(f"{bench}/{key}: primo frame in {new['first_frame_ms']} ms "
+                                f"contro {old['first_frame_ms']}")
+    return failures
+
+
+# --- Benchmark ---
+
+def bench_background(frames):
+    """Sfondo con effetto pulse attivo (valore sopra 1.0 durante la lettura)"""
+    app = make_app(value=1.8)
+    app.current_state = app.STATE_READING
+    app.pulse_time = 1.0
+
+    before = measure(lambda: legacy_draw_background(app), frames)
+    after = measure(app.draw_background, frames)
+    report("draw_background", before, after)
+
+
+def bench_particles(frames, per_frame=25):
+    """Regime stazionario con circa per_frame * 85 particelle vive"""
+    app = make_app()
+    cx, cy = app.center_x, app.center_y
+    legacy = []
+
+    def legacy_frame():
+        for _ in range(per_frame):
+            legacy.append(LegacyParticle(cx + random.randint(-50, 50), cy + random.randint(-30, 30), game.ORANGE))
+        legacy[:] = [p for p in legacy if p.update()]
+        for particle in legacy:
+            particle.draw(app.screen)
+
+    def pooled_frame():
+        app.particles.emit(per_frame, cx, cy, game.ORANGE)
+        app.particles.update()
+        app.particles.draw(app.screen)
+
+    for _ in range(90):  # porta entrambi i sistemi a regime
+        legacy_frame()
+        pooled_frame()
+
+    before = measure(legacy_frame, frames)
+    after = measure(pooled_frame, frames)
+    report(f"particelle ({len(app.particles)} vive)", before, after)
+
+
+def bench_gauge(frames):
+    """Tachimetro con glow in variazione come durante la lettura"""
+    app = make_app(value=1.2)
+    app.current_state = app.STATE_READING
+
+    def cycle(draw):
+        def frame():
+            app.glow_intensity = (app.glow_intensity + 5) % 105
+            draw()
+        return frame
+
+    before = measure(cycle(lambda: legacy_draw_gauge(app)), frames)
+    after = measure(cycle(app.draw_gauge), frames)
+    report("draw_gauge", before, after)
+
+
+def bench_needle(frames):
+    """Freccia in movimento (lettura) e ferma sul risultato"""
+    for state, label in (("STATE_READING", "lettura"), ("STATE_RESULT", "risultato")):
+        app = make_app(value=1.6)
+        app.current_state = getattr(app, state)
+        app.needle_angle = 60.0
+
+        def frame(draw):
+            def step():
+                if app.current_state == app.STATE_READING:
+                    # La freccia oscilla come durante una lettura reale
+                    app.pulse_time += 0.1
+                    app.needle_angle = 90 + 80 * math.sin(app.pulse_time * 0.3)
+                draw()
+            return step
+
+        before = measure(frame(lambda: legacy_draw_needle(app)), frames)
+        after = measure(frame(app.draw_needle), frames)
+        report(f"draw_needle ({label})", before, after)
+
+
+def bench_text(frames):
+    """Valore pulsante del risultato: Font creato a ogni frame contro cache LRU"""
+    app = make_app(value=1.7)
+    app.current_state = app.STATE_RESULT
+
+    def legacy_frame():
+        app.pulse_time += 0.1
+        scale = 1.0 + 0.3 * abs(math.sin(app.pulse_time * 3))
+        font = pygame.font.Font(game.DIGITAL_FONT if os.path.exists(game.DIGITAL_FONT) else None, int(96 * scale))
+        font.render(f"{app.max_reached_value:.2f}", True, app.get_status_color())
+        small = pygame.font.Font(None, 32)
+        small.render("‰ BAC", True, game.WHITE)
+
+    def cached_frame():
+        app.pulse_time += 0.1
+        scale = 1.0 + 0.3 * abs(math.sin(app.pulse_time * 3))
+        app.text.render(f"{app.max_reached_value:.2f}", (game.DIGITAL_FONT, int(96 * scale)), app.get_status_color())
+        app.text.render("‰ BAC", game.FONT_SMALL, game.WHITE)
+
+    before = measure(legacy_frame, frames)
+    after = measure(cached_frame, frames)
+    report("testo risultato", before, after)
+    print(f"{'':<24} cache testo: {app.text.stats()}")
+
+
+def bench_dirty(frames):
+    """Schermate di attesa e istruzioni: flip completo contro rettangoli sporchi"""
+    for state, label in (("STATE_WAITING", "attesa"), ("STATE_INSTRUCTIONS", "istruzioni")):
+        results = {}
+        for dirty in (False, True):
+            app = game.AlcoholMeter(dirty_rects=dirty, record_file=None, results_file=None, quality=FULL_QUALITY)
+            app.current_state = getattr(app, state)
+
+            def frame():
+                app.waiting_pulse += 0.05
+                app.state_timer = (app.state_timer + game.SIMULATION_DT) % app.instructions_duration
+                if dirty:
+                    app.draw_dirty_frame()
+                else:
+                    app.draw_frame()
+
+            frame()
+            app.pixels_pushed = app.frames_presented = 0
+            elapsed = measure(frame, frames)
+            results[dirty] = (elapsed, app.pixels_pushed / app.frames_presented)
+
+        report(f"dirty rect ({label})", results[False][0], results[True][0])
+        print(f"{'':<24} pixel/frame  prima: {results[False][1]:9.0f}   dopo: {results[True][1]:9.0f}")
+
+
+def bench_cpu(frames):
+    """Utilizzo CPU per stato del loop reale (idle compreso), qualche secondo per stato"""
+    app = game.AlcoholMeter(idle_timeout=2.0, record_file=None, results_file=None, quality=FULL_QUALITY)
+    app.cleanup = lambda: None
+
+    def driver():
+        time.sleep(4.0)  # attesa: 2 s attivi e 2 s in idle
+        inputs.post_input(inputs.BUTTON, "benchmark")  # istruzioni, lettura e risultato (5 s ciascuno)
+        time.sleep(app.instructions_duration + 1.0)
+        app.target_value = 1.8
+        time.sleep(app.reading_duration + app.result_duration)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    threading.Thread(target=driver, daemon=True).start()
+    app.run()
+    pygame.init()  # run() chiude pygame all'uscita
+
+    for key, (cpu_percent, seconds) in app.scheduler.cpu_report().items():
+        name = app.state_names.get(key, key)
+        print(f"{'CPU ' + name:<24} {cpu_percent:6.1f}%  su {seconds:5.1f}s")
+
+
+def bench_serial(frames, samples=200_000):
+    """Throughput del parser ASCII e del buffer circolare, senza hardware"""
+    rng = np.random.default_rng(0)
+    lines = [f"{v:.3f}" for v in rng.uniform(0, 2.5, samples)]
+    for i in range(0, samples, 1000):
+        lines[i] = "garbage"
+    data = ("\n".join(lines) + "\n").encode()
+
+    port = MemorySerial(data)
+    reader = sensor.SerialReader(port, sensor.SampleRing(), 2.5)
+    port.on_eof = reader.stop
+    reader.running = True
+
+    start = time.perf_counter()
+    reader.run()
+    elapsed = time.perf_counter() - start
+    print(f"{'seriale ASCII':<24} {reader.samples / elapsed:12,.0f} campioni/s   {reader.stats()}")
+
+
+def bench_protocol(frames, samples=200_000, chunk=4096):
+    """Throughput dei parser ASCII e binario sugli stessi campioni, a blocchi come dalla seriale"""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 2.5, samples)
+    ascii_data = ("\n".join(f"{v:.3f}" for v in values) + "\n").encode()
+    milli = np.rint(values * 1000).astype(np.uint16)
+    per_frame = protocol.MAX_FRAME_SAMPLES
+    frames_data = [protocol.encode_frame(seq, milli[i:i + per_frame], 2000)
+                   for seq, i in enumerate(range(0, samples, per_frame))]
+    # Un frame ogni 100 perso e uno ogni 250 corrotto: alimentano i contatori
+    lost = [frame for i, frame in enumerate(frames_data) if i % 100 != 99]
+    binary_data = b"".join(frame[:-1] + b"\x00" if i % 250 == 249 else frame for i, frame in enumerate(lost))
+
+    for name, data in (("ascii", ascii_data), ("binary", binary_data), ("auto", binary_data)):
+        parser = protocol.make_parser(name)
+        received = 0
+        start = time.perf_counter()
+        for i in range(0, len(data), chunk):
+            received += len(parser.feed(data[i:i + chunk])[0])
+        elapsed = time.perf_counter() - start
+        print(f"{'parser ' + name:<24} {received / elapsed:12,.0f} campioni/s  "
+              f"{len(data) / samples:4.1f} byte/campione   {parser.stats()}")
+
+
+def bench_replay(frames, sessions=200, rate=500):
+    """Registrazione di sessioni sintetiche e rilettura via mmap attraverso la pipeline:
+    i picchi sono deterministici (seme fisso) e servono da riferimento di regressione"""
+    model = simulator.BreathModel(rate, breath_interval=4.0, seed=0)
+    per_session = int(rate * 15)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.rec")
+        recorder = recording.SessionRecorder(path)
+        start = time.perf_counter()
+        for number in range(sessions):
+            t0 = number * 20.0
+            recorder.begin(t0, 1)
+            timestamps = t0 + np.arange(per_session) / rate
+            values = model.generate(per_session)
+            for i in range(0, per_session, rate // 60):
+                recorder.samples(timestamps[i:i + rate // 60], values[i:i + rate // 60])
+            recorder.end(t0 + 15.0, float(values.max()))
+        recorder.close()
+        written = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replay = recording.Recording(path)
+        peaks = []
+        for number in range(len(replay)):
+            pipeline = filters.SignalPipeline()
+            # Come durante la misura: linea di base ferma
+            pipeline.set_tracking(False)
+            pipeline.process(*replay.samples(number))
+            peaks.append(pipeline.peak)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        replay.close()
+
+    total = sessions * per_session
+    print(f"{'registrazione':<24} {total / written:12,.0f} campioni/s   {size / 1e6:.1f} MB")
+    print(f"{'riproduzione + filtri':<24} {total / elapsed:12,.0f} campioni/s   "
+          f"somma dei picchi {sum(peaks):.6f}")
+
+
+def bench_stats(frames, count=100_000):
+    """Ricostruzione delle statistiche da un archivio CSV e costo di un nuovo risultato"""
+    rng = np.random.default_rng(0)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.csv")
+        log = results.ResultsLog(path, queue_size=count + 1)
+        log.start()
+        for timestamp, peak in zip(now - np.arange(count)[::-1] * 2.0, rng.uniform(0, 2.5, count)):
+            log.append(results.Result(float(timestamp), float(peak), 5.0, 300))
+        log.close(timeout=30.0)
+
+        start = time.perf_counter()
+        rebuilt = stats.ResultStats.rebuild(results.read_results(path))
+        elapsed = time.perf_counter() - start
+    print(f"{'ricostruzione statistiche':<24} {count / elapsed:12,.0f} risultati/s   media {rebuilt.mean:.3f}")
+
+    start = time.perf_counter()
+    for peak in rng.uniform(0, 2.5, count):
+        rebuilt.add(results.Result(now, float(peak), 5.0, 300))
+    elapsed = time.perf_counter() - start
+    print(f"{'nuovo risultato':<24} {elapsed * 1e6 / count:12.2f} µs")
+
+
+def bench_graph(frames, rate=500):
+    """Curva del soffio: polilinea completa ridisegnata a ogni frame contro scorrimento incrementale"""
+    per_frame = rate // 60
+    rng = np.random.default_rng(0)
+    count = (frames + 2) * per_frame
+    timestamps = np.arange(count) / rate
+    values = np.clip(np.cumsum(rng.normal(0, 0.02, count)) + 1.0, 0, 2.5)
+    screen = pygame.display.get_surface() or pygame.display.set_mode((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    graph = game.BreathGraph()
+    rect = graph.rect
+    window = int(game.GRAPH_WINDOW * rate)
+
+    state = {"frame": 0}
+
+    def legacy():
+        end = (state["frame"] % frames + 1) * per_frame
+        start = max(0, end - window)
+        state["frame"] += 1
+        xs = rect.right - (end - np.arange(start, end)) * rect.width / window
+        ys = rect.bottom - values[start:end] / 2.5 * rect.height
+        pygame.draw.rect(screen, game.GRAPH_BACKGROUND, rect)
+        if end - start > 1:
+            pygame.draw.lines(screen, game.NEON_YELLOW, False, np.column_stack((xs, ys)).tolist())
+
+    def incremental():
+        i = state["frame"] % frames
+        if i == 0:
+            graph.reset()
+        state["frame"] += 1
+        graph.push(timestamps[i * per_frame:(i + 1) * per_frame], values[i * per_frame:(i + 1) * per_frame])
+        graph.draw(screen)
+
+    before = measure(legacy, frames)
+    state["frame"] = 0
+    after = measure(incremental, frames)
+    report("grafico del soffio", before, after)
+
+
+def bench_filters(frames, samples=200_000):
+    """Throughput della pipeline di filtri per diverse dimensioni di blocco"""
+    rng = np.random.default_rng(0)
+    timestamps = np.cumsum(rng.uniform(0.001, 0.003, samples))
+    values = np.clip(rng.normal(0.8, 0.05, samples), 0, None)
+    for batch in (8, 64, 1024):
+        pipeline = filters.SignalPipeline()
+        start = time.perf_counter()
+        for i in range(0, samples, batch):
+            pipeline.process(timestamps[i:i + batch], values[i:i + batch])
+        elapsed = time.perf_counter() - start
+        print(f"{'filtri (blocco ' + str(batch) + ')':<24} {samples / elapsed:12,.0f} campioni/s")
+
+
+def acquisition_writer(name, seconds, rate, block):
+    """Processo scrittore del benchmark: blocchi di campioni a cadenza fissa, come SerialReader"""
+    ring = acquisition.SharedSampleRing(name)
+    try:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            now = time.monotonic()
+            ring.extend(now - np.arange(block)[::-1] / rate, np.full(block, 0.5))
+            ring.header["heartbeat"] = now
+            time.sleep(block / rate)
+    finally:
+        ring.close()
+
+
+def bench_acquisition(frames, seconds=3.0, rate=5000, block=10):
+    """Campioni dal processo di acquisizione via memoria condivisa: persi, ritardo e ripetizioni del seqlock
+    (cadenza dieci volte quella del sensore)"""
+    name = f"alcoholpunch-bench-{os.getpid()}"
+    writer = multiprocessing.Process(target=acquisition_writer, args=(name, seconds, rate, block))
+    writer.start()
+    ring = sensor.SampleRing()
+    client = acquisition.AcquisitionClient(ring, name)
+    deadline = time.monotonic() + 5.0
+    while not client.attach() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    delays = []
+    seq = ring.count
+    while client.layout is not None and client.poll():
+        seq, timestamps, _ = ring.snapshot(seq)
+        if len(timestamps):
+            delays.append(time.monotonic() - timestamps[-1])
+        time.sleep(acquisition.POLL_INTERVAL)
+    client.detach()
+    writer.join()
+
+    p50, p99 = np.percentile(delays, [50, 99]) * 1000 if delays else (0.0, 0.0)
+    print(f"{'memoria condivisa':<24} {client.received:8,} campioni   {client.overruns} persi   "
+          f"ritardo p50 {p50:.2f} ms  p99 {p99:.2f} ms   {client.retries} ripetizioni")
+
+
+def bench_input(frames, presses=20):
+    """Latenza dal pulsante (evento accodato da un altro thread, come il callback GPIO) al primo
+    frame delle istruzioni a schermo, con il loop reale: attivo e in idle a frame statico"""
+    app = make_app()
+    while not app.startup.done:
+        app.step()
+    rng = random.Random(SCENARIO_SEED)
+    measured = {}
+    for name, idle_fps in (("attivo", None), ("idle", 0)):
+        if idle_fps is not None:
+            app.scheduler.idle_timeout = 0.0
+            app.scheduler.idle_fps = idle_fps
+        app.input_latency = profiler.Histogram()
+        for count in range(presses):
+            # Il pulsante conta solo in attesa: ogni pressione riparte dalla schermata iniziale
+            app.enter_state(app.STATE_WAITING)
+            threading.Timer(rng.uniform(0.05, 0.2), inputs.post_input, (inputs.BUTTON, "benchmark")).start()
+            while app.input_latency.count == count:
+                app.step()
+                app.scheduler.wait(app.current_state)
+        latency = app.input_latency
+        measured[name] = {"mean_ms": latency.mean / 1e6, "p99_ms": latency.percentile(0.99) / 1e6}
+        print(f"{'pulsante ' + name:<24} media {latency.mean / 1e6:6.2f} ms   "
+              f"p99 {latency.percentile(0.99) / 1e6:6.2f} ms   max {latency.max / 1e6:6.2f} ms   "
+              f"su {latency.count} pressioni")
+    return measured
+
+
+def bench_quality(frames, budget_fps=1000, timeout=15.0):
+    """Frame di lettura a 2.3 ‰ per ogni livello di qualità; poi il governatore con un budget
+    irraggiungibile, che deve scendere un livello alla volta fino al minimo"""
+    for tier in game.QUALITY_TIERS:
+        app = game.AlcoholMeter(record_file=None, results_file=None, quality=tier.name)
+        app.reading_duration = float("inf")
+        app.enter_state(app.STATE_READING)
+        app.target_value = 2.3
+        while not app.startup.done:
+            app.step(force_render=True)
+        ms = measure(lambda: app.step(force_render=True), frames)
+        print(f"{'qualità ' + tier.name:<24} {ms:8.3f} ms/frame   {1000 / ms:7.1f} FPS   "
+              f"{len(app.particles)} particelle")
+
+    app = game.AlcoholMeter(fps=budget_fps, record_file=None, results_file=None)
+    app.reading_duration = float("inf")
+    app.enter_state(app.STATE_READING)
+    app.target_value = 2.3
+    start = time.monotonic()
+    steps = []
+    while app.quality.index < len(app.quality.tiers) - 1 and time.monotonic() - start < timeout:
+        index = app.quality.index
+        app.step(force_render=True)
+        if app.quality.index != index:
+            steps.append(f"{app.quality.tier.name} a {time.monotonic() - start:.1f}s")
+    print(f"{'governatore':<24} {', '.join(steps) or 'nessun cambio'}")
+    if app.quality.index != len(app.quality.tiers) - 1:
+        FAILURES.append(f"governatore: livello {app.quality.tier.name} dopo {timeout:.0f}s a {budget_fps} FPS")
+
+
+def bench_profiler(frames):
+    """Frame completo in lettura con il profiler spento, acceso e con l'HUD visibile"""
+    app = make_app(value=1.5)
+    app.current_state = app.STATE_READING
+    app.reading_duration = float("inf")
+    clock = {"t": 0.0}
+    app.time_source = lambda: clock["t"]
+
+    def frame():
+        clock["t"] += 1 / 60
+        app.profiler.begin_frame()
+        app.update_simulation()
+        app.draw_frame()
+        app.profiler.end_frame(len(app.particles))
+
+    app.profiler.set_enabled(False)
+    disabled = measure(frame, frames)
+    app.profiler.set_enabled(True)
+    enabled = measure(frame, frames)
+    app.show_hud = True
+    hud = measure(frame, frames)
+    print(f"{'profiler spento':<24} {disabled:7.3f} ms/frame")
+    print(f"{'profiler acceso':<24} {enabled:7.3f} ms/frame   ({(enabled - disabled) * 1000:+.1f} µs)")
+    print(f"{'profiler + HUD':<24} {hud:7.3f} ms/frame   ({(hud - disabled) * 1000:+.1f} µs)")
+
+    # Costo di una singola misura
+    histogram = profiler.Histogram()
+    count = 200_000
+    start = time.perf_counter()
+    for ns in range(1000, 1000 + count):
+        histogram.record(ns)
+    elapsed = time.perf_counter() - start
+    print(f"{'registrazione istogramma':<24} {elapsed * 1e9 / count:7.0f} ns")
+
+
+def bench_allocations(frames):
+    """Nessuna Surface creata per frame a regime: secondo giro dello scenario, cache e arena già pronte"""
+    measures, _ = run_scenario(frames, laps=2)
+    failures = []
+    for key, rows in measures.items():
+        created = sum(row[1] for row in rows)
+        rendered = sum(row[2] for row in rows)
+        print(f"{key:<24} {created:6d} Surface create   {rendered:6d} testi renderizzati   su {len(rows)} frame")
+        if created:
+            failures.append(f"allocations/{key}: {created} Surface create a regime")
+    FAILURES.extend(failures)
+    return {key: {"surfaces_per_frame": round(sum(row[1] for row in rows) / len(rows), 3)}
+            for key, rows in measures.items()}
+
+
+def bench_startup(frames):
+    """Avvio a freddo in un processo nuovo: import, costruzione, primo frame e fine del caricamento"""
+    rng = np.random.default_rng(0)
+    now = time.time()
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        results_path = os.path.join(directory, "results.csv")
+        with open(results_path, "w", encoding="utf-8") as f:
+            f.write(",".join(results.RESULTS_HEADER) + "\n")
+            for i, peak in enumerate(rng.uniform(0, 2.5, STARTUP_RESULTS)):
+                stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now - (STARTUP_RESULTS - i) * 2))
+                f.write(f"{stamp},{peak:.3f},5.00,300\n")
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        for _ in range(STARTUP_RUNS):
+            spawned = time.time()
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, os.path.join(directory, "sessions.rec"), results_path],
+                cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            phases = json.loads(output.strip().splitlines()[-1])
+            timings.append({name: (moment - spawned) * 1000 for name, moment in phases.items()})
+
+    median = {name: float(np.median([t[name] for t in timings])) for name in timings[0]}
+    print(f"{'avvio (mediana di ' + str(STARTUP_RUNS) + ')':<24} import {median['imported']:7.1f} ms   "
+          f"costruzione {median['created'] - median['imported']:6.1f} ms")
+    print(f"{'':<24} primo frame {median['first_frame']:7.1f} ms   "
+          f"pronto {median['ready']:7.1f} ms ({STARTUP_RESULTS:,} risultati)")
+    return {"cold": {"first_frame_ms": round(median["first_frame"], 1), "ready_ms": round(median["ready"], 1)}}
+
+
+def bench_states(frames):
+    """Scenario deterministico su tutte le schermate: FPS e allocazioni per stato"""
+    measures, peaks = run_scenario(frames)
+    tracemalloc.start()
+    try:
+        traced, traced_peaks = run_scenario(frames, trace=True)
+    finally:
+        tracemalloc.stop()
+    if traced_peaks != peaks:
+        print(f"ATTENZIONE: scenario non deterministico ({peaks} contro {traced_peaks})")
+    summary = summarize(measures, {key: [row[3] for row in rows] for key, rows in traced.items()})
+    for key, entry in summary.items():
+        print(f"{key:<24} {entry['fps']:9.1f} FPS   p99 {entry['p99_ms']:7.3f} ms   "
+              f"{entry['surfaces_per_frame']:6.2f} superfici/frame   {entry['alloc_kib_per_frame']:8.2f} KiB/frame")
+    print(f"{'picchi':<24} {peaks}")
+    return summary
+
+
+BENCHMARKS = {
+    "background": bench_background,
+    "particles": bench_particles,
+    "gauge": bench_gauge,
+    "needle": bench_needle,
+    "text": bench_text,
+    "dirty": bench_dirty,
+    "serial": bench_serial,
+    "protocol": bench_protocol,
+    "replay": bench_replay,
+    "stats": bench_stats,
+    "graph": bench_graph,
+    "filters": bench_filters,
+    "acquisition": bench_acquisition,
+    "input": bench_input,
+    "quality": bench_quality,
+    "profiler": bench_profiler,
+    "states": bench_states,
+    "startup": bench_startup,
+    "allocations": bench_allocations,
+    "cpu": bench_cpu,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless di AlcoholMeter")
+    parser.add_argument("names", nargs="*", help=f"benchmark da eseguire tra {', '.join(BENCHMARKS)} (default: tutti)")
+    parser.add_argument("--frames", type=int, default=300, help="frame misurati per benchmark")
+    parser.add_argument("--json", metavar="FILE", help="scrive in FILE i risultati dei benchmark che ne producono")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="JSON di un'esecuzione precedente: codice di uscita 1 in caso di regressione")
+    parser.add_argument("--tolerance", type=float, default=BASELINE_TOLERANCE,
+                        help="calo di FPS ammesso rispetto alla baseline (frazione)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmark sconosciuti: {', '.join(unknown)}")
+
+    collected = {}
+    for name in args.names or BENCHMARKS:
+        result = BENCHMARKS[name](args.frames)
+        if result is not None:
+            collected[name] = result
+
+    pygame.quit()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"frames": args.frames, "seed": SCENARIO_SEED, "pygame": pygame.version.ver,
+                       "benchmarks": collected}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("frames") != args.frames:
+            print(f"Baseline con {baseline.get('frames')} frame per stato: confronto poco significativo")
+        failures = check_baseline(collected, baseline["benchmarks"], args.tolerance)
+        for failure in failures:
+            print(f"REGRESSIONE {failure}")
+        if not failures:
+            print("Nessuna regressione rispetto alla baseline")
+        FAILURES.extend(failures)
+    for failure in FAILURES:
+        print(f"ERRORE {failure}")
+    if FAILURES:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Calibrazione dei sensori MQ-3: conversione da conteggi ADC a ‰ BAC tramite tabella precalcolata"""
+import json
+
+import numpy as np
+
+from filters import EMAFilter
+
+# Risoluzione dell'ADC del sensore (Arduino: 10 bit)
+ADC_BITS = 10
+
+# Voci della tabella per ogni conteggio: la sottrazione della deriva produce valori frazionari
+LUT_OVERSAMPLE = 4
+
+# Costante di tempo (secondi) con cui si segue la lettura in aria pulita
+AMBIENT_TAU = 30.0
+
+
+class CalibrationCurve:
+    """Curva di un sensore: punti (conteggi ADC, ‰ BAC) e lettura in aria pulita"""
+
+    def __init__(self, points, clean_air=None, adc_bits=ADC_BITS, device="default"):
+        points = sorted(points)
+        self.raw_points = np.array([raw for raw, _ in points], dtype=np.float64)
+        self.bac_points = np.array([bac for _, bac in points], dtype=np.float64)
+        if len(points) < 2 or np.any(np.diff(self.raw_points) <= 0) or np.any(np.diff(self.bac_points) < 0):
+            raise ValueError(f"Curva di calibrazione non valida per il sensore {device}")
+        self.clean_air = float(self.raw_points[0] if clean_air is None else clean_air)
+        self.adc_bits = adc_bits
+        self.device = device
+        self.table = self.build_table()
+
+    @property
+    def max_raw(self):
+        return (1 << self.adc_bits) - 1
+
+    @classmethod
+    def load(cls, path, device=None):
+        """Carica la curva da JSON: {"adc_bits": 10, "devices": {"id": {"clean_air": .., "points": [[raw, bac], ..]}}}"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        devices = data.get("devices", {})
+        device = device or data.get("default_device") or next(iter(devices), None)
+        if device not in devices:
+            raise ValueError(f"Sensore {device} non presente in {path}")
+        entry = devices[device]
+        return cls(entry["points"], entry.get("clean_air"), data.get("adc_bits", ADC_BITS), device)
+
+    def build_table(self):
+        """Interpolazione lineare precalcolata su tutto il campo dell'ADC"""
+        raw = np.arange((self.max_raw + 1) * LUT_OVERSAMPLE, dtype=np.float64) / LUT_OVERSAMPLE
+        return np.interp(raw, self.raw_points, self.bac_points).astype(np.float32)
+
+    def convert(self, raw, drift=0.0):
+        """Conteggi ADC -> ‰ BAC con una lookup, al netto della deriva della linea di base"""
+        index = np.rint((np.asarray(raw, dtype=np.float64) - drift) * LUT_OVERSAMPLE)
+        np.clip(index, 0, len(self.table) - 1, out=index)
+        return self.table[index.astype(np.intp)]
+
+    def to_raw(self, bac):
+        """Conversione inversa (‰ BAC -> conteggi), usata dalla modalità demo"""
+        return float(np.interp(bac, self.bac_points, self.raw_points))
+
+
+class CalibrationStage:
+    """Primo stadio della pipeline: segue l'aria ambiente e converte i conteggi in ‰ BAC"""
+
+    def __init__(self, curve, tau=AMBIENT_TAU):
+        self.curve = curve
+        self.ambient = EMAFilter(tau)
+        self.tracking = True
+
+    @property
+    def drift(self):
+        """Scostamento della lettura in aria pulita rispetto alla curva (riscaldamento, temperatura)"""
+        if self.ambient.value is None:
+            return 0.0
+        return self.ambient.value - self.curve.clean_air
+
+    def reset(self):
+        self.ambient.reset()
+
+    def process(self, timestamps, values):
+        if len(values) == 0:
+            return values
+        if self.tracking:
+            self.ambient.process(timestamps, values)
+        elif self.ambient.last_time is not None:
+            self.ambient.last_time = float(timestamps[-1])
+        return self.curve.convert(values, self.drift).astype(np.float64)
@@ -0,0 +1,176 @@
+"""Filtri in streaming per i campioni del sensore, applicati a blocchi con NumPy"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Reiezione dei picchi: mediana mobile su SPIKE_WINDOW campioni, scarto oltre SPIKE_THRESHOLD ‰
+SPIKE_WINDOW = 5
+SPIKE_THRESHOLD = 0.5
+
+# Costante di tempo (secondi) della media esponenziale del valore mostrato
+SMOOTHING_TAU = 0.158
+
+# Costante di tempo (secondi) con cui la linea di base segue l'aria ambiente
+BASELINE_TAU = 10.0
+
+
+class SpikeFilter:
+    """Sostituisce con la mediana mobile i campioni che se ne discostano troppo"""
+
+    def __init__(self, window=SPIKE_WINDOW, threshold=SPIKE_THRESHOLD):
+        self.window = window
+        self.threshold = threshold
+        self.history = np.zeros(0)
+
+    def reset(self):
+        self.history = np.zeros(0)
+
+    def process(self, timestamps, values):
+        if len(values) == 0:
+            return values
+        history = self.history
+        if len(history) < self.window - 1:
+            # All'avvio la finestra viene riempita con il primo campione
+            history = np.concatenate((np.full(self.window - 1 - len(history), values[0]), history))
+        extended = np.concatenate((history, values))
+        # Mediana con partition: np.median importa numpy.ma alla prima chiamata (~80 ms all'avvio)
+        windows = np.partition(sliding_window_view(extended, self.window), self.window // 2, axis=1)
+        medians = windows[:, self.window // 2]
+        if self.window % 2 == 0:
+            medians = (medians + windows[:, :self.window // 2].max(axis=1)) / 2
+        self.history = extended[-(self.window - 1):]
+        return np.where(np.abs(values - medians) > self.threshold, medians, values)
+
+
+class EMAFilter:
+    """Media esponenziale con costante di tempo in secondi, per campioni a intervalli irregolari"""
+
+    # Blocchi su cui si usa la forma chiusa della ricorrenza (limita under/overflow)
+    CHUNK = 32
+
+    def __init__(self, tau=SMOOTHING_TAU):
+        self.tau = tau
+        self.value = None
+        self.last_time = None
+
+    def reset(self):
+        self.value = None
+        self.last_time = None
+
+    def process(self, timestamps, values):
+        n = len(values)
+        if n == 0:
+            return values
+        if self.value is None:
+            self.value = float(values[0])
+            self.last_time = float(timestamps[0])
+
+        dt = np.diff(timestamps, prepend=self.last_time)
+        np.maximum(dt, 0, out=dt)
+        # Peso del nuovo campione; il residuo minimo evita divisioni per zero nella forma chiusa
+        retain = np.maximum(np.exp(-dt / self.tau), 1e-6)
+        weight = 1 - retain
+
+        # y_i = r_i * y_{i-1} + (1 - r_i) * x_i, risolta per blocchi:
+        # y_i = W_i * (y_0 + sum_k (1 - r_k) x_k / W_k)  con  W_i = prod_{k<=i} r_k
+        output = np.empty(n)
+        y = self.value
+        for start in range(0, n, self.CHUNK):
+            end = min(start + self.CHUNK, n)
+            decay = np.cumprod(retain[start:end])
+            output[start:end] = decay * (y + np.cumsum(weight[start:end] * values[start:end] / decay))
+            y = output[end - 1]
+
+        self.value = float(y)
+        self.last_time = float(timestamps[-1])
+        return output
+
+
+class BaselineFilter:
+    """Sottrae la linea di base dell'aria ambiente, aggiornata solo quando tracking è attivo"""
+
+    def __init__(self, tau=BASELINE_TAU):
+        self.tracker = EMAFilter(tau)
+        self.tracking = True
+        self.baseline = 0.0
+
+    def reset(self):
+        self.tracker.reset()
+        self.baseline = 0.0
+
+    def process(self, timestamps, values):
+        if len(values) == 0:
+            return values
+        if self.tracking:
+            self.tracker.process(timestamps, values)
+            self.baseline = self.tracker.value
+        else:
+            # Durante la misura la linea di base resta ferma; il tracker riparte da qui
+            self.tracker.last_time = float(timestamps[-1])
+        return np.maximum(values - self.baseline, 0)
+
+
+class PeakDetector:
+    """Tiene il massimo del segnale filtrato e il suo istante"""
+
+    def __init__(self):
+        self.peak = 0.0
+        self.peak_time = None
+
+    def reset(self):
+        self.peak = 0.0
+        self.peak_time = None
+
+    def process(self, timestamps, values):
+        if len(values):
+            index = int(np.argmax(values))
+            if values[index] > self.peak:
+                self.peak = float(values[index])
+                self.peak_time = float(timestamps[index])
+        return values
+
+
+class SignalPipeline:
+    """Catena di filtri tra il buffer dei campioni e l'interfaccia.
+    Con uno stadio di calibrazione i campioni in ingresso sono conteggi ADC grezzi."""
+
+    def __init__(self, stages=None, calibration=None):
+        self.calibration = calibration
+        self.spike = SpikeFilter()
+        self.smoothing = EMAFilter()
+        self.baseline = BaselineFilter()
+        self.peak_detector = PeakDetector()
+        if stages is None:
+            stages = [self.spike, self.smoothing, self.baseline, self.peak_detector]
+            if calibration is not None:
+                stages.insert(0, calibration)
+        self.stages = stages
+        self.current = 0.0
+
+    def set_tracking(self, tracking):
+        """Attiva l'inseguimento dell'aria ambiente (solo quando nessuno sta soffiando)"""
+        self.baseline.tracking = tracking
+        if self.calibration is not None:
+            self.calibration.tracking = tracking
+
+    @property
+    def peak(self):
+        return self.peak_detector.peak
+
+    def reset_peak(self):
+        """Nuova misura: azzera il picco"""
+        self.peak_detector.reset()
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.current = 0.0
+
+    def process(self, timestamps, values):
+        """Filtra un blocco di campioni; restituisce i valori filtrati"""
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        for stage in self.stages:
+            values = stage.process(timestamps, values)
+        if len(values):
+            self.current = float(values[-1])
+        return values
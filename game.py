@@ -1,10 +1,25 @@
 import pygame
+import argparse
+import atexit
 import math
-import serial
-import threading
+from acquisition import AcquisitionClient, acquisition_command
+from calibration import CalibrationCurve, CalibrationStage
+from filters import SignalPipeline
+from inputs import (BUTTON, INPUT_EVENT, KEYBOARD_STEP, QUIT, SENSOR, TOGGLE_HUD, VALUE_DOWN, VALUE_RESET,
+                    VALUE_UP, GPIOInput, KeyboardInput, post_input)
+from profiler import PROFILE_EXPORT_INTERVAL, FrameProfiler, Histogram
+from protocol import PARSERS
+from recording import RECORDING_FILE, RecorderThread, ReplaySource, ScaledClock, SessionRecorder
+from results import RESULTS_FILE, Result, ResultsLog, read_results
+from stats import STATUS_LABELS, STATUS_THRESHOLDS, ResultStats, night_start, status_index
+from sensor import SampleRing, SensorConnection
 import time
 import random
 import colorsys
+import queue
+import threading
+from collections import OrderedDict, deque, namedtuple
+import numpy as np
 from typing import Optional
 
 # Importa GPIO per Raspberry Pi (con fallback per test su PC)
@@ -16,14 +31,94 @@ except ImportError:
     GPIO_AVAILABLE = False
     print("GPIO non disponibile - modalità test attivata (usa SPAZIO per simulare il pulsante)")
 
-# Inizializzazione pygame
-pygame.init()
-
 # Costanti
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
 FPS = 60
 
+# Frequenze di rendering per stato (limitate da --fps) e risparmio energetico:
+# dopo IDLE_TIMEOUT secondi senza input nella schermata di attesa si scende a IDLE_FPS
+# (0 = frame statico, ridisegnato solo al risveglio)
+WAITING_FPS = 30
+INSTRUCTIONS_FPS = 30
+LEADERBOARD_FPS = 15
+IDLE_TIMEOUT = 120.0
+IDLE_FPS = 2
+# Attesa massima di un frame statico prima dei controlli periodici (secondi)
+STATIC_FRAME_WAIT = 1.0
+
+# Modalità attrazione: dopo ATTRACT_INTERVAL secondi in attesa si mostra la classifica
+# della serata per LEADERBOARD_DURATION secondi
+ATTRACT_INTERVAL = 20.0
+LEADERBOARD_DURATION = 10.0
+
+# Simulazione a passo fisso, indipendente dalla frequenza di rendering
+SIMULATION_HZ = 60
+SIMULATION_DT = 1.0 / SIMULATION_HZ
+# Tempo massimo recuperato in un frame oltre al periodo previsto dallo stato
+# (evita la spirale dopo un blocco lungo senza perdere tempo nei frame idle)
+MAX_FRAME_TIME = 0.25
+
+# Costante di tempo (secondi) dell'interpolazione della freccia;
+# corrisponde al vecchio fattore 0.15 per frame a 60 FPS
+NEEDLE_SMOOTHING_TAU = 0.103
+
+# Numero massimo di particelle vive (buffer preallocati) e raggio iniziale massimo
+PARTICLE_CAPACITY = 4096
+PARTICLE_MAX_RADIUS = 5
+
+# Font digitale (se il file non è presente si usa il font di sistema)
+DIGITAL_FONT = "digital-7.ttf"
+
+# Font usati dall'interfaccia: (file, dimensione)
+FONT_SMALL = (None, 32)
+FONT_MEDIUM = (None, 48)
+FONT_LARGE = (None, 72)
+FONT_EXTRA_LARGE = (None, 120)
+FONT_DIGITAL_LARGE = (DIGITAL_FONT, 96)
+FONT_DIGITAL_MEDIUM = (DIGITAL_FONT, 64)
+FONT_HUD = (None, 24)
+
+# Numero massimo di testi renderizzati tenuti in cache
+TEXT_CACHE_SIZE = 512
+
+# Sprite della freccia: passo di quantizzazione dell'angolo (gradi) e sprite tenuti in cache
+NEEDLE_ANGLE_STEP = 0.5
+NEEDLE_CACHE_SIZE = 64
+
+# Superfici di lavoro: dimensioni arrotondate a multipli di SCRATCH_BUCKET pixel, così varianti
+# di pochi pixel (testo pulsante) riusano la stessa superficie; gli sprite della freccia cambiano
+# ingombro con l'angolo e usano fasce più larghe
+SCRATCH_BUCKET = 32
+NEEDLE_SPRITE_BUCKET = 64
+
+# Grafico del soffio: posizione e dimensione, secondi visibili durante la lettura
+GRAPH_RECT = (30, 540, 240, 150)
+GRAPH_WINDOW = 3.0
+
+# Avvio a fasi: tempo massimo (secondi) dedicato per frame alla preparazione delle cache
+WARMUP_FRAME_BUDGET = 0.008
+
+# Livelli di qualità del rendering, dal più ricco: strati di glow della freccia, glow dell'arco
+# del tachimetro e del risultato, particelle vive al massimo, pulse dello sfondo
+QualityTier = namedtuple("QualityTier", ["name", "needle_glow", "gauge_glow", "result_glow",
+                                         "max_particles", "background_pulse"])
+QUALITY_TIERS = [
+    QualityTier("alta", 5, True, True, PARTICLE_CAPACITY, True),
+    QualityTier("media", 3, True, True, 200, False),
+    QualityTier("bassa", 1, False, True, 60, False),
+    QualityTier("minima", 0, False, False, 0, False),
+]
+
+# Governatore della qualità: ultimi frame considerati (finestra mobile) e soglie sul p90 del tempo
+# di lavoro, in frazione del budget del frame; tra due cambi di livello passano almeno HOLD secondi
+# (più a lungo in salita)
+QUALITY_WINDOW = 60
+QUALITY_DOWN = 0.9
+QUALITY_UP = 0.5
+QUALITY_DOWN_HOLD = 1.0
+QUALITY_UP_HOLD = 5.0
+
 # Pin GPIO per il pulsante (modifica secondo il tuo setup)
 BUTTON_PIN = 18
 
@@ -41,64 +136,991 @@ NEON_GREEN = (57, 255, 20)
 NEON_RED = (255, 16, 16)
 NEON_YELLOW = (255, 255, 16)
 
-
-class ParticleEffect:
-    def __init__(self, x, y, color, speed=2):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.speed = speed
-        self.life = 255
-        self.size = random.randint(2, 5)
-        self.vel_x = random.uniform(-1, 1) * speed
-        self.vel_y = random.uniform(-2, -0.5) * speed
+# Colori delle categorie di stato (stats.STATUS_LABELS)
+STATUS_COLORS = (NEON_GREEN, NEON_YELLOW, ORANGE, NEON_RED)
+
+# Tema dello sfondo: colori del gradiente (alto, basso)
+BACKGROUND_THEME = ((20, 25, 40), (40, 50, 70))
+
+# Grafico del soffio: sfondo e righe delle soglie di stato
+GRAPH_BACKGROUND = (10, 12, 24)
+GRAPH_GRID = (45, 50, 70)
+
+# HUD delle prestazioni (F3): sfondo semitrasparente e margine interno
+HUD_BACKGROUND = (0, 0, 0, 170)
+HUD_PADDING = 8
+
+
+class SurfaceArena:
+    """Superfici di lavoro riutilizzate, per dimensione arrotondata: acquire() ne restituisce una
+    pulita nell'area richiesta, reset() a fine frame (dopo il flip) le rende di nuovo disponibili.
+    Le superfici sono più grandi del richiesto: si disegna da (0, 0) e si copia con area=."""
+
+    def __init__(self, template=None, bucket=SCRATCH_BUCKET):
+        self.template = template
+        self.bucket = bucket
+        self.free = {}
+        self.in_use = []
+        self.keys = {}
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, size, flags=pygame.SRCALPHA, keep=False):
+        """Superficie di almeno size pixel con (0, 0, *size) trasparente; keep=True la tiene
+        fino a release() invece che fino alla fine del frame"""
+        width, height = size
+        key = self.key(size, flags)
+        stack = self.find(key)
+        if stack:
+            surface = stack.pop()
+            self.reuses += 1
+        else:
+            surface = pygame.Surface(key[:2], flags, self.template) if self.template else pygame.Surface(key[:2], flags)
+            self.keys[id(surface)] = key
+            self.allocations += 1
+        surface.fill((0, 0, 0, 0), (0, 0, width, height))
+        if not keep:
+            self.in_use.append(surface)
+        return surface
+
+    def key(self, size, flags):
+        b = self.bucket
+        return -(-max(size[0], 1) // b) * b, -(-max(size[1], 1) // b) * b, flags
+
+    def find(self, key):
+        """Pila di superfici libere per key, altrimenti quella della più piccola che basta
+        (gli sprite cambiano ingombro con l'angolo); None se nessuna va bene"""
+        stack = self.free.get(key)
+        if stack:
+            return stack
+        fits = [k for k, free in self.free.items()
+                if free and k[2] == key[2] and k[0] >= key[0] and k[1] >= key[1]]
+        return self.free[min(fits, key=lambda k: k[0] * k[1])] if fits else None
+
+    def release(self, surface):
+        self.free.setdefault(self.keys[id(surface)], []).append(surface)
+
+    def reset(self):
+        """Fine del frame: le superfici di lavoro tornano disponibili"""
+        for surface in self.in_use:
+            self.release(surface)
+        self.in_use.clear()
+
+    def stats(self):
+        return {"allocations": self.allocations, "reuses": self.reuses,
+                "pooled": sum(len(stack) for stack in self.free.values())}
+
+
+class ParticleSystem:
+    """Particelle in buffer NumPy preallocati, con riuso degli slot liberi e sprite in cache"""
+
+    ALPHA_BUCKETS = 16
+
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vel_x = np.zeros(capacity, dtype=np.float32)
+        self.vel_y = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros(capacity, dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # Free-list a pila: gli slot liberi sono free[:free_count]
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = capacity
+
+        # Palette dei colori (indice salvato per particella) e cache degli sprite
+        self.palette = []
+        self.palette_index = {}
+        self.sprites = {}
+
+        # Generatore inizializzato da random, così random.seed() rende tutto deterministico
+        self.rng = np.random.default_rng(random.getrandbits(32))
+
+    def __len__(self):
+        return self.capacity - self.free_count
+
+    def clear(self):
+        """Elimina tutte le particelle"""
+        self.alive[:] = False
+        self.life[:] = 0
+        self.free[:] = np.arange(self.capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = self.capacity
+
+    def emit(self, count, x, y, color, speed=2, spread_x=50, spread_y=30):
+        """Crea fino a count particelle attorno a (x, y) riusando gli slot liberi"""
+        count = min(count, self.free_count)
+        if count <= 0:
+            return 0
+
+        color_index = self.color_index(color)
+        slots = self.free[self.free_count - count:self.free_count]
+        self.free_count -= count
+
+        rng = self.rng
+        self.x[slots] = x + rng.integers(-spread_x, spread_x + 1, count)
+        self.y[slots] = y + rng.integers(-spread_y, spread_y + 1, count)
+        self.vel_x[slots] = rng.uniform(-1, 1, count) * speed
+        self.vel_y[slots] = rng.uniform(-2, -0.5, count) * speed
+        self.size[slots] = rng.integers(2, PARTICLE_MAX_RADIUS + 1, count)
+        self.life[slots] = 255
+        self.color[slots] = color_index
+        self.alive[slots] = True
+        return count
+
+    def color_index(self, color):
+        """Indice del colore nella palette, aggiunto alla prima richiesta"""
+        if color not in self.palette_index:
+            self.palette_index[color] = len(self.palette)
+            self.palette.append(color)
+        return self.palette_index[color]
+
+    def warm(self, colors, max_radius=PARTICLE_MAX_RADIUS):
+        """Prepara gli sprite di ogni colore, raggio e fascia di alpha (all'avvio)"""
+        for color in colors:
+            color_index = self.color_index(color)
+            for radius in range(1, max_radius + 1):
+                for bucket in range(self.ALPHA_BUCKETS):
+                    self.get_sprite(color_index, radius, bucket)
 
     def update(self):
+        """Aggiorna tutte le particelle in un unico passo vettoriale"""
+        if self.free_count == self.capacity:
+            return
         self.x += self.vel_x
         self.y += self.vel_y
         self.life -= 3
-        self.size = max(1, self.size - 0.1)
-        return self.life > 0
+        self.size -= 0.1
+        np.maximum(self.size, 1, out=self.size)
+
+        # Restituisce alla free-list gli slot appena esauriti
+        dead = np.flatnonzero(self.alive & (self.life <= 0))
+        if len(dead):
+            self.alive[dead] = False
+            self.free[self.free_count:self.free_count + len(dead)] = dead
+            self.free_count += len(dead)
+
+    def get_sprite(self, color_index, radius, bucket):
+        """Sprite della particella dalla cache (colore, dimensione, fascia di alpha)"""
+        key = (color_index, radius, bucket)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            alpha = min(255, (bucket + 1) * 256 // self.ALPHA_BUCKETS)
+            sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(
+                sprite, (*self.palette[color_index][:3], alpha), (radius, radius), radius
+            )
+            self.sprites[key] = sprite
+        return sprite
 
     def draw(self, screen):
-        if self.life > 0:
-            alpha = max(0, self.life)
-            color_with_alpha = (*self.color[:3], alpha)
-            temp_surface = pygame.Surface(
-                (self.size * 2, self.size * 2), pygame.SRCALPHA
-            )
-            pygame.draw.circle(
-                temp_surface, color_with_alpha, (self.size, self.size), int(self.size)
+        """Disegna le particelle vive con un'unica chiamata blits"""
+        if self.free_count == self.capacity:
+            return
+        slots = np.flatnonzero(self.alive)
+        radius = self.size[slots].astype(np.int32)
+        bucket = (self.life[slots].astype(np.int32) * self.ALPHA_BUCKETS) >> 8
+        xs = (self.x[slots] - radius).tolist()
+        ys = (self.y[slots] - radius).tolist()
+        get_sprite = self.get_sprite
+        screen.blits(
+            [
+                (get_sprite(c, r, b), (px, py))
+                for c, r, b, px, py in zip(
+                    self.color[slots].tolist(), radius.tolist(), bucket.tolist(), xs, ys
+                )
+            ],
+            doreturn=False,
+        )
+
+
+class TextRenderer:
+    """Rendering del testo con cache LRU delle superfici e cache dei font per dimensione"""
+
+    def __init__(self, cache_size=TEXT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.font_loads = 0
+
+    def font(self, name, size):
+        """Restituisce il font richiesto, caricandolo dal disco una sola volta"""
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            try:
+                font = pygame.font.Font(name, size)
+            except (OSError, pygame.error):
+                # Fallback su font di sistema
+                font = pygame.font.Font(None, size)
+            self.font_loads += 1
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, font, color, antialias=True):
+        """Superficie del testo dalla cache; font è una coppia (file, dimensione)"""
+        name, size = font
+        key = (name, size, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.font(name, size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.cache_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        """Contatori della cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached": len(self.surfaces),
+            "fonts": len(self.fonts),
+            "font_loads": self.font_loads,
+        }
+
+
+class BackgroundLayer:
+    """Sfondo pre-renderizzato: il gradiente viene ricostruito solo se cambiano risoluzione o tema"""
+
+    def __init__(self, theme=BACKGROUND_THEME):
+        self.theme = theme
+        self.surface = None
+        self.key = None
+        # Superficie riutilizzata per l'effetto pulse (alpha per-superficie)
+        self.overlay = None
+        self.overlay_color = None
+
+    def set_theme(self, theme):
+        """Cambia il tema; il gradiente verrà ricostruito al prossimo disegno"""
+        if theme != self.theme:
+            self.theme = theme
+            self.invalidate()
+
+    def invalidate(self):
+        """Forza la ricostruzione dello sfondo"""
+        self.surface = None
+        self.key = None
+
+    def build(self, target):
+        """Renderizza il gradiente una sola volta nel formato della superficie di destinazione"""
+        width, height = target.get_size()
+        top, bottom = self.theme
+        # Una colonna di pixel calcolata con NumPy e allargata: 768 draw.line costavano ~40 ms all'avvio
+        ratio = np.arange(height) / height
+        colors = (np.array(top) + ratio[:, None] * (np.array(bottom) - np.array(top))).astype(np.uint8)
+        column = pygame.Surface((1, height), 0, target)
+        pygame.surfarray.blit_array(column, colors[None])
+        surface = pygame.transform.scale(column, (width, height))
+        self.surface = surface
+        self.key = (width, height, self.theme)
+        self.overlay = None
+        self.overlay_color = None
+
+    def draw(self, target):
+        """Copia lo sfondo pre-renderizzato sulla superficie"""
+        width, height = target.get_size()
+        if self.key != (width, height, self.theme):
+            self.build(target)
+        return target.blit(self.surface, (0, 0))
+
+    def draw_pulse(self, target, color, alpha):
+        """Sovrappone il colore di stato con trasparenza, senza allocare superfici"""
+        if alpha <= 0:
+            return None
+        if self.overlay is None or self.overlay.get_size() != target.get_size():
+            self.overlay = pygame.Surface(target.get_size(), 0, target)
+            self.overlay_color = None
+        if self.overlay_color != color:
+            self.overlay.fill(color)
+            self.overlay_color = color
+        self.overlay.set_alpha(alpha)
+        return target.blit(self.overlay, (0, 0))
+
+
+class GaugeLayer:
+    """Quadrante statico del tachimetro e anelli di glow pre-renderizzati per colore"""
+
+    GLOW_OFFSET = 30
+    GLOW_WIDTH = 20
+    TICKS = 10
+
+    def __init__(self, text, thresholds=STATUS_THRESHOLDS):
+        self.text = text
+        self.thresholds = thresholds
+        self.dial = None
+        self.key = None
+        self.glow_rings = {}
+
+    def invalidate(self):
+        """Forza la ricostruzione del quadrante e degli anelli di glow"""
+        self.dial = None
+        self.key = None
+        self.glow_rings = {}
+
+    def tick_color(self, value):
+        """Colore del segno in base alle soglie"""
+        return (GREEN, YELLOW, ORANGE, RED)[status_index(value, self.thresholds)]
+
+    def build(self, target, radius, max_value):
+        """Disegna una sola volta archi, segni e numeri del quadrante"""
+        # Superficie che copre la mezzaluna superiore più i bordi laterali
+        dial = pygame.Surface((radius * 2, radius + 8), pygame.SRCALPHA, target)
+        dial.fill((0, 0, 0, 0))
+        cx, cy = radius, radius
+        gauge_rect = pygame.Rect(0, 0, radius * 2, radius * 2)
+
+        # Sfondo dell'arco e arco interno nero
+        pygame.draw.arc(dial, DARK_GRAY, gauge_rect, 0, math.pi, 15)
+        pygame.draw.arc(dial, BLACK, gauge_rect, 0, math.pi, 8)
+
+        # Bordi laterali per chiudere la mezzaluna
+        pygame.draw.line(dial, DARK_GRAY, (0, cy), (15, cy), 8)
+        pygame.draw.line(dial, DARK_GRAY, (radius * 2 - 15, cy), (radius * 2, cy), 8)
+
+        # Segni del tachimetro, da 180° (sinistra) a 0° (destra)
+        for i in range(self.TICKS + 1):
+            angle = math.radians(180 - i * 180 / self.TICKS)
+            value = i * max_value / self.TICKS
+            cos_a, sin_a = math.cos(angle), math.sin(angle)
+
+            start = (cx + cos_a * (radius - 40), cy - sin_a * (radius - 40))
+            end = (cx + cos_a * (radius - 15), cy - sin_a * (radius - 15))
+            pygame.draw.line(dial, self.tick_color(value), start, end, 5)
+
+            # Numeri solo sui segni pari
+            if i % 2 == 0:
+                text = self.text.render(f"{value:.1f}", FONT_SMALL, WHITE)
+                text_x = cx + cos_a * (radius - 60) - text.get_width() // 2
+                text_y = cy - sin_a * (radius - 60) - text.get_height() // 2
+                dial.blit(text, (text_x, text_y))
+
+        # RLE: le ampie zone trasparenti vengono saltate durante il blit
+        dial.set_alpha(255, pygame.RLEACCEL)
+        self.dial = dial
+        self.key = (radius, max_value, self.thresholds)
+        self.glow_rings = {}
+
+    def get_glow_ring(self, target, radius, color):
+        """Anello di glow per il colore di stato; l'intensità si applica con set_alpha"""
+        ring = self.glow_rings.get(color)
+        if ring is None:
+            glow_radius = radius + self.GLOW_OFFSET
+            ring = pygame.Surface((glow_radius * 2, glow_radius + 1), 0, target)
+            ring.fill(BLACK)
+            pygame.draw.arc(
+                ring, color, (0, 0, glow_radius * 2, glow_radius * 2), 0, math.pi, self.GLOW_WIDTH
             )
-            screen.blit(temp_surface, (self.x - self.size, self.y - self.size))
+            ring.set_colorkey(BLACK, pygame.RLEACCEL)
+            self.glow_rings[color] = ring
+        return ring
+
+    def draw(self, target, center, radius, max_value, glow_color, glow_alpha):
+        """Disegna il tachimetro con due blit: anello di glow e quadrante"""
+        if self.key != (radius, max_value, self.thresholds):
+            self.build(target, radius, max_value)
+        cx, cy = center
+
+        if glow_alpha > 0:
+            glow_radius = radius + self.GLOW_OFFSET
+            ring = self.get_glow_ring(target, radius, glow_color)
+            ring.set_alpha(glow_alpha)
+            target.blit(ring, (cx - glow_radius, cy - glow_radius))
+
+        return target.blit(self.dial, (cx - radius, cy - radius))
+
+
+class NeedleRenderer:
+    """Sprite della freccia con glow, in cache LRU per angolo quantizzato e colore"""
+
+    GLOW_LAYERS = 5
+    BASE_WIDTH = 20
+    BASE_LENGTH = 40
+    HUB_RADIUS = 12
+
+    def __init__(self, angle_step=NEEDLE_ANGLE_STEP, cache_size=NEEDLE_CACHE_SIZE, arena=None):
+        self.angle_step = angle_step
+        self.cache_size = cache_size
+        self.glow = self.GLOW_LAYERS
+        # Le superfici degli sprite tolti dalla cache tornano all'arena e vengono riusate
+        self.arena = arena or SurfaceArena()
+        self.sprites = OrderedDict()
+        self.sprite_sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def arrow_points(self, angle, length):
+        """Punta e base della freccia, relative al centro del tachimetro"""
+        angle_rad = math.radians(angle)
+        cos_a, sin_a = math.cos(angle_rad), math.sin(angle_rad)
+        tip = (cos_a * length, -sin_a * length)
+        base_x = cos_a * self.BASE_LENGTH
+        base_y = -sin_a * self.BASE_LENGTH
+
+        # Angolo perpendicolare per la larghezza della base
+        perp_angle = angle_rad - math.pi / 2
+        half_x = math.cos(perp_angle) * (self.BASE_WIDTH / 2)
+        half_y = math.sin(perp_angle) * (self.BASE_WIDTH / 2)
+        return [tip, (base_x + half_x, base_y + half_y), (base_x - half_x, base_y - half_y)]
+
+    def glow_layers(self, points):
+        """Poligoni del glow, espansi radialmente dal centro"""
+        layers = []
+        for i in range(self.glow):
+            expansion = i * 1.5
+            expanded = []
+            for px, py in points:
+                length = math.hypot(px, py)
+                if length > 0:
+                    expanded.append((px + px / length * expansion, py + py / length * expansion))
+                else:
+                    expanded.append((px, py))
+            layers.append((30 - i * 5, expanded))
+        return layers
+
+    def footprint(self, angle, length):
+        """Poligoni della freccia e rettangolo d'ingombro rispetto al centro"""
+        points = self.arrow_points(angle, length)
+        layers = self.glow_layers(points)
+
+        # Ingombro: freccia, poligoni espansi e perno centrale
+        xs = [px for px, _ in points] + [px for _, layer in layers for px, _ in layer]
+        ys = [py for _, py in points] + [py for _, layer in layers for _, py in layer]
+        xs += [-self.HUB_RADIUS, self.HUB_RADIUS]
+        ys += [-self.HUB_RADIUS, self.HUB_RADIUS]
+        left = math.floor(min(xs)) - 2
+        top = math.floor(min(ys)) - 2
+        width = math.ceil(max(xs)) + 2 - left
+        height = math.ceil(max(ys)) + 2 - top
+        return points, layers, pygame.Rect(left, top, width, height)
+
+    def sprite_size(self, length):
+        """Ingombro massimo della freccia su tutti gli angoli (il più largo è in orizzontale, il più
+        alto in verticale): con superfici di questa dimensione quella dello sprite tolto dalla cache
+        può ospitare qualunque sprite nuovo"""
+        key = (length, self.glow)
+        size = self.sprite_sizes.get(key)
+        if size is None:
+            bounds = [self.footprint(angle, length)[2] for angle in range(0, 360, 15)]
+            size = self.sprite_sizes[key] = (max(b.width for b in bounds), max(b.height for b in bounds))
+        return size
+
+    def build(self, target, angle, length, color, shape=None):
+        """Renderizza la freccia completa in una superficie dell'arena; si disegna e si copia
+        solo il rettangolo del suo ingombro"""
+        points, layers, bounds = shape or self.footprint(angle, length)
+        left, top, width, height = bounds
+
+        sprite = self.arena.acquire(self.sprite_size(length), keep=True)
+
+        def shift(pts):
+            return [(px - left, py - top) for px, py in pts]
+
+        for alpha, layer in layers:
+            pygame.draw.polygon(sprite, (*color[:3], alpha), shift(layer))
+
+        # Freccia principale e perno centrale
+        arrow = shift(points)
+        pygame.draw.polygon(sprite, color, arrow)
+        pygame.draw.polygon(sprite, WHITE, arrow, 2)
+        pygame.draw.circle(sprite, color, (-left, -top), self.HUB_RADIUS)
+        pygame.draw.circle(sprite, WHITE, (-left, -top), 6)
+        return sprite, (left, top), (0, 0, width, height)
+
+    def set_glow(self, layers):
+        """Cambia il numero di strati di glow; gli sprite in cache tornano all'arena"""
+        if layers == self.glow:
+            return
+        self.glow = layers
+        for sprite, _, _ in self.sprites.values():
+            self.arena.release(sprite)
+        self.sprites.clear()
+
+    def draw(self, target, center, angle, length, color):
+        """Disegna la freccia con un solo blit del rettangolo che la contiene"""
+        angle = round(angle / self.angle_step) * self.angle_step
+        key = (angle, length, color)
+        entry = self.sprites.get(key)
+        if entry is None:
+            self.misses += 1
+            shape = self.footprint(angle, length)
+            # A cache piena lo sprite meno recente torna all'arena, che lo riusa per il nuovo:
+            # a regime la freccia non crea superfici
+            if len(self.sprites) >= self.cache_size:
+                _, (evicted, _, _) = self.sprites.popitem(last=False)
+                self.arena.release(evicted)
+            entry = self.build(target, angle, length, color, shape)
+            self.sprites[key] = entry
+        else:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+
+        sprite, (left, top), area = entry
+        return target.blit(sprite, (center[0] + left, center[1] + top), area)
+
+
+class BreathGraph:
+    """Curva del soffio: durante la lettura scorre i pixel esistenti e disegna solo le colonne
+    nuove con NumPy; al risultato mostra l'intera sessione"""
+
+    def __init__(self, rect=GRAPH_RECT, window=GRAPH_WINDOW, max_value=2.5, thresholds=STATUS_THRESHOLDS):
+        self.rect = pygame.Rect(rect)
+        self.window = window
+        self.max_value = max_value
+        self.thresholds = np.asarray(thresholds)
+        self.column_time = window / self.rect.width
+        self.colors = np.array(STATUS_COLORS, dtype=np.uint8)
+        self.surface = pygame.Surface(self.rect.size, 0, 32)
+
+        # Colonna vuota (sfondo con le righe delle soglie), copiata in ogni colonna nuova
+        self.blank_column = np.empty((self.rect.height, 3), dtype=np.uint8)
+        self.blank_column[:] = GRAPH_BACKGROUND
+        for threshold in thresholds:
+            self.blank_column[int(self.value_to_y(threshold))] = GRAPH_GRID
+        self.reset()
+
+    def reset(self):
+        """Nuova lettura: grafico vuoto e storia azzerata"""
+        self.start = None
+        self.next_column = 0
+        self.last_value = None
+        self.history_times = []
+        self.history_values = []
+        self.pending_times = np.zeros(0)
+        self.pending_values = np.zeros(0)
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        pixels[:] = self.blank_column
+        del pixels
+
+    def value_to_y(self, value):
+        height = self.rect.height - 1
+        return height - np.clip(np.asarray(value) / self.max_value, 0, 1) * height
+
+    def aggregate(self, columns, values, count):
+        """Minimo, massimo e ultimo valore per colonna; le colonne senza campioni ripetono il precedente"""
+        low = np.full(count, np.inf)
+        high = np.full(count, -np.inf)
+        last = np.full(count, -1)
+        np.minimum.at(low, columns, values)
+        np.maximum.at(high, columns, values)
+        np.maximum.at(last, columns, np.arange(len(values)))
+        filled = np.maximum.accumulate(np.where(last >= 0, np.arange(count), -1))
+
+        if self.last_value is not None:
+            previous = self.last_value
+        else:
+            previous = values[0] if len(values) else 0.0
+        has_value = filled >= 0
+        last_value = np.where(has_value, values[last[np.maximum(filled, 0)]], previous)
+        empty = last < 0
+        low[empty] = last_value[empty]
+        high[empty] = last_value[empty]
+
+        # Segmento verticale che unisce la colonna alla precedente
+        before = np.concatenate(([previous], last_value[:-1]))
+        return np.minimum(low, before), np.maximum(high, before), last_value
+
+    def render_columns(self, block, low, high):
+        """Disegna le colonne (x, y, rgb) con un'unica operazione vettoriale"""
+        top = self.value_to_y(high).astype(np.int32)
+        bottom = self.value_to_y(low).astype(np.int32)
+        rows = np.arange(self.rect.height)
+        mask = (rows >= top[:, None]) & (rows <= bottom[:, None])
+        colors = self.colors[np.searchsorted(self.thresholds, high, side="right")]
+        block[:] = self.blank_column
+        block[mask] = np.broadcast_to(colors[:, None, :], block.shape)[mask]
+
+    def push(self, timestamps, values):
+        """Campioni filtrati della lettura: scorre il grafico delle colonne completate"""
+        if len(values) == 0:
+            return
+        if self.start is None:
+            self.start = timestamps[0]
+        self.history_times.append(np.asarray(timestamps, dtype=np.float64))
+        self.history_values.append(np.asarray(values, dtype=np.float64))
+
+        times = np.concatenate((self.pending_times, timestamps))
+        values = np.concatenate((self.pending_values, values))
+        columns = ((times - self.start) / self.column_time).astype(np.int64)
+        # Campioni datati prima dell'ultima colonna completata (i frame binari sono retrodatati):
+        # vanno nella prima colonna ancora aperta, gli indici negativi scriverebbero dalla fine
+        np.maximum(columns, self.next_column, out=columns)
+        current = columns[-1]
+        done = columns < current
+        self.pending_times, self.pending_values = times[~done], values[~done]
+        count = current - self.next_column
+        if count <= 0:
+            return
+
+        low, high, last = self.aggregate(columns[done] - self.next_column, values[done], count)
+        self.last_value = last[-1]
+        self.next_column = current
+
+        width = self.rect.width
+        if count >= width:
+            low, high, count = low[-width:], high[-width:], width
+        else:
+            self.surface.scroll(-count, 0)
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        self.render_columns(pixels[width - count:], low, high)
+        del pixels
+
+    def show_session(self):
+        """Curva completa della lettura compressa sulla larghezza del grafico (risultato)"""
+        if not self.history_values:
+            return
+        times = np.concatenate(self.history_times)
+        values = np.concatenate(self.history_values)
+        width = self.rect.width
+        duration = max(times[-1] - times[0], 1e-6)
+        columns = np.minimum(((times - times[0]) / duration * width).astype(np.int64), width - 1)
+        self.last_value = None
+        low, high, _ = self.aggregate(columns, values, width)
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        self.render_columns(pixels, low, high)
+        del pixels
+
+    def draw(self, target):
+        target.blit(self.surface, self.rect)
+        pygame.draw.rect(target, DARK_GRAY, self.rect.inflate(6, 6), 3, border_radius=4)
+        return self.rect.inflate(6, 6)
+
+
+class StartupLoader:
+    """Avvio a fasi dopo il primo frame: i compiti di I/O girano in un thread, quelli che usano
+    pygame (non thread-safe) nel loop principale entro un budget di tempo per frame"""
+
+    def __init__(self, io_tasks, frame_tasks, budget=WARMUP_FRAME_BUDGET):
+        # io_tasks: (nome, lavoro, applica) - lavoro() nel thread, applica(risultato) nel loop principale
+        self.io_tasks = list(io_tasks)
+        self.frame_tasks = deque(frame_tasks)
+        self.budget = budget
+        self.total = len(self.io_tasks) + len(self.frame_tasks)
+        self.completed = queue.SimpleQueue()
+        self.finished = 0
+        self.started = None
+        self.elapsed = None
+        self.thread = None
+        self.cancelled = False
+
+    @property
+    def done(self):
+        return self.finished >= self.total
+
+    def run(self):
+        for name, work, apply in self.io_tasks:
+            if self.cancelled:
+                return
+            start = time.perf_counter()
+            try:
+                result = work()
+            except Exception as e:
+                print(f"Errore in avvio ({name}): {e}")
+                result, apply = None, None
+            self.completed.put((name, apply, result, time.perf_counter() - start))
+
+    def apply_completed(self):
+        """Applica nel thread chiamante i risultati dei compiti di I/O conclusi"""
+        while True:
+            try:
+                name, apply, result, seconds = self.completed.get_nowait()
+            except queue.Empty:
+                return
+            if apply:
+                apply(result)
+            self.finish(name, seconds)
+
+    def poll(self):
+        """Un passo dell'avvio, da chiamare dopo aver presentato il frame; True ad avvio concluso"""
+        if self.done:
+            return True
+        if self.thread is None:
+            self.started = time.perf_counter()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+        deadline = time.perf_counter() + self.budget
+        self.apply_completed()
+        while self.frame_tasks and time.perf_counter() < deadline:
+            name, work = self.frame_tasks.popleft()
+            start = time.perf_counter()
+            work()
+            self.finish(name, time.perf_counter() - start)
+        return self.done
+
+    def finish(self, name, seconds):
+        self.finished += 1
+        print(f"Avvio {self.finished}/{self.total}: {name} ({seconds * 1000:.0f} ms)")
+        if self.done:
+            self.elapsed = time.perf_counter() - self.started
+            print(f"Avvio completato in {self.elapsed:.2f}s")
+
+    def cancel(self, timeout=2.0):
+        """In chiusura: salta i compiti non ancora iniziati, attende quello di I/O in corso e ne
+        applica il risultato, così le risorse che ha aperto possono essere chiuse"""
+        self.cancelled = True
+        self.frame_tasks.clear()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.apply_completed()
+
+    def status_text(self):
+        return f"Avvio in corso... {self.finished}/{self.total}"
+
+
+class FrameScheduler:
+    """Frequenza di rendering per stato, modalità idle e attesa guidata dagli eventi"""
+
+    # Eventi che risvegliano subito il loop; quali contano come attività lo decide chi li gestisce
+    WAKE_TYPES = (pygame.QUIT, pygame.KEYDOWN, INPUT_EVENT)
+
+    def __init__(self, state_fps, idle_states=(), idle_timeout=IDLE_TIMEOUT, idle_fps=IDLE_FPS,
+                 time_source=time.monotonic):
+        self.state_fps = state_fps
+        self.idle_states = idle_states
+        self.idle_timeout = idle_timeout
+        self.idle_fps = idle_fps
+        self.time_source = time_source
+
+        self.last_activity = time_source()
+        self.last_frame = time_source()
+        self.last_state = None
+        self.static_frame_done = False
+        # Eventi tolti dalla coda durante l'attesa, in ordine di arrivo
+        self.deferred = []
+
+        # Tempo CPU e tempo reale accumulati per stato (la chiave "idle" raccoglie l'attesa in idle)
+        self.usage = {}
+        self.last_cpu = time.process_time()
+        self.last_wall = time_source()
+
+    def notify_activity(self):
+        """Segnala un input dell'utente: esce dalla modalità idle"""
+        self.last_activity = self.time_source()
+        self.static_frame_done = False
+
+    def request_redraw(self):
+        """Fa ridisegnare il frame statico senza uscire dalla modalità idle"""
+        self.static_frame_done = False
+
+    def is_idle(self, state):
+        """True se lo stato è rimasto senza input oltre il timeout"""
+        return (state in self.idle_states
+                and self.time_source() - self.last_activity >= self.idle_timeout)
+
+    def target_fps(self, state):
+        """Frequenza di rendering desiderata per lo stato corrente"""
+        if self.is_idle(state):
+            return self.idle_fps
+        return self.state_fps[state]
+
+    def frame_period(self, state):
+        """Durata prevista di un frame nello stato corrente (secondi)"""
+        fps = self.target_fps(state)
+        return 1.0 / fps if fps > 0 else STATIC_FRAME_WAIT
+
+    def should_render(self, state):
+        """False quando in idle statico il frame è già a schermo"""
+        if state != self.last_state:
+            # Un cambio di stato va a schermo ma non è un input: la modalità attrazione
+            # alterna attesa e classifica anche in idle
+            self.last_state = state
+            self.static_frame_done = False
+        if self.is_idle(state) and self.idle_fps <= 0:
+            if self.static_frame_done:
+                return False
+            self.static_frame_done = True
+        return True
+
+    def account(self, key):
+        """Attribuisce a key il tempo CPU e reale trascorso dall'ultima chiamata"""
+        cpu = time.process_time()
+        wall = self.time_source()
+        entry = self.usage.setdefault(key, [0.0, 0.0])
+        entry[0] += cpu - self.last_cpu
+        entry[1] += wall - self.last_wall
+        self.last_cpu = cpu
+        self.last_wall = wall
+
+    def wait(self, state):
+        """Attende il prossimo frame, svegliandosi subito su tasti, QUIT o input"""
+        key = "idle" if self.is_idle(state) else state
+        # In idle statico si attende solo un evento (con un timeout per i controlli periodici)
+        frame_time = self.frame_period(state)
+        deadline = self.last_frame + frame_time
+
+        woken = False
+        while True:
+            remaining = deadline - self.time_source()
+            if remaining <= 0.001:
+                break
+            event = pygame.event.wait(max(1, int(remaining * 1000)))
+            if event.type == pygame.NOEVENT:
+                break
+            # Non si rimettono in coda: finirebbero dopo quelli arrivati nel frattempo
+            self.deferred.append(event)
+            if event.type in self.WAKE_TYPES:
+                woken = True
+                break
+
+        # Risveglio o frame in ritardo: si riparte da adesso invece di recuperare
+        now = self.time_source()
+        if woken or now - deadline > frame_time:
+            self.last_frame = now
+        else:
+            self.last_frame = deadline
+        self.account(key)
+
+    def take_events(self):
+        """Eventi ricevuti durante l'attesa seguiti da quelli ancora in coda, in ordine di arrivo"""
+        events = self.deferred
+        self.deferred = []
+        events.extend(pygame.event.get())
+        return events
+
+    def cpu_report(self):
+        """Percentuale di CPU usata per stato: {chiave: (cpu %, secondi)}"""
+        return {
+            key: (100.0 * cpu / wall if wall > 0 else 0.0, wall)
+            for key, (cpu, wall) in self.usage.items()
+        }
+
+
+class QualityGovernor:
+    """Livello di qualità scelto dal tempo di lavoro misurato dei frame, con isteresi: scende se il
+    p90 degli ultimi window frame supera QUALITY_DOWN del budget, risale solo sotto QUALITY_UP.
+    La finestra riparte quando cambiano budget o livello: i frame misurati in condizioni diverse
+    non decidono il passo successivo."""
+
+    def __init__(self, tiers=QUALITY_TIERS, fixed=None, window=QUALITY_WINDOW, clock=time.monotonic):
+        self.tiers = tiers
+        # Con un livello fisso (--quality) il governatore non cambia mai livello
+        self.adaptive = fixed is None
+        self.index = 0 if fixed is None else [tier.name for tier in tiers].index(fixed)
+        self.clock = clock
+        # Buffer circolare dei carichi (tempo di lavoro / budget)
+        self.loads = np.zeros(window)
+        self.position = 0
+        self.filled = 0
+        self.budget = None
+        self.load = None
+        self.last_change = clock()
+        self.changes = 0
+
+    @property
+    def tier(self):
+        return self.tiers[self.index]
+
+    def reset(self):
+        """Svuota la finestra"""
+        self.position = 0
+        self.filled = 0
+
+    def record(self, work, budget):
+        """Tempo di lavoro di un frame presentato e budget del frame (secondi); True se il livello cambia"""
+        if not self.adaptive:
+            return False
+        if budget != self.budget:
+            self.budget = budget
+            self.reset()
+        self.loads[self.position] = work / budget
+        self.position = (self.position + 1) % len(self.loads)
+        self.filled = min(self.filled + 1, len(self.loads))
+        if self.filled < len(self.loads):
+            return False
+        self.load = float(np.percentile(self.loads, 90))
+
+        held = self.clock() - self.last_change
+        if self.load > QUALITY_DOWN and self.index < len(self.tiers) - 1 and held >= QUALITY_DOWN_HOLD:
+            self.index += 1
+        elif self.load < QUALITY_UP and self.index > 0 and held >= QUALITY_UP_HOLD:
+            self.index -= 1
+        else:
+            return False
+        self.last_change = self.clock()
+        self.changes += 1
+        self.reset()
+        return True
 
 
 class AlcoholMeter:
-    def __init__(self):
+    def __init__(self, dirty_rects=False, debug_dirty=False, fps=FPS, time_source=time.monotonic,
+                 idle_timeout=IDLE_TIMEOUT, idle_fps=IDLE_FPS, serial_ports=None, baud_rates=None,
+                 calibration_file=None, device=None, protocol="auto", record_file=RECORDING_FILE,
+                 replay_file=None, replay_speed=1.0, results_file=RESULTS_FILE, profile=False,
+                 profile_export=None, profile_interval=PROFILE_EXPORT_INTERVAL, sensor_factory=None,
+                 acquisition=False, quality=None):
+        # Solo i moduli usati: pygame.init() avvierebbe anche audio e joystick
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Alcohol test Barboun")
-        self.clock = pygame.time.Clock()
+        self.fps = fps
         self.running = True
 
+        # Tempo monotono per simulazione e macchina a stati
+        self.time_source = time_source
+        self.last_update_time = None
+        self.accumulator = 0.0
+
         # Stati del sistema
         self.STATE_WAITING = 0      # Schermata iniziale - aspetta il pulsante
         self.STATE_INSTRUCTIONS = 1  # Mostra istruzioni per 10 secondi
         self.STATE_READING = 2      # Sta leggendo il valore alcolico
         self.STATE_RESULT = 3       # Mostra il risultato finale
+        self.STATE_LEADERBOARD = 4  # Modalità attrazione: classifica della serata
         
         self.current_state = self.STATE_WAITING
         self.state_timer = 0
-        
-        # Durate degli stati (in frames a 60 FPS)
-        self.instructions_duration = 300  # 10 secondi
-        self.reading_duration = 300       # 5 secondi  
-        self.result_duration = 300        # 5 secondi
+        self.state_names = {
+            self.STATE_WAITING: "attesa",
+            self.STATE_INSTRUCTIONS: "istruzioni",
+            self.STATE_READING: "lettura",
+            self.STATE_RESULT: "risultato",
+            self.STATE_LEADERBOARD: "classifica",
+        }
+
+        # Frequenza di rendering per stato, con modalità idle nella schermata di attesa
+        self.scheduler = FrameScheduler(
+            {
+                self.STATE_WAITING: min(WAITING_FPS, fps),
+                self.STATE_INSTRUCTIONS: min(INSTRUCTIONS_FPS, fps),
+                self.STATE_READING: fps,
+                self.STATE_RESULT: fps,
+                self.STATE_LEADERBOARD: min(LEADERBOARD_FPS, fps),
+            },
+            idle_states=(self.STATE_WAITING, self.STATE_LEADERBOARD),
+            idle_timeout=idle_timeout,
+            idle_fps=idle_fps,
+            time_source=time_source,
+        )
 
-        # Variabili per il valore alcolico
+        # Livello di qualità degli effetti: adattivo al tempo dei frame, oppure fisso
+        self.quality = QualityGovernor(fixed=quality)
+        
+        # Durate degli stati (in secondi)
+        self.instructions_duration = 5.0
+        self.reading_duration = 5.0
+        self.result_duration = 5.0
+        self.attract_interval = ATTRACT_INTERVAL
+        self.leaderboard_duration = LEADERBOARD_DURATION
+
+        # Variabili per il valore alcolico (target_value è l'ingresso della modalità demo)
         self.current_value = 0.0
         self.target_value = 0.0
         self.max_value = 2.5
         self.max_reached_value = 0.0  # Valore massimo raggiunto
+        self.reading_started = 0.0
+        self.reading_samples = 0  # Campioni arrivati durante la lettura
 
         # Animazioni
         self.needle_angle = 180  # Inizia a sinistra (180°) per mezzaluna orizzontale
@@ -111,39 +1133,114 @@ class AlcoholMeter:
 
         # Animazione per la schermata iniziale
         self.waiting_pulse = 0
-        self.button_pressed = False
+
+        # Input: letti dalla coda di pygame una volta per frame. press_time è l'istante della
+        # pressione non ancora gestita; latency_start quello della pressione che attende il primo
+        # frame delle istruzioni a schermo
+        self.keyboard = KeyboardInput(button=not GPIO_AVAILABLE)
+        self.gpio_input = None
+        self.press_time = None
+        self.latency_start = None
+        self.input_latency = Histogram()
 
         # Particelle
-        self.particles = []
+        self.particles = ParticleSystem()
+
+        # Sfondo pre-renderizzato
+        self.background = BackgroundLayer()
+
+        # Calibrazione (opzionale): il sensore invia conteggi ADC grezzi invece di ‰ BAC
+        self.calibration = self.setup_calibration(calibration_file, device)
+
+        # Comunicazione seriale: un thread cerca il sensore, si riconnette e svuota la porta
+        # in un buffer circolare di campioni
+        self.samples = SampleRing()
+        self.sample_seq = 0
+        max_sample = self.calibration.max_raw if self.calibration else self.max_value
+        if sensor_factory:
+            # Sorgente iniettata (benchmark): riceve il buffer e sostituisce seriale e riproduzione
+            self.sensor = sensor_factory(self.samples)
+        elif replay_file:
+            # Riproduzione: i campioni registrati seguono lo stesso percorso di quelli della seriale
+            self.sensor = ReplaySource(replay_file, self.samples, time_source, replay_speed, loop=True,
+                                       on_session=self.replay_session)
+        elif acquisition:
+            # Seriale in un processo separato: qui si copiano i campioni dalla memoria condivisa
+            command = acquisition_command(ports=serial_ports, baud_rates=baud_rates, protocol=protocol,
+                                          calibration_file=calibration_file, device=device)
+            self.sensor = AcquisitionClient(self.samples, command=command, on_state=self.sensor_state)
+        else:
+            self.sensor = SensorConnection(self.samples, max_sample, serial_ports, baud_rates, protocol=protocol,
+                                           on_state=self.sensor_state)
+
+        # Registrazione delle sessioni di misura (non durante la riproduzione), aperta in avvio
+        self.recorder = None
+        self.record_file = None if replay_file else record_file
+
+        # Statistiche della serata: vuote fino alla lettura dei risultati salvati in avvio;
+        # i risultati dei test conclusi nel frattempo vengono riapplicati
+        self.stats = ResultStats(since=night_start(time.time()))
+        self.startup_results = []
+        self.leaderboard_panel = None
+        self.leaderboard_key = None
+
+        # Archivio dei risultati, scritto in background per non bloccare il rendering;
+        # accoda da subito, il file viene aperto dopo la lettura
+        self.results_file = results_file
+        self.results = ResultsLog(results_file) if results_file else None
+
+        # Filtri tra i campioni e l'interfaccia: conversione, reiezione picchi, media esponenziale,
+        # linea di base e rilevamento del picco
+        self.pipeline = SignalPipeline(
+            calibration=CalibrationStage(self.calibration) if self.calibration else None
+        )
+        self.setup_serial()
 
-        # Setup GPIO
-        self.setup_gpio()
+        # Rendering del testo con cache di font e superfici
+        self.text = TextRenderer()
 
-        # Comunicazione seriale (commentata per test)
-        self.ser = None
-        self.serial_thread = None
-        self.setup_serial()
+        # Superfici di lavoro per glow e pannelli, riusate tra i frame invece di essere allocate
+        self.arena = SurfaceArena(self.screen)
 
-        # Font - includi font digitali se disponibili
-        try:
-            # Prova a caricare un font digitale/monospace
-            self.font_digital_large = pygame.font.Font("digital-7.ttf", 96)
-            self.font_digital_medium = pygame.font.Font("digital-7.ttf", 64)
-        except:
-            # Fallback su font di sistema
-            self.font_digital_large = pygame.font.Font(None, 96)
-            self.font_digital_medium = pygame.font.Font(None, 64)
-
-        self.font_large = pygame.font.Font(None, 72)
-        self.font_medium = pygame.font.Font(None, 48)
-        self.font_small = pygame.font.Font(None, 32)
-        self.font_extra_large = pygame.font.Font(None, 120)
+        # Quadrante del tachimetro pre-renderizzato
+        self.gauge = GaugeLayer(self.text)
+
+        # Sprite della freccia
+        self.needle = NeedleRenderer(arena=SurfaceArena(self.screen, NEEDLE_SPRITE_BUCKET))
+        self.needle.set_glow(self.quality.tier.needle_glow)
+
+        # Curva del soffio della lettura in corso
+        self.graph = BreathGraph(max_value=self.max_value)
 
         # Centro del tachimetro (mezzaluna orizzontale)
         self.center_x = SCREEN_WIDTH // 2
         self.center_y = SCREEN_HEIGHT // 2 + 100
         self.radius = 250
 
+        # Box delle istruzioni
+        box_width = 800
+        box_height = 400
+        self.instructions_box = pygame.Rect((SCREEN_WIDTH - box_width) // 2, 200, box_width, box_height)
+
+        # Rendering a rettangoli sporchi (opzionale): nelle schermate di attesa e istruzioni
+        # si aggiornano solo le zone animate, ripristinate da un layer statico in cache
+        self.dirty_rects_enabled = dirty_rects
+        self.debug_dirty = debug_dirty
+        self.dirty_rects = []
+        self.previous_dirty_rects = []
+        self.static_layer = None
+        self.static_layer_key = None
+        self.pixels_pushed = 0
+        self.frames_presented = 0
+
+        # Profiler delle fasi del frame e HUD (F3); da disattivato mark() non misura nulla
+        self.profiler = FrameProfiler(enabled=profile or bool(profile_export), export_path=profile_export,
+                                      export_interval=profile_interval)
+        self.show_hud = profile
+        self.hud_surface = None
+        self.hud_area = None
+        self.hud_version = None
+
         # Lista di istruzioni (puoi personalizzare)
         self.instructions = [
             "1. Mettiti a 10-15cm dal buco",
@@ -154,107 +1251,242 @@ class AlcoholMeter:
             "-- Questo è un gioco, non è preciso --",
         ]
 
+        # Avvio a fasi: il primo frame va a schermo subito, poi hardware, archivi e cache
+        self.startup = StartupLoader(
+            [
+                ("GPIO", self.setup_gpio, None),
+                ("registrazioni", lambda: self.setup_recorder(self.record_file), self.set_recorder),
+                ("risultati", self.read_stats, self.load_stats),
+            ],
+            [
+                ("font", self.warm_fonts),
+                ("quadrante", self.warm_gauge),
+                ("freccia", self.warm_needle),
+                ("particelle", self.warm_particles),
+                ("istruzioni", self.warm_instructions),
+            ],
+        )
+
     def setup_gpio(self):
         global GPIO_AVAILABLE
         """Configura i pin GPIO del Raspberry Pi"""
         if GPIO_AVAILABLE:
             try:
-                GPIO.setmode(GPIO.BCM)
-                GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                # Aggiungi callback per il pulsante (fronte di discesa)
-                GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, 
-                                    callback=self.button_callback, bouncetime=300)
+                # Il fronte di discesa del pulsante arriva come evento di input
+                self.gpio_input = GPIOInput(GPIO, BUTTON_PIN)
+                self.gpio_input.start()
                 print(f"GPIO setup completato - Pulsante su pin {BUTTON_PIN}")
             except Exception as e:
                 print(f"Errore setup GPIO: {e}")
                 GPIO_AVAILABLE = False
+                self.gpio_input = None
+                self.keyboard.button = True
 
-    def button_callback(self, channel):
-        """Callback chiamata quando il pulsante viene premuto"""
-        if self.current_state == self.STATE_WAITING:
-            self.button_pressed = True
-            print("Pulsante premuto - avvio test")
+    def setup_calibration(self, path, device):
+        """Carica la curva del sensore; senza file i campioni sono già in ‰ BAC"""
+        if not path:
+            return None
+        try:
+            curve = CalibrationCurve.load(path, device)
+            print(f"Calibrazione caricata: sensore {curve.device}, ADC a {curve.adc_bits} bit")
+            return curve
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Errore caricamento calibrazione: {e}")
+            print("Si assume che il sensore invii valori in ‰ BAC")
+            return None
+
+    def setup_recorder(self, path):
+        """Apre il file delle registrazioni; senza file le sessioni non vengono registrate"""
+        if not path:
+            return None
+        try:
+            recorder = SessionRecorder(path)
+            print(f"Registrazione sessioni su {path} ({len(recorder.index)} già presenti)")
+            return recorder
+        except (OSError, ValueError) as e:
+            print(f"Errore apertura registrazione: {e}")
+            return None
+
+    def set_recorder(self, recorder):
+        """Le scritture passano da un thread: il loop di rendering non attende il disco"""
+        if recorder:
+            recorder = RecorderThread(recorder)
+            recorder.start()
+        self.recorder = recorder
+
+    def setup_results(self):
+        """Avvia il thread di scrittura dei risultati; senza file i risultati non vengono salvati"""
+        if not self.results:
+            return
+        try:
+            self.results.start()
+        except OSError as e:
+            print(f"Errore apertura archivio risultati: {e}")
+            self.results = None
+
+    def read_stats(self):
+        """Statistiche della serata dai risultati salvati, con una sola passata (thread di avvio)"""
+        if not self.results_file:
+            return ResultStats(since=night_start(time.time()))
+        return ResultStats.rebuild(read_results(self.results_file), since=night_start(time.time()))
+
+    def load_stats(self, stats):
+        """Sostituisce le statistiche provvisorie e avvia la scrittura dei risultati"""
+        for result in self.startup_results:
+            stats.add(result)
+        self.startup_results = None
+        self.stats = stats
+        self.leaderboard_key = None
+        self.setup_results()
+
+    def warm_fonts(self):
+        for font in (FONT_SMALL, FONT_MEDIUM, FONT_LARGE, FONT_EXTRA_LARGE, FONT_DIGITAL_LARGE,
+                     FONT_DIGITAL_MEDIUM, FONT_HUD):
+            self.text.font(*font)
+
+    def warm_gauge(self):
+        """Quadrante e anelli di glow di tutti i colori di stato"""
+        self.gauge.build(self.screen, self.radius, self.max_value)
+        for color in STATUS_COLORS:
+            self.gauge.get_glow_ring(self.screen, self.radius, color)
+
+    def warm_needle(self):
+        """Sprite della freccia a riposo, la posizione di ogni inizio lettura"""
+        self.needle.draw(self.arena.acquire((1, 1), 0), (0, 0), 180, self.radius - 50, STATUS_COLORS[0])
+
+    def warm_particles(self):
+        self.particles.warm((NEON_YELLOW, ORANGE, NEON_RED))
+
+    def warm_instructions(self):
+        """Testi della schermata delle istruzioni, renderizzati su una superficie di scarto"""
+        self.draw_instructions_static(self.arena.acquire(self.screen.get_size(), 0))
+
+    def save_result(self):
+        """Accoda il risultato del test appena concluso e aggiorna le statistiche"""
+        duration = self.time_source() - self.reading_started
+        result = Result(time.time(), self.max_reached_value, duration, self.reading_samples)
+        if self.results:
+            self.results.append(result)
+        if self.startup_results is not None:
+            self.startup_results.append(result)
+        # Nuova serata: la classifica riparte da zero
+        since = night_start(result.timestamp)
+        if since > self.stats.since:
+            self.stats = ResultStats(since=since)
+        self.stats.add(result)
 
     def setup_serial(self):
-        """Configura la comunicazione seriale"""
-        try:
-            # Sostituisci 'COM3' con la porta corretta del tuo dispositivo
-            # Su Linux/Mac potrebbe essere '/dev/ttyUSB0' or '/dev/ttyACM0'
-            self.ser = serial.Serial("COM3", 9600, timeout=1)
-            self.serial_thread = threading.Thread(target=self.read_serial, daemon=True)
-            self.serial_thread.start()
-            print("Connessione seriale stabilita")
-        except Exception as e:
-            print(f"Errore connessione seriale: {e}")
-            print("Modalità demo attivata - usa i tasti freccia per testare")
-
-    def read_serial(self):
-        """Legge i dati dalla porta seriale"""
-        while self.running and self.ser:
-            try:
-                if self.ser.in_waiting > 0:
-                    line = self.ser.readline().decode("utf-8").strip()
-                    try:
-                        value = float(line)
-                        if 0 <= value <= self.max_value:
-                            self.target_value = value
-                    except ValueError:
-                        pass
-            except Exception as e:
-                print(f"Errore lettura seriale: {e}")
-            time.sleep(0.1)
+        """Avvia la connessione seriale in background (porte in sensor.SERIAL_PORTS o --port)"""
+        self.sensor.start()
+        if isinstance(self.sensor, ReplaySource):
+            print(f"Riproduzione di {self.sensor.recording.path}: {len(self.sensor.recording)} sessioni")
+        elif isinstance(self.sensor, SensorConnection):
+            print("Ricerca del sensore in background - finché non è connesso usa i tasti freccia per testare")
+        elif isinstance(self.sensor, AcquisitionClient):
+            print("Campioni dal processo di acquisizione - finché non è connesso usa i tasti freccia per testare")
+
+    def replay_session(self, number):
+        """Inizio di una sessione registrata: equivale alla pressione del pulsante"""
+        post_input(BUTTON, "riproduzione")
+
+    def sensor_state(self, connected):
+        """Connessione o disconnessione del sensore (dal thread della seriale)"""
+        post_input(SENSOR, "seriale", connected=connected)
+
+    def enter_state(self, state):
+        """Cambia stato; la sessione registrata va dalla pressione del pulsante al ritorno in attesa"""
+        self.current_state = state
+        self.state_timer = 0
+        if self.recorder:
+            now = self.time_source()
+            if state == self.STATE_INSTRUCTIONS:
+                self.recorder.begin(now, state)
+            elif state == self.STATE_WAITING:
+                self.recorder.end(now, self.max_reached_value)
+            else:
+                self.recorder.transition(now, state)
+
+    def consume_samples(self):
+        """Passa i campioni arrivati dall'ultimo frame attraverso i filtri"""
+        if not self.sensor.connected:
+            # Modalità demo: il valore impostato da tastiera segue lo stesso percorso dei campioni
+            value = self.calibration.to_raw(self.target_value) if self.calibration else self.target_value
+            self.samples.push(self.time_source(), value)
+
+        self.sample_seq, timestamps, values = self.samples.snapshot(self.sample_seq)
+        if self.recorder:
+            self.recorder.samples(timestamps, values)
+        if self.current_state == self.STATE_READING:
+            self.reading_samples += len(values)
+        # La linea di base segue l'aria ambiente solo in attesa, quando nessuno sta soffiando
+        self.pipeline.set_tracking(self.current_state in (self.STATE_WAITING, self.STATE_LEADERBOARD))
+        filtered = self.pipeline.process(timestamps, values)
+        if self.current_state == self.STATE_READING:
+            self.graph.push(timestamps, filtered)
 
-    def update_state_machine(self):
-        """Gestisce la macchina a stati"""
-        if self.current_state == self.STATE_WAITING:
+    def update_state_machine(self, dt):
+        """Gestisce la macchina a stati (dt in secondi)"""
+        if self.current_state in (self.STATE_WAITING, self.STATE_LEADERBOARD):
             # Aspetta che il pulsante venga premuto
-            if self.button_pressed:
-                self.current_state = self.STATE_INSTRUCTIONS
-                self.state_timer = 0
-                self.button_pressed = False
+            self.state_timer += dt
+            if self.press_time is not None:
+                self.enter_state(self.STATE_INSTRUCTIONS)
+                self.latency_start = self.press_time
+                self.press_time = None
+            elif self.current_state == self.STATE_WAITING:
+                # Modalità attrazione, solo se c'è già qualche risultato
+                if self.stats.count and self.state_timer >= self.attract_interval:
+                    self.enter_state(self.STATE_LEADERBOARD)
+            elif self.state_timer >= self.leaderboard_duration:
+                self.enter_state(self.STATE_WAITING)
                 
         elif self.current_state == self.STATE_INSTRUCTIONS:
-            # Mostra istruzioni per 10 secondi
-            self.state_timer += 1
+            # Mostra le istruzioni
+            self.state_timer += dt
             if self.state_timer >= self.instructions_duration:
-                self.current_state = self.STATE_READING
-                self.state_timer = 0
+                self.enter_state(self.STATE_READING)
                 # Reset valori per la nuova lettura
                 self.current_value = 0.0
                 self.target_value = 0.0
                 self.max_reached_value = 0.0
+                self.pipeline.reset_peak()
+                self.reading_started = self.time_source()
+                self.reading_samples = 0
+                self.graph.reset()
                 
         elif self.current_state == self.STATE_READING:
-            # Fase di lettura per 5 secondi
-            self.state_timer += 1
+            # Fase di lettura
+            self.state_timer += dt
             if self.state_timer >= self.reading_duration:
-                self.current_state = self.STATE_RESULT
-                self.state_timer = 0
+                # Il picco comprende i campioni consumati in questo frame: se la lettura finisce
+                # al primo passo, update_values non li ha ancora riportati in max_reached_value
+                self.max_reached_value = self.pipeline.peak
+                self.enter_state(self.STATE_RESULT)
                 # Imposta il valore finale al massimo raggiunto
                 self.current_value = self.max_reached_value
+                self.save_result()
+                self.graph.show_session()
                 
         elif self.current_state == self.STATE_RESULT:
-            # Mostra risultato per 5 secondi
-            self.state_timer += 1
+            # Mostra il risultato
+            self.state_timer += dt
             if self.state_timer >= self.result_duration:
                 # Torna alla schermata iniziale
-                self.current_state = self.STATE_WAITING
-                self.state_timer = 0
+                self.enter_state(self.STATE_WAITING)
                 self.waiting_pulse = 0
+                # In modalità demo l'aria ambiente torna pulita
+                self.target_value = 0.0
 
-    def update_values(self):
-        """Aggiorna i valori con animazioni fluide"""
-        self.update_state_machine()
+    def update_values(self, dt=SIMULATION_DT):
+        """Aggiorna i valori con animazioni fluide (dt in secondi)"""
+        self.update_state_machine(dt)
         
         if self.current_state == self.STATE_READING:
-            # Solo durante la lettura aggiorna i valori
-            # Interpolazione fluida del valore corrente
-            diff = self.target_value - self.current_value
-            self.current_value += diff * 0.1
-
-            # Aggiorna il valore massimo raggiunto durante la lettura
-            if self.current_value > self.max_reached_value:
-                self.max_reached_value = self.current_value
+            # Solo durante la lettura aggiorna i valori, già filtrati dalla pipeline
+            self.current_value = self.pipeline.current
+
+            # Valore massimo raggiunto durante la lettura
+            self.max_reached_value = self.pipeline.peak
                 
         elif self.current_state == self.STATE_RESULT:
             # Mantieni il valore al massimo raggiunto
@@ -266,7 +1498,7 @@ class AlcoholMeter:
 
         # Interpolazione fluida dell'angolo
         angle_diff = self.target_angle - self.needle_angle
-        self.needle_angle += angle_diff * 0.15
+        self.needle_angle += angle_diff * (1 - math.exp(-dt / NEEDLE_SMOOTHING_TAU))
 
         # Animazioni varie
         if self.current_state == self.STATE_RESULT:
@@ -277,9 +1509,9 @@ class AlcoholMeter:
             self.result_glow = 0
 
         # Aggiorna effetti
-        self.pulse_time += 0.1
-        self.waiting_pulse += 0.05
-        self.glow_intensity += self.glow_direction * 5
+        self.pulse_time += 6 * dt
+        self.waiting_pulse += 3 * dt
+        self.glow_intensity += self.glow_direction * 300 * dt
         if self.glow_intensity >= 100:
             self.glow_direction = -1
         elif self.glow_intensity <= 0:
@@ -289,69 +1521,46 @@ class AlcoholMeter:
         """Aggiunge particelle in base al livello alcolico"""
         if self.current_state == self.STATE_READING and self.current_value > 0.5:
             num_particles = int(self.current_value * 3)
-            for _ in range(num_particles):
-                x = self.center_x + random.randint(-50, 50)
-                y = self.center_y + random.randint(-30, 30)
-
-                if self.current_value < 1.0:
-                    color = NEON_YELLOW
-                elif self.current_value < 2.0:
-                    color = ORANGE
-                else:
-                    color = NEON_RED
 
-                self.particles.append(ParticleEffect(x, y, color))
+            if self.current_value < 1.0:
+                color = NEON_YELLOW
+            elif self.current_value < 2.0:
+                color = ORANGE
+            else:
+                color = NEON_RED
+
+            # Il livello di qualità limita le particelle vive
+            num_particles = min(num_particles, self.quality.tier.max_particles - len(self.particles))
+            self.particles.emit(num_particles, self.center_x, self.center_y, color)
 
     def update_particles(self):
         """Aggiorna le particelle"""
-        self.particles = [p for p in self.particles if p.update()]
+        self.particles.update()
 
     def get_status_color(self):
         """Restituisce il colore in base al livello alcolico"""
         value_to_check = self.current_value
         if self.current_state == self.STATE_RESULT:
             value_to_check = self.max_reached_value
-
-        if value_to_check < 0.5:
-            return NEON_GREEN
-        elif value_to_check < 1.5:
-            return NEON_YELLOW
-        elif value_to_check < 2.0:
-            return ORANGE
-        else:
-            return NEON_RED
+        return STATUS_COLORS[status_index(value_to_check)]
 
     def get_status_text(self):
         """Restituisce il testo dello stato"""
         if self.current_state == self.STATE_RESULT:
-            if self.max_reached_value < 0.5:
-                return "SOBRIO"
-            elif self.max_reached_value < 1.5:
-                return "ATTENZIONE"
-            elif self.max_reached_value < 2.0:
-                return "ALTERATO"
-            else:
-                return "PERICOLOSO"
+            return STATUS_LABELS[status_index(self.max_reached_value)]
         else:
             return "LETTURA IN CORSO..."
 
     def draw_background(self):
         """Disegna lo sfondo con effetti"""
-        # Gradiente di sfondo
-        for y in range(SCREEN_HEIGHT):
-            ratio = y / SCREEN_HEIGHT
-            r = int(20 + ratio * 20)
-            g = int(25 + ratio * 25)
-            b = int(40 + ratio * 30)
-            pygame.draw.line(self.screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+        # Gradiente di sfondo (pre-renderizzato)
+        self.background.draw(self.screen)
 
         # Effetto pulse di sfondo
-        if self.current_value > 1.0 and self.current_state in [self.STATE_READING, self.STATE_RESULT]:
+        if (self.current_value > 1.0 and self.current_state in [self.STATE_READING, self.STATE_RESULT]
+                and self.quality.tier.background_pulse):
             pulse = abs(math.sin(self.pulse_time)) * 30
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            color = (*self.get_status_color()[:3], int(pulse))
-            overlay.fill(color)
-            self.screen.blit(overlay, (0, 0))
+            self.background.draw_pulse(self.screen, self.get_status_color()[:3], int(pulse))
 
     def cycle_colors_hsv(t, speed=0.02):
         h = (t * speed) % 1.0   # Hue da 0 a 1
@@ -360,11 +1569,37 @@ class AlcoholMeter:
     
     def draw_waiting_screen(self):
         """Disegna la schermata di attesa iniziale"""
+        self.draw_waiting_static(self.screen)
+        self.draw_waiting_dynamic()
+
+    def draw_waiting_static(self, surface):
+        """Parti fisse della schermata di attesa"""
         # Titolo principale
-        title_surface = self.font_extra_large.render("Alcohol test Barboun", True, WHITE)
+        title_surface = self.text.render("Alcohol test Barboun", FONT_EXTRA_LARGE, WHITE)
         title_rect = title_surface.get_rect(center=(self.center_x, 200))
-        self.screen.blit(title_surface, title_rect)
+        surface.blit(title_surface, title_rect)
 
+        # Istruzioni in piccolo in basso
+        if not GPIO_AVAILABLE:
+            demo_text = "MODALITÀ DEMO - Premi SPAZIO per simulare il pulsante"
+            demo_surface = self.text.render(demo_text, FONT_SMALL, LIGHT_GRAY)
+            demo_rect = demo_surface.get_rect(center=(self.center_x, SCREEN_HEIGHT - 50))
+            surface.blit(demo_surface, demo_rect)
+
+    def draw_waiting_dynamic(self):
+        """Parti animate della schermata di attesa"""
+        self.draw_waiting_button()
+        self.draw_connection_status()
+
+    def draw_connection_status(self):
+        """Stato della connessione al sensore (o dell'avvio), in basso"""
+        status_text = self.sensor.status_text() if self.startup.done else self.startup.status_text()
+        status_surface = self.text.render(status_text, FONT_SMALL, LIGHT_GRAY)
+        status_rect = status_surface.get_rect(center=(self.center_x, SCREEN_HEIGHT - 20))
+        self.mark_dirty(self.screen.blit(status_surface, status_rect))
+
+    def draw_waiting_button(self):
+        """Pulsante animato della schermata di attesa"""
         # Messaggio pulsante con effetto pulsante
         pulse_alpha = int(128 + 127 * abs(math.sin(self.waiting_pulse * 1)))
         r, g, b = AlcoholMeter.cycle_colors_hsv(self.waiting_pulse, speed=0.05)  # speed regola la velocità del ciclo
@@ -372,240 +1607,135 @@ class AlcoholMeter:
         #button_color = (*NEON_GREEN[:3], pulse_alpha)
         
         button_text = "PREMI IL PULSANTE PER INIZIARE"
-        button_surface = self.font_large.render(button_text, True, WHITE)
+        button_surface = self.text.render(button_text, FONT_LARGE, WHITE)
         button_rect = button_surface.get_rect(center=(self.center_x, self.center_y))
         
         # Sfondo pulsante con glow
         glow_rect = pygame.Rect(button_rect.x - 50, button_rect.y - 30, 
                                button_rect.width + 100, button_rect.height + 60)
-        glow_surface = pygame.Surface((glow_rect.width, glow_rect.height), pygame.SRCALPHA)
+        glow_surface = self.arena.acquire(glow_rect.size)
         pygame.draw.rect(glow_surface, button_color, (0, 0, glow_rect.width, glow_rect.height), 
                         border_radius=30)
-        self.screen.blit(glow_surface, (glow_rect.x, glow_rect.y))
+        self.screen.blit(glow_surface, (glow_rect.x, glow_rect.y), (0, 0, glow_rect.width, glow_rect.height))
         
         # Bordo del pulsante
         pygame.draw.rect(self.screen, NEON_GREEN, glow_rect, 5, border_radius=30)
         
         # Testo del pulsante
         self.screen.blit(button_surface, button_rect)
-
-        # Istruzioni in piccolo in basso
-        if not GPIO_AVAILABLE:
-            demo_text = "MODALITÀ DEMO - Premi SPAZIO per simulare il pulsante"
-            demo_surface = self.font_small.render(demo_text, True, LIGHT_GRAY)
-            demo_rect = demo_surface.get_rect(center=(self.center_x, SCREEN_HEIGHT - 50))
-            self.screen.blit(demo_surface, demo_rect)
+        self.mark_dirty(glow_rect)
 
     def draw_instructions_screen(self):
         """Disegna la schermata delle istruzioni"""
+        self.draw_instructions_static(self.screen)
+        self.draw_instructions_timer()
+
+    def draw_instructions_static(self, surface):
+        """Parti fisse della schermata delle istruzioni"""
         # Titolo
-        title_surface = self.font_large.render("ISTRUZIONI PER L'USO", True, WHITE)
+        title_surface = self.text.render("ISTRUZIONI PER L'USO", FONT_LARGE, WHITE)
         title_rect = title_surface.get_rect(center=(self.center_x, 120))
-        self.screen.blit(title_surface, title_rect)
+        surface.blit(title_surface, title_rect)
 
-        # Box delle istruzioni
-        box_width = 800
-        box_height = 400
-        box_x = (SCREEN_WIDTH - box_width) // 2
-        box_y = 200
-        
         # Sfondo del box
-        box_rect = pygame.Rect(box_x, box_y, box_width, box_height)
-        pygame.draw.rect(self.screen, (30, 30, 60), box_rect, border_radius=20)
-        pygame.draw.rect(self.screen, NEON_YELLOW, box_rect, 5, border_radius=20)
+        box_rect = self.instructions_box
+        pygame.draw.rect(surface, (30, 30, 60), box_rect, border_radius=20)
+        pygame.draw.rect(surface, NEON_YELLOW, box_rect, 5, border_radius=20)
 
         # Disegna le istruzioni
-        y_offset = box_y + 50
+        y_offset = box_rect.y + 50
         for i, instruction in enumerate(self.instructions):
-            instruction_surface = self.font_medium.render(instruction, True, WHITE)
+            instruction_surface = self.text.render(instruction, FONT_MEDIUM, WHITE)
             instruction_rect = instruction_surface.get_rect(center=(self.center_x, y_offset + i * 60))
-            self.screen.blit(instruction_surface, instruction_rect)
+            surface.blit(instruction_surface, instruction_rect)
 
-        # Timer countdown
-        remaining_time = max(0, (self.instructions_duration - self.state_timer) / 60)
+    def draw_instructions_timer(self):
+        """Countdown della schermata delle istruzioni"""
+        remaining_time = max(0, self.instructions_duration - self.state_timer)
         timer_text = f"Il test inizierà tra: {remaining_time:.1f}s"
-        timer_surface = self.font_medium.render(timer_text, True, NEON_GREEN)
-        timer_rect = timer_surface.get_rect(center=(self.center_x, box_y + box_height + 50))
-        self.screen.blit(timer_surface, timer_rect)
+        timer_surface = self.text.render(timer_text, FONT_MEDIUM, NEON_GREEN)
+        timer_rect = timer_surface.get_rect(center=(self.center_x, self.instructions_box.bottom + 50))
+        self.mark_dirty(self.screen.blit(timer_surface, timer_rect))
+
+    def draw_leaderboard_screen(self):
+        """Modalità attrazione: classifica, media e istogramma della serata"""
+        key = (self.stats.version, self.stats.since)
+        if key != self.leaderboard_key:
+            self.leaderboard_panel = self.build_leaderboard_panel()
+            self.leaderboard_key = key
+        self.screen.blit(self.leaderboard_panel, (0, 0))
+        self.draw_connection_status()
+
+    def build_leaderboard_panel(self):
+        """Parti della classifica che cambiano solo con un nuovo risultato"""
+        # Il pannello precedente viene ridisegnato, non ricreato
+        panel = self.leaderboard_panel or pygame.Surface(self.screen.get_size(), pygame.SRCALPHA, self.screen)
+        panel.fill((0, 0, 0, 0))
+
+        title_surface = self.text.render("CLASSIFICA DELLA SERATA", FONT_LARGE, NEON_YELLOW)
+        panel.blit(title_surface, title_surface.get_rect(center=(self.center_x, 70)))
+
+        # Migliori punteggi a sinistra
+        for rank, (peak, timestamp) in enumerate(self.stats.top(), 1):
+            color = STATUS_COLORS[status_index(peak)]
+            hour = time.strftime("%H:%M", time.localtime(timestamp))
+            y = 130 + (rank - 1) * 52
+            # Colonne separate: il font non è a larghezza fissa
+            rank_surface = self.text.render(f"{rank}.", FONT_MEDIUM, color)
+            panel.blit(rank_surface, rank_surface.get_rect(topright=(140, y)))
+            panel.blit(self.text.render(f"{peak:.2f} ‰", FONT_MEDIUM, color), (165, y))
+            panel.blit(self.text.render(hour, FONT_MEDIUM, color), (340, y))
+
+        # Riepilogo e istogramma per categoria a destra
+        x = 580
+        summary = [f"Test: {self.stats.count}", f"Media: {self.stats.mean:.2f} ‰"]
+        for i, line in enumerate(summary):
+            panel.blit(self.text.render(line, FONT_MEDIUM, WHITE), (x, 140 + i * 60))
+
+        bar_width = SCREEN_WIDTH - x - 80
+        most = max(self.stats.buckets) or 1
+        for i, (label, count) in enumerate(zip(STATUS_LABELS, self.stats.buckets)):
+            y = 330 + i * 90
+            panel.blit(self.text.render(f"{label}  {count}", FONT_SMALL, LIGHT_GRAY), (x, y))
+            pygame.draw.rect(panel, DARK_GRAY, (x, y + 30, bar_width, 30), border_radius=8)
+            if count:
+                pygame.draw.rect(panel, STATUS_COLORS[i], (x, y + 30, max(16, bar_width * count // most), 30),
+                                 border_radius=8)
+
+        hint_surface = self.text.render("PREMI IL PULSANTE PER INIZIARE", FONT_SMALL, WHITE)
+        panel.blit(hint_surface, hint_surface.get_rect(center=(self.center_x, SCREEN_HEIGHT - 60)))
+        return panel
 
     def draw_gauge(self):
         """Disegna il tachimetro a mezzaluna orizzontale"""
         if self.current_state not in [self.STATE_READING, self.STATE_RESULT]:
             return
             
-        # Effetto glow per l'arco
-        glow_radius = self.radius + 30
-        glow_surface = pygame.Surface(
-            (glow_radius * 2, glow_radius * 2), pygame.SRCALPHA
-        )
-        glow_color = (*self.get_status_color()[:3], 50 + self.glow_intensity)
-
-        # Disegna solo l'arco superiore per il glow
-        pygame.draw.arc(
-            glow_surface,
-            glow_color,
-            (0, 0, glow_radius * 2, glow_radius * 2),
-            0,
-            math.pi,
-            20,
-        )
-        self.screen.blit(
-            glow_surface, (self.center_x - glow_radius, self.center_y - glow_radius)
-        )
-
-        # Arco della mezzaluna (solo semicerchio superiore)
-        gauge_rect = pygame.Rect(
-            self.center_x - self.radius,
-            self.center_y - self.radius,
-            self.radius * 2,
-            self.radius * 2,
-        )
-
-        # Sfondo dell'arco - solo parte superiore
-        pygame.draw.arc(self.screen, DARK_GRAY, gauge_rect, 0, math.pi, 15)
-
-        # Arco interno nero
-        pygame.draw.arc(self.screen, BLACK, gauge_rect, 0, math.pi, 8)
-
-        # Bordi laterali per chiudere la mezzaluna
-        left_x = self.center_x - self.radius
-        right_x = self.center_x + self.radius
-        pygame.draw.line(
-            self.screen,
-            DARK_GRAY,
-            (left_x, self.center_y),
-            (left_x + 15, self.center_y),
-            8,
-        )
-        pygame.draw.line(
+        # Quadrante statico e glow dal layer pre-renderizzato
+        self.gauge.draw(
             self.screen,
-            DARK_GRAY,
-            (right_x - 15, self.center_y),
-            (right_x, self.center_y),
-            8,
+            (self.center_x, self.center_y),
+            self.radius,
+            self.max_value,
+            self.get_status_color()[:3],
+            50 + int(self.glow_intensity) if self.quality.tier.gauge_glow else 0,
         )
 
-        # Segni del tachimetro lungo l'arco superiore
-        for i in range(11):  # 0 a 2.5 con step di 0.25
-            # Angolo da 180° (sinistra) a 0° (destra) solo nella parte superiore
-            angle = math.radians(180 - (i * 18))  # Da 180° a 0° (18° = 180°/10)
-            value = i * 0.25
-
-            # Colore del segno
-            if value < 0.5:
-                color = GREEN
-            elif value < 1.5:
-                color = YELLOW
-            elif value < 2.0:
-                color = ORANGE
-            else:
-                color = RED
-
-            # Linee dei segni - solo nella parte superiore (sin(angle) >= 0)
-            if math.sin(angle) >= 0:
-                start_x = self.center_x + math.cos(angle) * (self.radius - 40)
-                start_y = self.center_y - math.sin(angle) * (self.radius - 40)
-                end_x = self.center_x + math.cos(angle) * (self.radius - 15)
-                end_y = self.center_y - math.sin(angle) * (self.radius - 15)
-
-                pygame.draw.line(
-                    self.screen, color, (start_x, start_y), (end_x, end_y), 5
-                )
-
-                # Numeri - solo per valori pari e nella parte superiore
-                if i % 2 == 0:
-                    text = self.font_small.render(f"{value:.1f}", True, WHITE)
-                    text_x = (
-                        self.center_x
-                        + math.cos(angle) * (self.radius - 60)
-                        - text.get_width() // 2
-                    )
-                    text_y = (
-                        self.center_y
-                        - math.sin(angle) * (self.radius - 60)
-                        - text.get_height() // 2
-                    )
-                    self.screen.blit(text, (text_x, text_y))
-
     def draw_needle(self):
         """Disegna la freccia del tachimetro"""
         if self.current_state not in [self.STATE_READING, self.STATE_RESULT]:
             return
             
-        angle_rad = math.radians(self.needle_angle)
-        needle_length = self.radius - 50
-
-        # Assicurati che la freccia rimanga nella parte superiore della mezzaluna
-        # Limita l'angolo tra 0° e 180° (solo parte superiore)
+        # Limita l'angolo tra 0° e 180° (solo parte superiore della mezzaluna)
         clamped_angle = max(0, min(180, self.needle_angle))
-        angle_rad = math.radians(clamped_angle)
-
-        # Punta della freccia
-        tip_x = self.center_x + math.cos(angle_rad) * needle_length
-        tip_y = self.center_y - math.sin(angle_rad) * needle_length
-
-        # Base della freccia (più larga)
-        base_width = 20
-        base_length = 40
-
-        # Calcola i punti della freccia
-        # Punto centrale della base
-        base_x = self.center_x + math.cos(angle_rad) * base_length
-        base_y = self.center_y - math.sin(angle_rad) * base_length
 
-        # Angolo perpendicolare per la larghezza
-        perp_angle = angle_rad - math.pi / 2
-
-        # Punti della base della freccia
-        base_left_x = base_x + math.cos(perp_angle) * (base_width / 2)
-        base_left_y = base_y + math.sin(perp_angle) * (base_width / 2)
-        base_right_x = base_x - math.cos(perp_angle) * (base_width / 2)
-        base_right_y = base_y - math.sin(perp_angle) * (base_width / 2)
-
-        # Punti per la forma della freccia
-        arrow_points = [
-            (tip_x, tip_y),  # Punta
-            (base_left_x, base_left_y),  # Base sinistra
-            (base_right_x, base_right_y),  # Base destra
-        ]
-
-        # Disegna la freccia con effetto glow
-        needle_color = self.get_status_color()
-
-        # Effetto glow della freccia
-        glow_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        for i in range(5):
-            glow_color = (*needle_color[:3], 30 - i * 5)
-            if len(arrow_points) >= 3:
-                # Espandi leggermente i punti per il glow
-                expanded_points = []
-                for px, py in arrow_points:
-                    # Calcola la direzione dal centro per espandere
-                    dx = px - self.center_x
-                    dy = py - self.center_y
-                    length = math.sqrt(dx * dx + dy * dy)
-                    if length > 0:
-                        expansion = i * 1.5
-                        expanded_points.append(
-                            (
-                                px + (dx / length) * expansion,
-                                py + (dy / length) * expansion,
-                            )
-                        )
-                    else:
-                        expanded_points.append((px, py))
-                pygame.draw.polygon(glow_surface, glow_color, expanded_points)
-        self.screen.blit(glow_surface, (0, 0))
-
-        # Freccia principale
-        pygame.draw.polygon(self.screen, needle_color, arrow_points)
-        pygame.draw.polygon(self.screen, WHITE, arrow_points, 2)
-
-        # Centro della freccia
-        pygame.draw.circle(
-            self.screen, needle_color, (self.center_x, self.center_y), 12
+        self.needle.draw(
+            self.screen,
+            (self.center_x, self.center_y),
+            clamped_angle,
+            self.radius - 50,
+            self.get_status_color(),
         )
-        pygame.draw.circle(self.screen, WHITE, (self.center_x, self.center_y), 6)
 
     def draw_display(self):
         """Disegna il display digitale"""
@@ -621,9 +1751,7 @@ class AlcoholMeter:
 
             # Formatta il numero con 2 decimali
             value_text = f"{self.current_value:.2f}"
-            value_surface = self.font_digital_large.render(
-                value_text, True, current_color
-            )
+            value_surface = self.text.render(value_text, FONT_DIGITAL_LARGE, current_color)
             value_rect = value_surface.get_rect(center=(self.center_x, display_y + 30))
 
             # Sfondo del display
@@ -642,9 +1770,9 @@ class AlcoholMeter:
             self.screen.blit(value_surface, value_rect)
 
             # Timer di lettura
-            remaining_time = max(0, (self.reading_duration - self.state_timer) / 60)
+            remaining_time = max(0, self.reading_duration - self.state_timer)
             timer_text = f"Tempo: {remaining_time:.1f}s"
-            timer_surface = self.font_small.render(timer_text, True, WHITE)
+            timer_surface = self.text.render(timer_text, FONT_SMALL, WHITE)
             timer_rect = timer_surface.get_rect(center=(self.center_x, display_y - 30))
             self.screen.blit(timer_surface, timer_rect)
 
@@ -653,36 +1781,30 @@ class AlcoholMeter:
             result_color = self.get_status_color()
             scale_factor = self.result_scale
 
-            # Font scalato per l'effetto pulsante
-            scaled_font_size = int(96 * scale_factor)
-            try:
-                scaled_font = pygame.font.Font("digital-7.ttf", scaled_font_size)
-            except:
-                scaled_font = pygame.font.Font(None, scaled_font_size)
+            # Font scalato per l'effetto pulsante (caricato una volta per dimensione)
+            scaled_font = (DIGITAL_FONT, int(FONT_DIGITAL_LARGE[1] * scale_factor))
 
             # Formatta il valore massimo
             max_value_text = f"{self.max_reached_value:.2f}"
-            max_value_surface = scaled_font.render(max_value_text, True, result_color)
+            max_value_surface = self.text.render(max_value_text, scaled_font, result_color)
             max_value_rect = max_value_surface.get_rect(
                 center=(self.center_x, display_y + 30)
             )
 
             # Effetto glow pulsante
-            glow_alpha = int(self.result_glow)
+            glow_alpha = int(self.result_glow) if self.quality.tier.result_glow else 0
             if glow_alpha > 0:
-                glow_surface = pygame.Surface(
-                    (max_value_rect.width + 150, max_value_rect.height + 100),
-                    pygame.SRCALPHA,
-                )
+                glow_area = (0, 0, max_value_rect.width + 150, max_value_rect.height + 100)
+                glow_surface = self.arena.acquire(glow_area[2:])
                 glow_color = (*result_color[:3], glow_alpha)
                 pygame.draw.rect(
                     glow_surface,
                     glow_color,
-                    (0, 0, max_value_rect.width + 150, max_value_rect.height + 100),
+                    glow_area,
                     border_radius=30,
                 )
                 self.screen.blit(
-                    glow_surface, (max_value_rect.x - 75, max_value_rect.y - 50)
+                    glow_surface, (max_value_rect.x - 75, max_value_rect.y - 50), glow_area
                 )
 
             # Sfondo del display risultato (più spesso e colorato)
@@ -701,15 +1823,15 @@ class AlcoholMeter:
             self.screen.blit(max_value_surface, max_value_rect)
 
             # Timer per il prossimo ciclo
-            remaining_time = max(0, (self.result_duration - self.state_timer) / 60)
+            remaining_time = max(0, self.result_duration - self.state_timer)
             timer_text = f"Nuovo test in: {remaining_time:.1f}s"
-            timer_surface = self.font_small.render(timer_text, True, WHITE)
+            timer_surface = self.text.render(timer_text, FONT_SMALL, WHITE)
             timer_rect = timer_surface.get_rect(center=(self.center_x, display_y - 40))
             self.screen.blit(timer_surface, timer_rect)
 
         # Unità di misura (sempre presente)
         unit_text = "‰ BAC"
-        unit_surface = self.font_small.render(unit_text, True, WHITE)
+        unit_surface = self.text.render(unit_text, FONT_SMALL, WHITE)
         unit_rect = unit_surface.get_rect(center=(self.center_x, display_y + 90))
         self.screen.blit(unit_surface, unit_rect)
 
@@ -720,92 +1842,312 @@ class AlcoholMeter:
             
         # Status text
         status_text = self.get_status_text()
-        status_surface = self.font_medium.render(
-            status_text, True, self.get_status_color()
-        )
+        status_surface = self.text.render(status_text, FONT_MEDIUM, self.get_status_color())
         status_rect = status_surface.get_rect(center=(self.center_x, 100))
         self.screen.blit(status_surface, status_rect)
 
         # Titolo
-        title_surface = self.font_large.render("ETILOMETRO DIGITALE", True, WHITE)
+        title_surface = self.text.render("ETILOMETRO DIGITALE", FONT_LARGE, WHITE)
         title_rect = title_surface.get_rect(center=(self.center_x, 50))
         self.screen.blit(title_surface, title_rect)
 
-        # Istruzioni (se in modalità demo)
-        if not self.ser:
-            demo_text = "MODALITÀ DEMO - Usa frecce SU/GIÙ per testare"
-            demo_surface = self.font_small.render(demo_text, True, LIGHT_GRAY)
-            demo_rect = demo_surface.get_rect(
-                center=(self.center_x, SCREEN_HEIGHT - 30)
-            )
-            self.screen.blit(demo_surface, demo_rect)
+        # Stato della connessione (con istruzioni se in modalità demo)
+        status_text = self.sensor.status_text()
+        if not self.sensor.connected:
+            status_text += " - MODALITÀ DEMO: frecce SU/GIÙ"
+        status_surface = self.text.render(status_text, FONT_SMALL, LIGHT_GRAY)
+        status_rect = status_surface.get_rect(center=(self.center_x, SCREEN_HEIGHT - 30))
+        self.screen.blit(status_surface, status_rect)
 
     def handle_events(self):
-        """Gestisce gli eventi"""
-        for event in pygame.event.get():
+        """Gestisce gli eventi: QUIT, tasti e input degli altri backend passano da handle_input"""
+        for event in self.scheduler.take_events():
             if event.type == pygame.QUIT:
                 self.running = False
+            elif event.type == INPUT_EVENT:
+                self.handle_input(event)
             elif event.type == pygame.KEYDOWN:
-                # Simulazione pulsante GPIO con SPAZIO se non c'è GPIO
-                if event.key == pygame.K_SPACE and not GPIO_AVAILABLE:
-                    if self.current_state == self.STATE_WAITING:
-                        self.button_pressed = True
-                        
-                # Test con tastiera se non c'è seriale (solo durante la lettura)
-                if not self.ser and self.current_state == self.STATE_READING:
-                    if event.key == pygame.K_UP:
-                        self.target_value = min(self.max_value, self.target_value + 0.1)
-                    elif event.key == pygame.K_DOWN:
-                        self.target_value = max(0, self.target_value - 0.1)
-                    elif event.key == pygame.K_r:
-                        self.target_value = 0
-                        self.max_reached_value = 0
-                        
-                if event.key == pygame.K_ESCAPE:
-                    self.running = False
+                self.scheduler.notify_activity()
+                event = self.keyboard.translate(event)
+                if event:
+                    self.handle_input(event)
+
+    def handle_input(self, event):
+        """Applica un input di qualunque sorgente; è l'unico punto che ne modifica lo stato"""
+        action = event.action
+        if action == BUTTON:
+            self.scheduler.notify_activity()
+            if self.current_state in (self.STATE_WAITING, self.STATE_LEADERBOARD) and self.press_time is None:
+                self.press_time = event.time
+                print("Pulsante premuto - avvio test")
+
+        elif action in (VALUE_UP, VALUE_DOWN, VALUE_RESET):
+            # Test con tastiera se non c'è seriale (solo durante la lettura)
+            if not self.sensor.connected and self.current_state == self.STATE_READING:
+                if action == VALUE_UP:
+                    self.target_value = min(self.max_value, self.target_value + KEYBOARD_STEP)
+                elif action == VALUE_DOWN:
+                    self.target_value = max(0, self.target_value - KEYBOARD_STEP)
+                else:
+                    self.target_value = 0
+                    self.max_reached_value = 0
+                    self.pipeline.reset_peak()
+
+        elif action == TOGGLE_HUD:
+            self.show_hud = not self.show_hud
+            if self.show_hud and not self.profiler.enabled:
+                self.profiler.set_enabled(True)
+
+        elif action == SENSOR:
+            # Connessioni e disconnessioni non sono attività dell'utente: un sensore che si
+            # riconnette di continuo non deve impedire la modalità idle, basta ridisegnare lo stato
+            self.scheduler.request_redraw()
+
+        elif action == QUIT:
+            self.running = False
+
+    def update_simulation(self):
+        """Avanza la simulazione a passo fisso in base al tempo reale trascorso"""
+        self.consume_samples()
+        self.profiler.mark("campioni")
+
+        now = self.time_source()
+        if self.last_update_time is None:
+            self.last_update_time = now
+        # In idle un frame dura fino a un secondo: il limite parte dal periodo dello stato,
+        # altrimenti timer di attrazione e classifica rallenterebbero
+        max_frame_time = self.scheduler.frame_period(self.current_state) + MAX_FRAME_TIME
+        frame_time = min(now - self.last_update_time, max_frame_time)
+        self.last_update_time = now
+
+        self.accumulator += frame_time
+        while self.accumulator >= SIMULATION_DT:
+            self.update_values(SIMULATION_DT)
+            self.profiler.mark("stato")
+            self.add_particles()
+            self.profiler.mark("emissione")
+            self.update_particles()
+            self.profiler.mark("particelle")
+            self.accumulator -= SIMULATION_DT
+
+    def mark_dirty(self, rect):
+        """Registra una zona modificata nel frame corrente"""
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def draw_frame(self):
+        """Ridisegna l'intero schermo e lo presenta con flip"""
+        self.dirty_rects.clear()
+        self.static_layer_key = None
+
+        # Disegna lo sfondo
+        self.draw_background()
+        self.profiler.mark("sfondo")
+
+        # Disegna la schermata appropriata in base allo stato
+        if self.current_state == self.STATE_WAITING:
+            self.draw_waiting_screen()
+        elif self.current_state == self.STATE_INSTRUCTIONS:
+            self.draw_instructions_screen()
+        elif self.current_state == self.STATE_LEADERBOARD:
+            self.draw_leaderboard_screen()
+        elif self.current_state in [self.STATE_READING, self.STATE_RESULT]:
+            self.draw_gauge()
+            self.draw_needle()
+            self.draw_display()
+            self.draw_status()
+            self.graph.draw(self.screen)
+        self.profiler.mark("schermata")
+
+        # Disegna particelle (solo durante lettura/risultato)
+        if self.current_state in [self.STATE_READING, self.STATE_RESULT]:
+            self.particles.draw(self.screen)
+            self.profiler.mark("disegno_particelle")
+
+        if self.show_hud:
+            self.draw_hud()
+            self.profiler.mark("hud")
+
+        pygame.display.flip()
+        self.arena.reset()
+        self.profiler.mark("flip")
+        self.pixels_pushed += SCREEN_WIDTH * SCREEN_HEIGHT
+        self.frames_presented += 1
+
+    def build_static_layer(self):
+        """Sfondo più parti fisse dello stato corrente, usato per ripristinare le zone sporche"""
+        if self.static_layer is None:
+            self.static_layer = pygame.Surface(self.screen.get_size(), 0, self.screen)
+        self.background.draw(self.static_layer)
+        if self.current_state == self.STATE_WAITING:
+            self.draw_waiting_static(self.static_layer)
+        else:
+            self.draw_instructions_static(self.static_layer)
+
+    def draw_dirty_frame(self):
+        """Aggiorna solo le zone animate e le presenta con display.update"""
+        key = (self.current_state, GPIO_AVAILABLE, self.screen.get_size())
+        full_redraw = key != self.static_layer_key
+        if full_redraw:
+            self.build_static_layer()
+            self.static_layer_key = key
+            self.screen.blit(self.static_layer, (0, 0))
+        else:
+            # Cancella le zone del frame precedente
+            for rect in self.previous_dirty_rects:
+                self.screen.blit(self.static_layer, rect, rect)
+
+        self.dirty_rects.clear()
+        if self.current_state == self.STATE_WAITING:
+            self.draw_waiting_dynamic()
+        else:
+            self.draw_instructions_timer()
+        self.profiler.mark("schermata")
+
+        if self.show_hud:
+            self.mark_dirty(self.draw_hud())
+            self.profiler.mark("hud")
+
+        if self.debug_dirty:
+            for rect in self.dirty_rects:
+                pygame.draw.rect(self.screen, (255, 0, 255), rect, 2)
+
+        if full_redraw:
+            pygame.display.flip()
+            self.pixels_pushed += SCREEN_WIDTH * SCREEN_HEIGHT
+        else:
+            # Unisce le zone sovrapposte (vecchia e nuova posizione dello stesso elemento)
+            updated = []
+            for rect in self.previous_dirty_rects + self.dirty_rects:
+                for i, other in enumerate(updated):
+                    if rect.colliderect(other):
+                        updated[i] = other.union(rect)
+                        break
+                else:
+                    updated.append(rect)
+            pygame.display.update(updated)
+            self.pixels_pushed += sum(rect.width * rect.height for rect in updated)
+        self.arena.reset()
+        self.profiler.mark("flip")
+        self.frames_presented += 1
+        self.previous_dirty_rects = list(self.dirty_rects)
+
+    def draw_hud(self):
+        """Pannello delle prestazioni in alto a sinistra, ricostruito solo a ogni nuovo riepilogo"""
+        summary = self.profiler.summary
+        if self.hud_version != self.profiler.version or self.hud_surface is None:
+            self.hud_version = self.profiler.version
+            if summary:
+                lines = [
+                    f"FPS {summary['fps']:.1f}   frame p50 {summary['p50']:.2f} ms   p99 {summary['p99']:.2f} ms",
+                    f"particelle {summary['particles']}   qualità {self.quality.tier.name}",
+                ] + [f"{name} {ms:.3f} ms" for name, ms in summary["stages"]]
+            else:
+                lines = ["profiler in avvio..."]
+            rendered = [self.text.render(line, FONT_HUD, WHITE) for line in lines]
+            width = max(surface.get_width() for surface in rendered) + HUD_PADDING * 2
+            height = sum(surface.get_height() for surface in rendered) + HUD_PADDING * 2
+            if self.hud_surface:
+                self.arena.release(self.hud_surface)
+            self.hud_surface = self.arena.acquire((width, height), keep=True)
+            self.hud_area = (0, 0, width, height)
+            self.hud_surface.fill(HUD_BACKGROUND, self.hud_area)
+            y = HUD_PADDING
+            for surface in rendered:
+                self.hud_surface.blit(surface, (HUD_PADDING, y))
+                y += surface.get_height()
+        return self.screen.blit(self.hud_surface, (10, 10), self.hud_area)
 
     def cleanup(self):
         """Pulizia delle risorse"""
-        if GPIO_AVAILABLE:
+        # Prima si ferma l'avvio: una fase eseguita dopo la pulizia (GPIO) lascerebbe risorse aperte;
+        # registrazioni e archivio già aperti dall'avvio vengono chiusi qui sotto
+        self.startup.cancel()
+        if self.gpio_input:
             try:
-                GPIO.cleanup()
+                self.gpio_input.stop()
                 print("GPIO cleanup completato")
             except Exception as e:
                 print(f"Errore durante GPIO cleanup: {e}")
         
-        if self.ser:
-            self.ser.close()
+        self.sensor.stop()
+        if self.recorder:
+            self.recorder.close()
+        if self.results:
+            self.results.close()
+            stats = self.results.stats()
+            print(f"Risultati: {stats['written']} salvati, {stats['dropped']} scartati, {stats['errors']} errori")
+        stats = self.sensor.stats()
+        print(f"Seriale: {stats['samples']} campioni, {stats['malformed']} malformati, "
+              f"{stats['dropped']} persi, {stats['errors']} errori, {stats['connections']} connessioni")
+        if stats["frames"]:
+            print(f"Frame binari: {stats['frames']} ricevuti, {stats['crc_errors']} CRC errati, "
+                  f"{stats['sequence_gaps']} salti di sequenza ({stats['missing_frames']} frame mancanti)")
+
+        # Utilizzo CPU per stato
+        for key, (cpu_percent, seconds) in self.scheduler.cpu_report().items():
+            name = self.state_names.get(key, key)
+            print(f"CPU {name}: {cpu_percent:.1f}% su {seconds:.1f}s")
+
+        # Tempi per fase del frame (solo con il profiler attivo)
+        for name, histogram in self.profiler.histograms():
+            if histogram.count:
+                print(f"Fase {name}: media {histogram.mean / 1e6:.3f} ms, "
+                      f"p99 {histogram.percentile(0.99) / 1e6:.3f} ms su {histogram.count} frame")
+
+        print(f"Qualità finale: {self.quality.tier.name} ({self.quality.changes} cambi di livello)")
+
+        latency = self.input_latency
+        if latency.count:
+            print(f"Latenza pulsante-istruzioni: media {latency.mean / 1e6:.1f} ms, "
+                  f"p99 {latency.percentile(0.99) / 1e6:.1f} ms, max {latency.max / 1e6:.1f} ms "
+                  f"su {latency.count} pressioni")
+
+    def step(self, force_render=False):
+        """Un'iterazione del loop principale, senza attesa del frame successivo"""
+        frame_start = time.perf_counter()
+        self.profiler.begin_frame()
+        self.handle_events()
+        self.profiler.mark("eventi")
+        self.update_simulation()
+
+        if force_render or self.scheduler.should_render(self.current_state):
+            if self.dirty_rects_enabled and self.current_state in [self.STATE_WAITING, self.STATE_INSTRUCTIONS]:
+                self.draw_dirty_frame()
+            else:
+                self.draw_frame()
+            if self.latency_start is not None and self.current_state == self.STATE_INSTRUCTIONS:
+                # Primo frame delle istruzioni presentato: latenza dal fronte del pulsante
+                self.input_latency.record(int((time.monotonic() - self.latency_start) * 1e9))
+                self.latency_start = None
+            # I frame dell'avvio includono la preparazione delle cache: non contano per la qualità
+            if self.startup.done:
+                self.update_quality(time.perf_counter() - frame_start)
+
+        if not self.startup.done:
+            self.startup.poll()
+            self.profiler.mark("avvio")
+
+        self.profiler.end_frame(len(self.particles), self.quality.index)
+
+    def update_quality(self, work):
+        """Passa al governatore il tempo di lavoro del frame e applica l'eventuale nuovo livello"""
+        # I frame idle hanno un budget di centinaia di millisecondi: sembrerebbero sempre
+        # leggeri e farebbero risalire il livello
+        if self.scheduler.is_idle(self.current_state):
+            return
+        fps = self.scheduler.target_fps(self.current_state)
+        if fps <= 0 or not self.quality.record(work, 1.0 / fps):
+            return
+        tier = self.quality.tier
+        self.needle.set_glow(tier.needle_glow)
+        print(f"Qualità {tier.name}: p90 del tempo di frame al {self.quality.load:.0%} del budget")
 
     def run(self):
         """Loop principale"""
         try:
             while self.running:
-                self.handle_events()
-                self.update_values()
-                self.add_particles()
-                self.update_particles()
-
-                # Disegna lo sfondo
-                self.draw_background()
-
-                # Disegna la schermata appropriata in base allo stato
-                if self.current_state == self.STATE_WAITING:
-                    self.draw_waiting_screen()
-                elif self.current_state == self.STATE_INSTRUCTIONS:
-                    self.draw_instructions_screen()
-                elif self.current_state in [self.STATE_READING, self.STATE_RESULT]:
-                    self.draw_gauge()
-                    self.draw_needle()
-                    self.draw_display()
-                    self.draw_status()
-
-                # Disegna particelle (solo durante lettura/risultato)
-                if self.current_state in [self.STATE_READING, self.STATE_RESULT]:
-                    for particle in self.particles:
-                        particle.draw(self.screen)
-
-                pygame.display.flip()
-                self.clock.tick(FPS)
+                self.step()
+                self.scheduler.wait(self.current_state)
 
         except KeyboardInterrupt:
             print("\nInterrotto dall'utente")
@@ -814,8 +2156,75 @@ class AlcoholMeter:
             pygame.quit()
 
 
+def parse_args():
+    """Opzioni da riga di comando"""
+    parser = argparse.ArgumentParser(description="Alcohol test Barboun")
+    parser.add_argument("--fps", type=int, default=FPS,
+                        help="frequenza di rendering (la simulazione resta a passo fisso)")
+    parser.add_argument("--port", action="append", dest="ports",
+                        help="porta seriale da provare (ripetibile); si aggiungono /dev/ttyUSB* e /dev/ttyACM*")
+    parser.add_argument("--baud", action="append", type=int, dest="baud_rates",
+                        help="baud rate da provare (ripetibile, default 9600 e 115200)")
+    parser.add_argument("--protocol", choices=sorted(PARSERS), default="auto",
+                        help="protocollo seriale: righe ASCII, frame binari o riconoscimento automatico")
+    parser.add_argument("--simulate", action="store_true",
+                        help="avvia un sensore simulato su pty (vedi simulator.py) e si collega a quello")
+    parser.add_argument("--record", metavar="FILE", default=RECORDING_FILE,
+                        help=f"file in cui registrare le sessioni di misura (default {RECORDING_FILE})")
+    parser.add_argument("--no-record", action="store_true", help="non registra le sessioni")
+    parser.add_argument("--results", metavar="FILE", default=RESULTS_FILE,
+                        help=f"archivio CSV dei risultati (default {RESULTS_FILE})")
+    parser.add_argument("--no-results", action="store_true", help="non salva i risultati")
+    parser.add_argument("--replay", metavar="FILE", help="riproduce le sessioni registrate al posto del sensore")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="fattore di velocità della riproduzione (es. 4 = quattro volte più veloce)")
+    parser.add_argument("--calibration", metavar="FILE",
+                        help="curva di calibrazione JSON: il sensore invia conteggi ADC grezzi")
+    parser.add_argument("--device", help="sensore da usare nel file di calibrazione")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="secondi senza input prima della modalità a basso consumo")
+    parser.add_argument("--idle-fps", type=float, default=IDLE_FPS,
+                        help="frequenza in modalità idle (0 = frame statico)")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="aggiorna solo le zone modificate nelle schermate di attesa e istruzioni")
+    parser.add_argument("--debug-dirty", action="store_true",
+                        help="evidenzia le zone aggiornate (con --dirty-rects)")
+    parser.add_argument("--acquisition", action="store_true",
+                        help="legge il sensore da un processo separato (acquisition.py), avviato se non è attivo "
+                             "e lasciato in esecuzione all'uscita")
+    parser.add_argument("--quality", choices=[tier.name for tier in QUALITY_TIERS],
+                        help="livello fisso degli effetti (default: adattivo al tempo dei frame)")
+    parser.add_argument("--profile", action="store_true",
+                        help="misura i tempi delle fasi del frame e mostra l'HUD (F3 lo mostra/nasconde)")
+    parser.add_argument("--profile-export", metavar="FILE",
+                        help="esporta periodicamente i tempi: .prom = textfile Prometheus, altrimenti CSV")
+    parser.add_argument("--profile-interval", type=float, default=PROFILE_EXPORT_INTERVAL,
+                        help="secondi tra due esportazioni del profiler")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    app = AlcoholMeter()
+    args = parse_args()
+    if args.simulate:
+        from simulator import PtySensorSimulator
+        curve = CalibrationCurve.load(args.calibration, args.device) if args.calibration else None
+        simulator = PtySensorSimulator(protocol_name="binary" if args.protocol == "binary" else "ascii",
+                                       calibration=curve)
+        simulator.start()
+        atexit.register(simulator.stop)
+        args.ports = [simulator.link] + (args.ports or [])
+    # Con la riproduzione accelerata tutto il tempo dell'applicazione scorre più veloce
+    time_source = ScaledClock(args.replay_speed) if args.replay and args.replay_speed != 1.0 else time.monotonic
+    app = AlcoholMeter(dirty_rects=args.dirty_rects, debug_dirty=args.debug_dirty, fps=args.fps,
+                       time_source=time_source, idle_timeout=args.idle_timeout, idle_fps=args.idle_fps,
+                       serial_ports=args.ports, baud_rates=args.baud_rates,
+                       calibration_file=args.calibration, device=args.device, protocol=args.protocol,
+                       record_file=None if args.no_record else args.record,
+                       replay_file=args.replay, replay_speed=args.replay_speed,
+                       results_file=None if args.no_results else args.results,
+                       profile=args.profile, profile_export=args.profile_export,
+                       profile_interval=args.profile_interval, acquisition=args.acquisition,
+                       quality=args.quality)
     app.run()
     GPIO_AVAILABLE = True
     app.run()
\ No newline at end of file
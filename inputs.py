@@ -0,0 +1,80 @@
+"""Sorgenti di input: ogni backend pubblica eventi con timestamp nella coda di pygame
+
+Il thread principale li legge una volta per frame in handle_events: pulsante GPIO, riproduzione
+e sensore non modificano lo stato dell'applicazione dai propri thread.
+"""
+import time
+
+import pygame
+
+# Evento degli input; attributi: action, source e time (time.monotonic() all'origine dell'input)
+INPUT_EVENT = pygame.USEREVENT + 2
+
+# Azioni
+BUTTON = "pulsante"
+VALUE_UP = "valore su"
+VALUE_DOWN = "valore giù"
+VALUE_RESET = "azzera"
+TOGGLE_HUD = "hud"
+QUIT = "esci"
+SENSOR = "sensore"          # attributo connected
+
+# Passo dei tasti freccia nella modalità demo (‰)
+KEYBOARD_STEP = 0.1
+
+# Antirimbalzo del pulsante GPIO (millisecondi)
+BUTTON_BOUNCE_TIME = 300
+
+
+def make_event(action, source, timestamp=None, **attributes):
+    return pygame.event.Event(INPUT_EVENT, action=action, source=source,
+                              time=time.monotonic() if timestamp is None else timestamp, **attributes)
+
+
+def post_input(action, source, timestamp=None, **attributes):
+    """Accoda un input; si può chiamare da qualunque thread"""
+    pygame.event.post(make_event(action, source, timestamp, **attributes))
+
+
+class KeyboardInput:
+    """Tasti: SPAZIO come pulsante (senza GPIO), frecce e R per la demo, F3 per l'HUD, ESC per uscire.
+    I tasti arrivano già dalla coda di pygame: vengono tradotti senza essere riaccodati."""
+
+    KEYS = {
+        pygame.K_UP: VALUE_UP,
+        pygame.K_DOWN: VALUE_DOWN,
+        pygame.K_r: VALUE_RESET,
+        pygame.K_F3: TOGGLE_HUD,
+        pygame.K_ESCAPE: QUIT,
+    }
+
+    def __init__(self, button=True):
+        self.button = button
+
+    def translate(self, event):
+        """Evento di input corrispondente a un KEYDOWN, oppure None"""
+        if event.key == pygame.K_SPACE:
+            return make_event(BUTTON, "tastiera") if self.button else None
+        action = self.KEYS.get(event.key)
+        return make_event(action, "tastiera") if action else None
+
+
+class GPIOInput:
+    """Pulsante su GPIO: il fronte di discesa diventa un evento BUTTON con l'istante del callback"""
+
+    def __init__(self, gpio, pin, bouncetime=BUTTON_BOUNCE_TIME):
+        self.gpio = gpio
+        self.pin = pin
+        self.bouncetime = bouncetime
+
+    def start(self):
+        gpio = self.gpio
+        gpio.setmode(gpio.BCM)
+        gpio.setup(self.pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(self.pin, gpio.FALLING, callback=self.edge, bouncetime=self.bouncetime)
+
+    def edge(self, channel):
+        post_input(BUTTON, "gpio")
+
+    def stop(self):
+        self.gpio.cleanup()
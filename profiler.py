@@ -0,0 +1,234 @@
+"""Profiler delle fasi del frame: istogrammi a dimensione fissa, riepilogo per l'HUD ed esportazione
+
+Le fasi si misurano con mark(nome), che attribuisce al nome il tempo trascorso dal mark precedente.
+Da disattivato ogni chiamata è un solo controllo di un attributo.
+"""
+import os
+import threading
+import time
+
+# Bucket degli istogrammi: 4 per ottava di nanosecondi, fino a circa 8 secondi
+HISTOGRAM_BUCKETS = 128
+SUB_BUCKETS = 4
+
+# Finestra su cui si calcolano FPS e percentili mostrati nell'HUD (secondi)
+HUD_WINDOW = 1.0
+
+# Intervallo tra due esportazioni (secondi)
+PROFILE_EXPORT_INTERVAL = 10.0
+
+# Prefisso delle metriche Prometheus
+METRIC_PREFIX = "alcoholpunch"
+
+
+def bucket_bounds(index):
+    """Limiti [inferiore, superiore) in nanosecondi di un bucket"""
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS
+    return (SUB_BUCKETS + sub) << shift, (SUB_BUCKETS + sub + 1) << shift
+
+
+class Histogram:
+    """Istogramma logaritmico di durate in nanosecondi, senza allocazioni per campione"""
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        if ns < SUB_BUCKETS:
+            index = max(ns, 0)
+        else:
+            bits = ns.bit_length()
+            index = min((bits - 2) * SUB_BUCKETS + ((ns >> (bits - 3)) & 3), HISTOGRAM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def reset(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Percentile q (0-1) in nanosecondi, al centro del bucket"""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold and count:
+                low, high = bucket_bounds(index)
+                return min((low + high) / 2, self.max)
+        return float(self.max)
+
+
+class FrameProfiler:
+    """Tempo per fase di ogni frame, riepilogato ogni HUD_WINDOW secondi ed esportato periodicamente"""
+
+    def __init__(self, enabled=False, export_path=None, export_interval=PROFILE_EXPORT_INTERVAL,
+                 clock=time.perf_counter_ns):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.clock = clock
+
+        # Istogrammi della finestra corrente (HUD) e cumulativi (esportazione)
+        self.window = {}
+        self.totals = {}
+        self.frame_window = Histogram()
+        self.frame_total = Histogram()
+
+        self.current = {}
+        self.frame_start = None
+        self.last_mark = None
+        self.window_start = None
+        self.window_frames = 0
+        self.next_export = None
+        self.particles = 0
+        self.quality = 0
+
+        # Ultimo riepilogo per l'HUD; version cambia a ogni finestra
+        self.summary = None
+        self.version = 0
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.last_mark = None
+        self.window_start = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = self.clock()
+        self.frame_start = self.last_mark = now
+        if self.window_start is None:
+            self.window_start = now
+        self.current.clear()
+
+    def mark(self, name):
+        """Attribuisce a name il tempo dall'ultimo mark"""
+        if not self.enabled or self.last_mark is None:
+            return
+        now = self.clock()
+        self.current[name] = self.current.get(name, 0) + now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self, particles=0, quality=0):
+        """Chiude il frame (prima dell'attesa del prossimo): registra fasi e durata complessiva"""
+        if not self.enabled or self.last_mark is None:
+            return
+        now = self.clock()
+        for name, ns in self.current.items():
+            if name not in self.window:
+                self.window[name] = Histogram()
+                self.totals[name] = Histogram()
+            self.window[name].record(ns)
+            self.totals[name].record(ns)
+        self.frame_window.record(now - self.frame_start)
+        self.frame_total.record(now - self.frame_start)
+        self.window_frames += 1
+        self.particles = particles
+        self.quality = quality
+        self.last_mark = None
+
+        if now - self.window_start >= HUD_WINDOW * 1e9:
+            self.roll_window(now)
+        if self.export_path:
+            if self.next_export is None:
+                self.next_export = now + self.export_interval * 1e9
+            elif now >= self.next_export:
+                self.next_export = now + self.export_interval * 1e9
+                self.export()
+
+    def roll_window(self, now):
+        """Calcola il riepilogo dell'HUD e azzera gli istogrammi della finestra"""
+        elapsed = (now - self.window_start) / 1e9
+        frames = self.frame_window.count or 1
+        self.summary = {
+            "fps": self.window_frames / elapsed,
+            "p50": self.frame_window.percentile(0.5) / 1e6,
+            "p99": self.frame_window.percentile(0.99) / 1e6,
+            "particles": self.particles,
+            # Tempo medio per frame di ogni fase (ms), dalla più costosa
+            "stages": sorted(((name, h.total / frames / 1e6) for name, h in self.window.items()),
+                             key=lambda item: -item[1]),
+        }
+        self.version += 1
+        for histogram in self.window.values():
+            histogram.reset()
+        self.frame_window.reset()
+        self.window_frames = 0
+        self.window_start = now
+
+    def export(self):
+        """Scrive l'istantanea in un thread: il frame non attende il disco"""
+        if self.export_path.endswith(".prom"):
+            text, mode = self.prometheus_text(), "replace"
+        else:
+            text, mode = self.csv_rows(), "append"
+        threading.Thread(target=self.write_export, args=(text, mode), daemon=True).start()
+
+    def write_export(self, text, mode):
+        try:
+            if mode == "replace":
+                # Textfile collector: il file va sostituito in modo atomico
+                temporary = f"{self.export_path}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(temporary, self.export_path)
+            else:
+                new = not os.path.exists(self.export_path)
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    if new:
+                        f.write("timestamp,stage,count,mean_ms,p50_ms,p99_ms,max_ms\n")
+                    f.write(text)
+        except OSError as e:
+            print(f"Errore esportazione profiler: {e}")
+
+    def histograms(self):
+        return [("frame", self.frame_total)] + sorted(self.totals.items())
+
+    def csv_rows(self):
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return "".join(
+            f"{timestamp},{name},{h.count},{h.mean / 1e6:.4f},{h.percentile(0.5) / 1e6:.4f},"
+            f"{h.percentile(0.99) / 1e6:.4f},{h.max / 1e6:.4f}\n"
+            for name, h in self.histograms()
+        )
+
+    def prometheus_text(self):
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Tempo per fase del frame", f"# TYPE {name} histogram"]
+        for stage, h in self.histograms():
+            # Un limite per ottava da 1 µs in su: i bucket fini restano interni
+            cumulative = 0
+            for index, count in enumerate(h.counts):
+                cumulative += count
+                if index % SUB_BUCKETS == SUB_BUCKETS - 1 and index >= 8 * SUB_BUCKETS:
+                    upper = bucket_bounds(index)[1] / 1e9
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{upper:.9g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {h.total / 1e9:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        if self.summary:
+            lines.append(f"# TYPE {METRIC_PREFIX}_fps gauge")
+            lines.append(f"{METRIC_PREFIX}_fps {self.summary['fps']:.2f}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_particles gauge")
+        lines.append(f"{METRIC_PREFIX}_particles {self.particles}")
+        # Livello di qualità attivo: 0 = effetti completi
+        lines.append(f"# TYPE {METRIC_PREFIX}_quality_tier gauge")
+        lines.append(f"{METRIC_PREFIX}_quality_tier {self.quality}")
+        return "\n".join(lines) + "\n"
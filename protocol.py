@@ -0,0 +1,202 @@
+"""Protocolli seriali del sensore: righe ASCII oppure frame binari a blocchi con CRC
+
+Frame binario (little endian):
+    A5 5A | flags u8 | count u8 | seq u16 | interval_us u16 | count x u16 | crc16 u16
+Il CRC (CRC-16/CCITT, valore iniziale 0xFFFF) copre tutto tranne il sync e il CRC stesso.
+Con FLAG_RAW i campioni sono conteggi ADC, altrimenti millesimi di ‰ BAC.
+"""
+import binascii
+import struct
+
+import numpy as np
+
+SYNC = b"\xa5\x5a"
+HEADER = struct.Struct("<BBHH")
+CRC = struct.Struct("<H")
+SAMPLE_DTYPE = np.dtype("<u2")
+
+FLAG_RAW = 0x01
+
+# Campioni massimi per frame (count è un byte)
+MAX_FRAME_SAMPLES = 255
+
+FRAME_OVERHEAD = len(SYNC) + HEADER.size + CRC.size
+
+# Righe ASCII più lunghe di così senza terminatore vengono scartate come malformate
+MAX_LINE_LENGTH = 64
+
+# Byte esaminati dal riconoscimento automatico prima di ripiegare sull'ASCII
+AUTODETECT_LIMIT = 4096
+
+EMPTY = np.zeros(0)
+
+
+def encode_frame(seq, samples, interval_us, flags=0):
+    """Costruisce un frame binario (usato dal simulatore e dai benchmark)"""
+    samples = np.asarray(samples, dtype=SAMPLE_DTYPE)
+    body = HEADER.pack(flags, len(samples), seq & 0xFFFF, interval_us) + samples.tobytes()
+    return SYNC + body + CRC.pack(binascii.crc_hqx(body, 0xFFFF))
+
+
+class AsciiLineParser:
+    """Una riga di testo per campione"""
+
+    name = "ascii"
+
+    def __init__(self):
+        self.pending = b""
+        self.malformed = 0
+
+    def feed(self, data):
+        """Restituisce (valori, età) dei campioni completi; l'età non è nota in ASCII"""
+        *lines, self.pending = (self.pending + data).split(b"\n")
+        if len(self.pending) > MAX_LINE_LENGTH:
+            self.malformed += 1
+            self.pending = b""
+
+        values = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                values.append(float(line))
+            except ValueError:
+                self.malformed += 1
+        return np.array(values, dtype=np.float64), None
+
+    def stats(self):
+        return {"malformed": self.malformed}
+
+
+class BinaryFrameParser:
+    """Frame binari con numero di sequenza; nessuna allocazione di stringhe per campione"""
+
+    name = "binary"
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.sequence_gaps = 0
+        self.missing_frames = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        """Restituisce (valori, età in secondi rispetto all'ultimo campione)"""
+        buffer = self.buffer
+        buffer += data
+        values = []
+        intervals = []
+        position = 0
+        end = len(buffer)
+
+        with memoryview(buffer) as view:
+            while True:
+                start = buffer.find(SYNC, position)
+                if start < 0:
+                    # Tiene l'ultimo byte: potrebbe essere l'inizio di un sync
+                    keep = end - 1 if end and buffer[-1] == SYNC[0] else end
+                    self.skipped_bytes += keep - position
+                    position = keep
+                    break
+                self.skipped_bytes += start - position
+                if end - start < len(SYNC) + HEADER.size:
+                    position = start
+                    break
+
+                flags, count, seq, interval_us = HEADER.unpack_from(buffer, start + len(SYNC))
+                frame_end = start + FRAME_OVERHEAD + count * 2
+                if frame_end > end:
+                    position = start
+                    break
+
+                crc = binascii.crc_hqx(view[start + len(SYNC):frame_end - CRC.size], 0xFFFF)
+                if crc != CRC.unpack_from(buffer, frame_end - CRC.size)[0]:
+                    # Sync falso o frame corrotto: si riparte dal byte successivo
+                    self.crc_errors += 1
+                    position = start + 1
+                    continue
+
+                if self.last_seq is not None and seq != (self.last_seq + 1) & 0xFFFF:
+                    self.sequence_gaps += 1
+                    self.missing_frames += (seq - self.last_seq - 1) & 0xFFFF
+                self.last_seq = seq
+                self.frames += 1
+
+                samples = np.frombuffer(view[start + len(SYNC) + HEADER.size:frame_end - CRC.size],
+                                        dtype=SAMPLE_DTYPE).astype(np.float64)
+                if not flags & FLAG_RAW:
+                    samples /= 1000.0
+                values.append(samples)
+                intervals.append(np.full(count, interval_us * 1e-6))
+                position = frame_end
+
+        del buffer[:position]
+        if not values:
+            return EMPTY, None
+
+        values = np.concatenate(values)
+        # Campioni equispaziati: l'ultimo è il più recente
+        steps = np.concatenate(intervals)
+        ages = np.concatenate((np.cumsum(steps[:0:-1])[::-1], [0.0]))
+        return values, ages
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "crc_errors": self.crc_errors,
+            "sequence_gaps": self.sequence_gaps,
+            "missing_frames": self.missing_frames,
+        }
+
+
+class AutoDetectParser:
+    """Riconosce il protocollo dai primi dati: un frame binario valido o righe numeriche"""
+
+    name = "auto"
+
+    def __init__(self):
+        self.parser = None
+        self.probe = b""
+
+    @property
+    def detected(self):
+        return self.parser.name if self.parser else None
+
+    def feed(self, data):
+        if self.parser is not None:
+            return self.parser.feed(data)
+
+        self.probe += data
+        binary = BinaryFrameParser()
+        values, ages = binary.feed(self.probe)
+        if binary.frames:
+            self.parser = binary
+            self.probe = b""
+            return values, ages
+
+        ascii = AsciiLineParser()
+        values, ages = ascii.feed(self.probe)
+        if len(values) >= 2 or len(self.probe) > AUTODETECT_LIMIT:
+            self.parser = ascii
+            self.probe = b""
+            return values, ages
+        return EMPTY, None
+
+    def stats(self):
+        stats = self.parser.stats() if self.parser else {}
+        return stats
+
+
+PARSERS = {
+    "ascii": AsciiLineParser,
+    "binary": BinaryFrameParser,
+    "auto": AutoDetectParser,
+}
+
+
+def make_parser(protocol):
+    """Parser per il protocollo richiesto: ascii, binary o auto"""
+    return PARSERS[protocol]()
@@ -0,0 +1,376 @@
+"""Registrazione delle sessioni di misura e riproduzione da file mappato in memoria
+
+Formato (little endian):
+    header  32 byte   magic, versione, dimensione record, ora di creazione
+    record  16 byte   tempo monotono f8 | valore f4 | tipo u1 | riempimento
+    indice  32 byte   per sessione: primo record, numero di record, ora di inizio, picco
+    footer  24 byte   magic, numero di record, numero di sessioni
+I record sono solo aggiunti; indice e footer vengono riscritti in coda a ogni fine sessione.
+Un file senza footer (processo interrotto) viene recuperato rileggendo i record.
+Nel gioco le scritture passano da RecorderThread: il loop di rendering non tocca il disco.
+"""
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+FILE_MAGIC = b"APREC\x00\x00\x00"
+FOOTER_MAGIC = b"APIDX\x00\x00\x00"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<8sHHd")
+HEADER_SIZE = 32
+FOOTER = struct.Struct("<8sQQ")
+
+RECORD = np.dtype([("time", "<f8"), ("value", "<f4"), ("kind", "u1"), ("pad", "V3")])
+INDEX_ENTRY = np.dtype([("first", "<u8"), ("count", "<u8"), ("wall_time", "<f8"), ("peak", "<f4"),
+                        ("pad", "V4")])
+
+# Tipi di record
+KIND_SAMPLE = 0
+KIND_STATE = 1            # valore = nuovo stato
+KIND_SESSION_START = 2    # valore = stato iniziale
+KIND_SESSION_END = 3      # valore = picco misurato
+
+# File di registrazione predefinito
+RECORDING_FILE = "sessions.rec"
+
+# Blocchi di campioni in attesa di scrittura: oltre questo limite (disco lento) i nuovi vengono
+# scartati; inizio, transizioni e fine sessione vengono sempre accodati
+RECORDER_QUEUE_SIZE = 1024
+
+# Pausa tra due sessioni riprodotte (secondi del tempo di riproduzione) e passo del thread
+REPLAY_GAP = 2.0
+REPLAY_TICK = 0.005
+
+
+def rebuild_index(records, wall_time=0.0):
+    """Ricostruisce l'indice delle sessioni scorrendo i record (file senza footer)"""
+    kinds = records["kind"]
+    starts = np.flatnonzero(kinds == KIND_SESSION_START)
+    index = np.zeros(len(starts), dtype=INDEX_ENTRY)
+    for i, first in enumerate(starts):
+        last = starts[i + 1] if i + 1 < len(starts) else len(records)
+        ends = np.flatnonzero(kinds[first:last] == KIND_SESSION_END)
+        index[i]["first"] = first
+        index[i]["count"] = last - first
+        index[i]["wall_time"] = wall_time
+        if len(ends):
+            index[i]["peak"] = records["value"][first + ends[-1]]
+    return index
+
+
+def read_layout(data, size):
+    """Numero di record e indice (o None se il footer manca) da un buffer del file"""
+    magic, version, record_size, created = HEADER.unpack_from(data, 0)
+    if magic != FILE_MAGIC or version != FORMAT_VERSION or record_size != RECORD.itemsize:
+        raise ValueError("File di registrazione non valido o di versione diversa")
+    if size >= HEADER_SIZE + FOOTER.size:
+        magic, count, sessions = FOOTER.unpack_from(data, size - FOOTER.size)
+        index_offset = HEADER_SIZE + count * RECORD.itemsize
+        if magic == FOOTER_MAGIC and index_offset + sessions * INDEX_ENTRY.itemsize + FOOTER.size == size:
+            return count, created, np.frombuffer(data, INDEX_ENTRY, sessions, index_offset)
+    return (size - HEADER_SIZE) // RECORD.itemsize, created, None
+
+
+class SessionRecorder:
+    """Registra in coda al file i campioni grezzi e le transizioni di stato di ogni sessione"""
+
+    def __init__(self, path=RECORDING_FILE):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.index = []
+        self.session_first = None
+        self.session_wall_time = 0.0
+        self.open()
+
+    @property
+    def active(self):
+        """True durante una sessione"""
+        return self.session_first is not None
+
+    def open(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER_SIZE:
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(FILE_MAGIC, FORMAT_VERSION, RECORD.itemsize, time.time()).ljust(HEADER_SIZE, b"\0"))
+
+        self.file = open(self.path, "r+b")
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self.count, created, index = read_layout(data, len(data))
+            recovered = index is None
+            if recovered:
+                records = np.frombuffer(data, RECORD, self.count, HEADER_SIZE)
+                index = rebuild_index(records, created)
+                if len(index) and not np.any(records["kind"][int(index[-1]["first"]):] == KIND_SESSION_END):
+                    print(f"Registrazione {self.path}: ultima sessione interrotta, recuperata senza picco")
+                del records
+            self.index = [(int(e["first"]), int(e["count"]), float(e["wall_time"]), float(e["peak"]))
+                          for e in index]
+            del index
+        # I nuovi record sovrascrivono indice e footer, che restano nel file fino al prossimo begin():
+        # un avvio senza sessioni lascia il file com'era
+        self.file.seek(HEADER_SIZE + self.count * RECORD.itemsize)
+        if recovered and self.index:
+            self.write_index()
+
+    def write(self, times, values, kind):
+        records = np.zeros(len(values), dtype=RECORD)
+        records["time"] = times
+        records["value"] = values
+        records["kind"] = kind
+        self.file.write(records.tobytes())
+        self.count += len(records)
+
+    def begin(self, timestamp, state):
+        """Inizio di una sessione (pressione del pulsante)"""
+        if self.active:
+            self.end(timestamp, 0.0)
+        # Toglie indice e footer: se il processo si interrompe il file resta di soli record
+        self.file.truncate()
+        self.session_first = self.count
+        self.session_wall_time = time.time()
+        self.write([timestamp], [state], KIND_SESSION_START)
+
+    def transition(self, timestamp, state):
+        if self.active:
+            self.write([timestamp], [state], KIND_STATE)
+
+    def samples(self, timestamps, values):
+        """Campioni grezzi del buffer (prima di filtri e calibrazione)"""
+        if self.active and len(values):
+            self.write(timestamps, values, KIND_SAMPLE)
+
+    def end(self, timestamp, peak):
+        """Fine sessione: aggiorna indice e footer in coda al file"""
+        if not self.active:
+            return
+        self.write([timestamp], [peak], KIND_SESSION_END)
+        self.index.append((self.session_first, self.count - self.session_first, self.session_wall_time, peak))
+        self.session_first = None
+        self.write_index()
+
+    def write_index(self):
+        position = self.file.tell()
+        index = np.zeros(len(self.index), dtype=INDEX_ENTRY)
+        for field, column in zip(("first", "count", "wall_time", "peak"), zip(*self.index)):
+            index[field] = column
+        self.file.write(index.tobytes())
+        self.file.write(FOOTER.pack(FOOTER_MAGIC, self.count, len(index)))
+        self.file.truncate()
+        self.file.flush()
+        self.file.seek(position)
+
+    def close(self):
+        if self.file:
+            if self.active:
+                self.end(time.monotonic(), 0.0)
+            self.file.close()
+            self.file = None
+
+
+class RecorderThread:
+    """Coda verso un thread che scrive su un SessionRecorder, con la stessa interfaccia:
+    le chiamate dal loop di rendering non toccano mai il disco e non bloccano"""
+
+    def __init__(self, recorder, queue_size=RECORDER_QUEUE_SIZE):
+        self.recorder = recorder
+        self.queue = queue.Queue()
+        self.queue_size = queue_size
+        self.thread = None
+
+        # Contatori
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def begin(self, timestamp, state):
+        self.queue.put((self.recorder.begin, (timestamp, state)))
+
+    def transition(self, timestamp, state):
+        self.queue.put((self.recorder.transition, (timestamp, state)))
+
+    def samples(self, timestamps, values):
+        """Accoda i campioni (array non più modificati dal chiamante); False se scartati"""
+        if not len(values):
+            return True
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += len(values)
+            return False
+        self.queue.put((self.recorder.samples, (timestamps, values)))
+        return True
+
+    def end(self, timestamp, peak):
+        self.queue.put((self.recorder.end, (timestamp, peak)))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            # None chiede la chiusura: le operazioni accodate prima vengono eseguite
+            if item is None:
+                return
+            method, args = item
+            try:
+                method(*args)
+            except OSError as e:
+                print(f"Errore scrittura registrazione: {e}")
+                self.errors += 1
+
+    def close(self, timeout=2.0):
+        """Esegue le scritture in coda, ferma il thread e chiude il file"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                print("Registrazione: scritture ancora in corso alla chiusura, l'ultima sessione verrà recuperata al prossimo avvio")
+                return
+            self.thread = None
+        self.recorder.close()
+        if self.dropped or self.errors:
+            print(f"Registrazione: {self.dropped} campioni scartati, {self.errors} errori")
+
+
+class Recording:
+    """Registrazione in sola lettura: i record sono una vista NumPy sul file mappato, senza copie"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count, self.created, index = read_layout(self.map, len(self.map))
+        self.records = np.frombuffer(self.map, RECORD, count, HEADER_SIZE)
+        self.index = rebuild_index(self.records, self.created) if index is None else index
+
+    def __len__(self):
+        return len(self.index)
+
+    def session(self, number):
+        """Record di una sessione (vista sul file)"""
+        entry = self.index[number]
+        return self.records[int(entry["first"]):int(entry["first"] + entry["count"])]
+
+    def samples(self, number):
+        """(timestamps, valori) dei campioni di una sessione"""
+        records = self.session(number)
+        samples = records[records["kind"] == KIND_SAMPLE]
+        return samples["time"], samples["value"].astype(np.float64)
+
+    def close(self):
+        # Le viste NumPy tengono il buffer esportato: vanno rilasciate prima della mappa
+        self.records = self.index = None
+        self.map.close()
+
+
+class ScaledClock:
+    """Tempo monotono accelerato: con speed > 1 stato, filtri e riproduzione vanno più veloci"""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.origin = time.monotonic()
+
+    def __call__(self):
+        return self.origin + (time.monotonic() - self.origin) * self.speed
+
+
+class ReplaySource:
+    """Sorgente di campioni da una registrazione, al posto del sensore: scrive nel buffer circolare
+    come SerialReader e chiama on_session all'inizio di ogni sessione (come il pulsante)"""
+
+    def __init__(self, path, ring, clock=time.monotonic, speed=1.0, loop=False, on_session=None):
+        self.recording = Recording(path)
+        self.ring = ring
+        self.clock = clock
+        self.speed = speed
+        self.loop = loop
+        self.on_session = on_session
+        self.current = None
+        self.samples = 0
+        self.sessions = 0
+        self.running = False
+        self.thread = None
+
+    @property
+    def connected(self):
+        return self.running
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def sleep_until(self, due):
+        """Attende fino all'istante due del tempo di riproduzione"""
+        while self.running:
+            remaining = due - self.clock()
+            if remaining <= 0:
+                return
+            time.sleep(min(REPLAY_TICK, remaining / self.speed))
+
+    def play(self, number):
+        records = self.recording.session(number)
+        if len(records) == 0:
+            return
+        times = records["time"]
+        mask = records["kind"] == KIND_SAMPLE
+        base = self.clock() - times[0]
+        self.current = number
+        if self.on_session:
+            self.on_session(number)
+
+        position = 0
+        while self.running and position < len(records):
+            end = int(np.searchsorted(times, self.clock() - base, side="right"))
+            if end > position:
+                batch = mask[position:end]
+                self.ring.extend(times[position:end][batch] + base,
+                                 records["value"][position:end][batch])
+                self.samples += int(np.count_nonzero(batch))
+                position = end
+            else:
+                self.sleep_until(times[position] + base)
+        self.sessions += 1
+
+    def run(self):
+        while self.running:
+            played = self.samples
+            for number in range(len(self.recording)):
+                if not self.running:
+                    break
+                self.play(number)
+                self.sleep_until(self.clock() + REPLAY_GAP)
+            if self.running and self.samples == played:
+                # Registrazione senza campioni: ripeterla girerebbe a vuoto, si torna alla modalità demo
+                print(f"Nessun campione in {self.recording.path} - riproduzione terminata")
+                break
+            if not self.loop:
+                break
+        self.current = None
+        self.running = False
+
+    def status_text(self):
+        if self.current is not None:
+            return f"Riproduzione {os.path.basename(self.recording.path)}: sessione {self.current + 1}/{len(self.recording)}"
+        return f"Riproduzione {os.path.basename(self.recording.path)} terminata"
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "sessions": self.sessions,
+            "malformed": 0,
+            "dropped": self.ring.overruns,
+            "errors": 0,
+            "connections": 0,
+            "frames": 0,
+        }
@@ -0,0 +1,141 @@
+"""Archivio dei risultati: CSV in sola aggiunta scritto da un thread in background a blocchi"""
+import csv
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+# File dei risultati predefinito
+RESULTS_FILE = "results.csv"
+
+# Risultati in attesa di scrittura: oltre questo limite (disco lento) i nuovi vengono scartati
+RESULTS_QUEUE_SIZE = 1024
+
+# Risultati per blocco di scrittura e intervallo minimo tra due fsync (secondi)
+RESULTS_BATCH_SIZE = 64
+FSYNC_INTERVAL = 2.0
+
+RESULTS_HEADER = ["timestamp", "peak", "duration", "samples"]
+
+# Un test completato: ora di fine (epoch), picco in ‰, durata della lettura in secondi, campioni letti
+Result = namedtuple("Result", ["timestamp", "peak", "duration", "samples"])
+
+
+class ResultsLog:
+    """Coda verso un thread di scrittura: append() non tocca mai il disco e non blocca"""
+
+    def __init__(self, path=RESULTS_FILE, queue_size=RESULTS_QUEUE_SIZE, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.writer = None
+        self.thread = None
+
+        # Contatori
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(RESULTS_HEADER)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def append(self, result):
+        """Accoda un risultato; False se la coda è piena"""
+        try:
+            self.queue.put_nowait(result)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def write_batch(self, batch):
+        try:
+            self.writer.writerows(
+                (datetime.fromtimestamp(r.timestamp).isoformat(timespec="seconds"),
+                 f"{r.peak:.3f}", f"{r.duration:.2f}", r.samples)
+                for r in batch
+            )
+            self.file.flush()
+            self.written += len(batch)
+        except OSError as e:
+            print(f"Errore scrittura risultati: {e}")
+            self.errors += 1
+            self.dropped += len(batch)
+
+    def sync(self):
+        try:
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            print(f"Errore sincronizzazione risultati: {e}")
+            self.errors += 1
+
+    def run(self):
+        """Raccoglie i risultati in blocchi; fsync al massimo ogni fsync_interval secondi"""
+        last_sync = time.monotonic()
+        pending = False
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, last_sync + self.fsync_interval - time.monotonic()) if pending else None
+            try:
+                batch = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < RESULTS_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None chiede la chiusura: i risultati accodati prima vengono scritti
+            if None in batch:
+                stopping = True
+                batch = [r for r in batch if r is not None]
+
+            if batch:
+                self.write_batch(batch)
+                pending = True
+            if pending and (stopping or time.monotonic() - last_sync >= self.fsync_interval):
+                self.sync()
+                last_sync = time.monotonic()
+                pending = False
+
+    def close(self, timeout=2.0):
+        """Scrive i risultati in coda, sincronizza il file e ferma il thread"""
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("Coda dei risultati piena alla chiusura: alcuni risultati non sono stati salvati")
+        self.thread.join(timeout)
+        if not self.thread.is_alive():
+            self.file.close()
+        self.thread = None
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "errors": self.errors,
+                "pending": self.queue.qsize()}
+
+
+def read_results(path):
+    """Legge i risultati salvati in streaming; le righe non valide vengono saltate"""
+    try:
+        f = open(path, newline="", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for row in csv.reader(f):
+            if len(row) != len(RESULTS_HEADER) or row == RESULTS_HEADER:
+                continue
+            try:
+                yield Result(datetime.fromisoformat(row[0]).timestamp(), float(row[1]), float(row[2]), int(row[3]))
+            except ValueError:
+                continue
@@ -0,0 +1,374 @@
+"""Acquisizione dei campioni dal sensore via seriale"""
+import glob
+import threading
+import time
+
+import numpy as np
+import serial
+
+from protocol import make_parser
+
+# Campioni tenuti nel buffer circolare (a 500 Hz sono più di 16 secondi)
+SAMPLE_BUFFER_SIZE = 8192
+
+# Timeout di lettura della seriale: limita anche il tempo di arresto del thread
+SERIAL_READ_TIMEOUT = 0.1
+
+# Porte provate dalla connessione automatica: quelle configurate, poi i dispositivi USB trovati
+SERIAL_PORTS = ["COM3"]
+SERIAL_PORT_PATTERNS = ["/dev/ttyUSB*", "/dev/ttyACM*"]
+BAUD_RATES = [9600, 115200]
+
+# Tempo massimo per riconoscere un sensore su una porta/baud rate
+PROBE_TIMEOUT = 1.5
+
+# Attesa tra i tentativi di connessione: raddoppia a ogni giro fallito
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class SampleRing:
+    """Buffer circolare a dimensione fissa di campioni (timestamp monotono, valore)"""
+
+    def __init__(self, capacity=SAMPLE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        # Numero totale di campioni scritti: è anche il numero di sequenza del prossimo
+        self.count = 0
+        # Campioni sovrascritti prima di essere letti da snapshot()
+        self.overruns = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def extend(self, timestamps, values):
+        """Aggiunge un blocco di campioni con un'unica acquisizione del lock"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+        with self.lock:
+            start = (self.count + n - len(values)) % self.capacity
+            first = min(len(values), self.capacity - start)
+            self.timestamps[start:start + first] = timestamps[:first]
+            self.values[start:start + first] = values[:first]
+            if first < len(values):
+                self.timestamps[:len(values) - first] = timestamps[first:]
+                self.values[:len(values) - first] = values[first:]
+            self.count += n
+
+    def push(self, timestamp, value):
+        """Aggiunge un singolo campione"""
+        with self.lock:
+            index = self.count % self.capacity
+            self.timestamps[index] = timestamp
+            self.values[index] = value
+            self.count += 1
+
+    def latest(self):
+        """Ultimo campione (timestamp, valore) oppure None"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            index = (self.count - 1) % self.capacity
+            return self.timestamps[index], self.values[index]
+
+    def snapshot(self, since=0):
+        """Copia dei campioni con sequenza >= since: (prossima sequenza, timestamps, valori)"""
+        with self.lock:
+            count = self.count
+            oldest = max(0, count - self.capacity)
+            if since < oldest:
+                self.overruns += oldest - since
+                since = oldest
+            n = count - since
+            start = since % self.capacity
+            end = start + n
+            if end <= self.capacity:
+                timestamps = self.timestamps[start:end].copy()
+                values = self.values[start:end].copy()
+            else:
+                wrap = end - self.capacity
+                timestamps = np.concatenate((self.timestamps[start:], self.timestamps[:wrap]))
+                values = np.concatenate((self.values[start:], self.values[:wrap]))
+        return count, timestamps, values
+
+
+class SerialReader:
+    """Thread che svuota la porta seriale nel buffer circolare (righe ASCII o frame binari)"""
+
+    def __init__(self, ser, ring, max_value, protocol="auto"):
+        self.ser = ser
+        self.ring = ring
+        self.max_value = max_value
+        self.parser = make_parser(protocol)
+        self.running = False
+        self.thread = None
+
+        # Contatori
+        self.samples = 0
+        self.out_of_range = 0
+        self.errors = 0
+
+    @property
+    def protocol(self):
+        """Protocollo in uso (None finché il riconoscimento automatico non ha deciso)"""
+        return getattr(self.parser, "detected", self.parser.name)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+
+    def run(self):
+        """Legge tutto ciò che è disponibile; la read blocca al massimo per il timeout della porta.
+        Termina su errore di I/O (es. cavo scollegato)."""
+        last_read = time.monotonic()
+        while self.running:
+            try:
+                chunk = self.ser.read(max(1, self.ser.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                print(f"Errore lettura seriale: {e}")
+                self.errors += 1
+                self.running = False
+                break
+            now = time.monotonic()
+            if chunk:
+                self.process(chunk, last_read, now)
+            last_read = now
+
+    def process(self, chunk, last_read, now):
+        """Interpreta un blocco letto tra last_read e now e ne mette i campioni validi nel buffer"""
+        values, ages = self.parser.feed(chunk)
+        if len(values):
+            valid = (values >= 0) & (values <= self.max_value)
+            if not valid.all():
+                self.out_of_range += int(len(values) - np.count_nonzero(valid))
+                values = values[valid]
+                ages = ages[valid] if ages is not None else None
+        if len(values):
+            if ages is None:
+                # Le righe di un blocco sono arrivate dopo la read precedente:
+                # i timestamp vengono distribuiti in quell'intervallo (al massimo un timeout)
+                start = max(last_read, now - SERIAL_READ_TIMEOUT)
+                timestamps = np.linspace(start, now, len(values) + 1)[1:]
+            else:
+                # I frame binari dichiarano l'intervallo di campionamento
+                timestamps = now - ages
+            self.samples += len(values)
+            self.ring.extend(timestamps, values)
+
+    def stats(self):
+        """Contatori dell'acquisizione"""
+        stats = {
+            "samples": self.samples,
+            "malformed": 0,
+            "out_of_range": self.out_of_range,
+            "errors": self.errors,
+        }
+        stats.update(self.parser.stats())
+        return stats
+
+
+class SensorConnection:
+    """Ricerca della porta, connessione e riconnessione con backoff esponenziale, in background"""
+
+    DISCONNECTED = "disconnesso"
+    SEARCHING = "ricerca"
+    CONNECTED = "connesso"
+
+    def __init__(self, ring, max_value, ports=None, baud_rates=None, serial_factory=serial.Serial,
+                 protocol="auto", on_state=None):
+        self.ring = ring
+        self.max_value = max_value
+        self.ports = list(SERIAL_PORTS if ports is None else ports)
+        self.baud_rates = list(baud_rates or BAUD_RATES)
+        self.serial_factory = serial_factory
+        # Protocollo richiesto (ascii, binary, auto) e quello riconosciuto sulla porta corrente
+        self.protocol = protocol
+        self.detected_protocol = None
+        # Byte letti durante il riconoscimento della porta accettata, con l'intervallo di lettura
+        self.probe_data = None
+        # Chiamata dal thread di connessione con True/False a ogni connessione e disconnessione
+        self.on_state = on_state
+
+        self.state = self.DISCONNECTED
+        self.port = None
+        self.baud_rate = None
+        self.ser = None
+        self.reader = None
+        self.attempts = 0
+        self.connections = 0
+        self.retry_at = None
+
+        # Contatori dei lettori precedenti (una connessione = un SerialReader)
+        self.totals = {"samples": 0, "malformed": 0, "out_of_range": 0, "errors": 0,
+                       "frames": 0, "crc_errors": 0, "sequence_gaps": 0, "missing_frames": 0}
+
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+        # Protegge il passaggio dei contatori dal lettore corrente a totals
+        self.reader_lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self.state == self.CONNECTED
+
+    def start(self):
+        """Avvia la ricerca in background: non blocca l'avvio dell'interfaccia"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.reader:
+            self.reader.stop()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+        self.close()
+
+    def candidates(self):
+        """Porte configurate più i dispositivi USB seriali presenti"""
+        ports = list(self.ports)
+        for pattern in SERIAL_PORT_PATTERNS:
+            for port in sorted(glob.glob(pattern)):
+                if port not in ports:
+                    ports.append(port)
+        return ports
+
+    def probe(self, port, baud_rate):
+        """Apre la porta e verifica che arrivino campioni validi; restituisce la Serial o None.
+        Una porta silenziosa non viene accettata: il giro successivo la riprova (con il backoff)."""
+        try:
+            ser = self.serial_factory(port, baud_rate, timeout=SERIAL_READ_TIMEOUT)
+        except (serial.SerialException, OSError, ValueError):
+            return None
+
+        parser = make_parser(self.protocol)
+        received = bytearray()
+        self.detected_protocol = None
+        last_read = time.monotonic()
+        deadline = last_read + PROBE_TIMEOUT
+        try:
+            while self.running and time.monotonic() < deadline:
+                chunk = ser.read(max(1, ser.in_waiting))
+                now = time.monotonic()
+                received += chunk
+                values, _ = parser.feed(chunk)
+                if len(values):
+                    self.detected_protocol = getattr(parser, "detected", parser.name)
+                    # I byte letti qui vengono rielaborati dal lettore: i campioni finiscono nel buffer
+                    self.probe_data = (bytes(received), last_read, now)
+                    return ser
+                if not chunk:
+                    last_read = now
+        except (serial.SerialException, OSError):
+            pass
+        ser.close()
+        return None
+
+    def connect(self):
+        """Un giro su tutte le porte e i baud rate; True se connesso"""
+        for port in self.candidates():
+            for baud_rate in self.baud_rates:
+                if not self.running:
+                    return False
+                ser = self.probe(port, baud_rate)
+                if ser is not None:
+                    self.ser = ser
+                    self.port = port
+                    self.baud_rate = baud_rate
+                    self.connections += 1
+                    print(f"Connessione seriale stabilita su {port} a {baud_rate} baud ({self.detected_protocol})")
+                    return True
+        return False
+
+    def close(self):
+        if self.ser:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.ser = None
+
+    def collect_reader_stats(self):
+        with self.reader_lock:
+            if self.reader:
+                for key, value in self.reader.stats().items():
+                    self.totals[key] = self.totals.get(key, 0) + value
+                self.reader = None
+
+    def run(self):
+        delay = RECONNECT_MIN_DELAY
+        while self.running:
+            self.state = self.SEARCHING
+            self.attempts += 1
+            if self.connect():
+                self.state = self.CONNECTED
+                if self.on_state:
+                    self.on_state(True)
+                self.retry_at = None
+                delay = RECONNECT_MIN_DELAY
+                # Legge in questo thread fino alla disconnessione
+                self.reader = SerialReader(self.ser, self.ring, self.max_value,
+                                           self.detected_protocol or self.protocol)
+                self.reader.running = True
+                self.reader.process(*self.probe_data)
+                self.probe_data = None
+                self.reader.run()
+                # Prima lo stato, poi il lettore: chi vede CONNECTED non trova mai reader già tolto
+                self.state = self.DISCONNECTED
+                self.collect_reader_stats()
+                self.close()
+                if self.running:
+                    print("Sensore disconnesso - nuovo tentativo di connessione")
+                if self.on_state:
+                    self.on_state(False)
+                continue
+
+            self.state = self.DISCONNECTED
+            self.retry_at = time.monotonic() + delay
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def status_text(self):
+        """Descrizione dello stato della connessione da mostrare a schermo"""
+        reader = self.reader
+        if self.state == self.CONNECTED:
+            protocol = reader.protocol if reader else None
+            if protocol:
+                return f"Sensore connesso: {self.port} ({self.baud_rate} baud, {protocol})"
+            return f"Sensore connesso: {self.port} ({self.baud_rate} baud)"
+        if self.state == self.SEARCHING:
+            return f"Ricerca sensore... (tentativo {self.attempts})"
+        if self.retry_at is not None:
+            remaining = max(0.0, self.retry_at - time.monotonic())
+            return f"Sensore non connesso - nuovo tentativo tra {remaining:.0f}s"
+        return "Sensore non connesso"
+
+    def stats(self):
+        """Contatori cumulativi di tutte le connessioni"""
+        with self.reader_lock:
+            totals = dict(self.totals)
+            if self.reader:
+                for key, value in self.reader.stats().items():
+                    totals[key] = totals.get(key, 0) + value
+        # Persi: fuori scala o sovrascritti nel buffer prima della lettura
+        totals["dropped"] = totals["out_of_range"] + self.ring.overruns
+        totals["connections"] = self.connections
+        return totals
@@ -0,0 +1,375 @@
+"""Simulatore del sensore su pseudo-terminale, per test senza hardware e prove di durata
+
+Uso:
+    python simulator.py [--rate HZ] [--protocol ascii|binary]     sensore simulato su SIMULATOR_LINK
+    python game.py --port /tmp/alcoholpunch-sensor                   (oppure python game.py --simulate)
+    python simulator.py --soak 3600 --rate 2000 --max-drop 0.01      prova di durata con latenza e perdite
+"""
+import argparse
+import bisect
+import os
+import threading
+import time
+import tty
+from collections import deque
+
+import numpy as np
+
+import protocol
+from calibration import CalibrationCurve, CalibrationStage
+from filters import SignalPipeline
+from sensor import SampleRing, SensorConnection
+
+# Percorso stabile del sensore simulato (link simbolico al pty corrente, cambia a ogni riconnessione)
+SIMULATOR_LINK = "/tmp/alcoholpunch-sensor"
+
+# Frequenza di campionamento predefinita e passo del thread di trasmissione
+SIMULATOR_RATE = 500
+SIMULATOR_TICK = 0.005
+
+# Soffi: uno ogni BREATH_INTERVAL secondi (±30%), salita e discesa esponenziali
+BREATH_INTERVAL = 8.0
+BREATH_DURATION = 3.0
+BREATH_RISE_TAU = 0.4
+BREATH_FALL_TAU = 1.5
+BREATH_MAX_PEAK = 2.3
+
+# Rumore gaussiano (‰) e deriva lenta dell'aria ambiente
+SIMULATOR_NOISE = 0.01
+AMBIENT_LEVEL = 0.05
+
+# Byte in attesa di trasmissione oltre i quali i nuovi blocchi vengono scartati (UART piena)
+OUTGOING_LIMIT = 65536
+
+# Prova di durata: marcatori di latenza, frequenza di lettura (come l'interfaccia) e report
+SOAK_MARKER_INTERVAL = 0.25
+SOAK_POLL_INTERVAL = 1 / 60
+SOAK_REPORT_INTERVAL = 10.0
+
+
+class BreathModel:
+    """Curve di soffio realistiche: salita rapida, plateau, discesa lenta, più rumore"""
+
+    def __init__(self, rate=SIMULATOR_RATE, breath_interval=BREATH_INTERVAL, noise=SIMULATOR_NOISE,
+                 seed=None):
+        self.rate = rate
+        self.breath_interval = breath_interval
+        self.noise = noise
+        # Generatori separati: la sequenza non dipende dalla dimensione dei blocchi richiesti
+        self.noise_rng, self.breath_rng = np.random.default_rng(seed).spawn(2)
+        self.index = 0
+        self.breath_start = None
+        self.peak = 0.0
+        self.next_breath = self.schedule(0.0)
+
+    def schedule(self, now):
+        if self.breath_interval <= 0:
+            return float("inf")
+        return now + self.breath_interval * self.breath_rng.uniform(0.7, 1.3)
+
+    def generate(self, n):
+        """Prossimi n campioni in ‰ BAC"""
+        t = (self.index + np.arange(n)) / self.rate
+        self.index += n
+        values = AMBIENT_LEVEL + self.noise_rng.normal(0, self.noise, n)
+
+        # Il blocco può contenere l'inizio di uno o più soffi
+        position = 0
+        while position < n:
+            end = int(np.searchsorted(t, self.next_breath))
+            if self.breath_start is not None and end > position:
+                elapsed = t[position:end] - self.breath_start
+                rise = 1 - np.exp(-elapsed / BREATH_RISE_TAU)
+                fall = np.exp(-np.maximum(elapsed - BREATH_DURATION, 0) / BREATH_FALL_TAU)
+                values[position:end] += self.peak * rise * fall
+            if end >= n:
+                break
+            self.breath_start = self.next_breath
+            self.peak = self.breath_rng.uniform(0.1, BREATH_MAX_PEAK)
+            self.next_breath = self.schedule(self.breath_start + BREATH_DURATION)
+            position = end
+        return values
+
+
+class PtySensorSimulator:
+    """Sensore simulato: scrive campioni, righe spazzatura e disconnessioni su un pty Linux"""
+
+    def __init__(self, link=SIMULATOR_LINK, rate=SIMULATOR_RATE, protocol_name="ascii", model=None,
+                 garbage_rate=0.5, disconnect_interval=0.0, disconnect_duration=2.0,
+                 calibration=None, marker_interval=0.0, seed=None):
+        self.link = link
+        self.rate = rate
+        self.protocol_name = protocol_name
+        self.model = model or BreathModel(rate, seed=seed)
+        self.garbage_rate = garbage_rate
+        self.disconnect_interval = disconnect_interval
+        self.disconnect_duration = disconnect_duration
+        # Con una curva di calibrazione il sensore invia conteggi ADC come quello vero
+        self.calibration = calibration
+        self.rng = np.random.default_rng(None if seed is None else seed + 1)
+
+        # Marcatore di latenza: valore che i campioni normali non raggiungono mai
+        if calibration is not None:
+            self.marker = float(calibration.max_raw - 1)
+            self.ceiling = float(calibration.max_raw - 2)
+        else:
+            self.marker = 2.499
+            self.ceiling = 2.45
+        self.marker_interval = marker_interval
+        self.markers = deque(maxlen=1024)
+        self.markers_lock = threading.Lock()
+
+        self.master = None
+        self.slave = None
+        self.outgoing = bytearray()
+        self.seq = 0
+        self.running = False
+        self.thread = None
+
+        # Contatori
+        self.samples = 0
+        self.garbage = 0
+        self.overflow = 0
+        self.disconnects = 0
+
+    def open(self):
+        """Nuovo pty in modalità raw; il link simbolico viene sostituito in modo atomico"""
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        temporary = f"{self.link}.{os.getpid()}"
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        os.symlink(os.ttyname(self.slave), temporary)
+        os.replace(temporary, self.link)
+        self.outgoing.clear()
+
+    def close(self):
+        if os.path.islink(self.link):
+            os.remove(self.link)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def start(self):
+        self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.close()
+
+    def to_wire(self, values):
+        """‰ BAC -> unità trasmesse dal sensore (conteggi ADC se calibrato), sotto il marcatore"""
+        if self.calibration is not None:
+            values = np.rint(np.interp(values, self.calibration.bac_points, self.calibration.raw_points))
+        return np.clip(values, 0, self.ceiling)
+
+    def encode(self, values):
+        """Campioni -> byte nel protocollo scelto"""
+        raw = self.calibration is not None
+        if self.protocol_name == "binary":
+            if not raw:
+                values = np.rint(values * 1000)
+            flags = protocol.FLAG_RAW if raw else 0
+            frames = []
+            for start in range(0, len(values), protocol.MAX_FRAME_SAMPLES):
+                frames.append(protocol.encode_frame(self.seq, values[start:start + protocol.MAX_FRAME_SAMPLES],
+                                                    int(1e6 / self.rate), flags))
+                self.seq += 1
+            return b"".join(frames)
+        fmt = "{:.0f}\n" if raw else "{:.3f}\n"
+        return "".join(map(fmt.format, values)).encode()
+
+    def garbage_bytes(self):
+        if self.protocol_name == "binary":
+            return self.rng.integers(0, 256, int(self.rng.integers(4, 32)), dtype=np.uint8).tobytes()
+        return b"#" + bytes(self.rng.integers(33, 127, int(self.rng.integers(4, 32)), dtype=np.uint8)) + b"\n"
+
+    def send(self, data):
+        """Scrive sul pty senza bloccarsi; il resto viene ritentato al passo successivo"""
+        self.outgoing += data
+        try:
+            written = os.write(self.master, self.outgoing)
+        except BlockingIOError:
+            written = 0
+        del self.outgoing[:written]
+
+    def run(self):
+        start = time.monotonic()
+        generated = 0
+        next_marker = start + self.marker_interval
+        next_disconnect = start + self.disconnect_interval
+        while self.running:
+            time.sleep(SIMULATOR_TICK)
+            now = time.monotonic()
+
+            if self.disconnect_interval > 0 and now >= next_disconnect:
+                # Cavo scollegato: il link sparisce per disconnect_duration secondi
+                self.disconnects += 1
+                self.close()
+                time.sleep(self.disconnect_duration)
+                if not self.running:
+                    break
+                self.open()
+                now = time.monotonic()
+                next_disconnect = now + self.disconnect_interval
+                # I campioni del periodo scollegato non vengono recuperati
+                generated = int((now - start) * self.rate)
+                continue
+
+            n = int((now - start) * self.rate) - generated
+            if n <= 0:
+                continue
+            generated += n
+            values = self.to_wire(self.model.generate(n))
+
+            if self.marker_interval > 0 and now >= next_marker:
+                values[-1] = self.marker
+                next_marker = now + self.marker_interval
+                with self.markers_lock:
+                    self.markers.append(now)
+
+            data = self.encode(values)
+            if self.garbage_rate > 0 and self.rng.random() < self.garbage_rate * SIMULATOR_TICK:
+                self.garbage += 1
+                data += self.garbage_bytes()
+
+            if len(self.outgoing) > OUTGOING_LIMIT:
+                self.overflow += n
+                data = b""
+            else:
+                self.samples += n
+            self.send(data)
+
+    def marker_sent_before(self, timestamp):
+        """Istante dell'ultimo marcatore inviato prima di timestamp (None se non noto)"""
+        with self.markers_lock:
+            markers = list(self.markers)
+        index = bisect.bisect_right(markers, timestamp)
+        return markers[index - 1] if index else None
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "garbage": self.garbage,
+            "overflow": self.overflow,
+            "disconnects": self.disconnects,
+        }
+
+
+def percentiles(latencies):
+    """p50, p99 e massimo in millisecondi"""
+    if not latencies:
+        return "n/d"
+    p50, p99, peak = np.percentile(np.array(latencies) * 1000, [50, 99, 100])
+    return f"p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  max {peak:7.2f} ms"
+
+
+def soak(simulator, duration, max_value, calibration=None, protocol_name="auto"):
+    """Prova di durata: acquisizione e filtri come nell'interfaccia, con latenza e perdite.
+    La latenza va dall'invio di un marcatore alla lettura dal buffer, come farebbe l'interfaccia;
+    ogni marcatore è abbinato all'ultimo inviato, quindi la misura è valida sotto SOAK_MARKER_INTERVAL.
+    Restituisce (frazione persa, p99 della latenza in secondi)."""
+    ring = SampleRing()
+    connection = SensorConnection(ring, max_value, [simulator.link], protocol=protocol_name)
+    connection.candidates = lambda: [simulator.link]
+    pipeline = SignalPipeline(calibration=calibration)
+
+    simulator.start()
+    connection.start()
+    start = time.monotonic()
+    next_report = start + SOAK_REPORT_INTERVAL
+    seq = 0
+    received = 0
+    latencies = []
+    try:
+        while time.monotonic() - start < duration:
+            time.sleep(SOAK_POLL_INTERVAL)
+            seq, timestamps, values = ring.snapshot(seq)
+            now = time.monotonic()
+            received += len(values)
+            pipeline.process(timestamps, values)
+            for _ in np.flatnonzero(values == simulator.marker):
+                sent = simulator.marker_sent_before(now)
+                if sent is not None:
+                    latencies.append(now - sent)
+
+            if now >= next_report:
+                next_report += SOAK_REPORT_INTERVAL
+                print(f"[{now - start:7.0f}s] ricevuti {received}/{simulator.samples}  "
+                      f"latenza {percentiles(latencies)}  {connection.status_text()}")
+    except KeyboardInterrupt:
+        print("\nInterrotto dall'utente")
+    finally:
+        connection.stop()
+        simulator.stop()
+
+    sent = simulator.samples
+    dropped = 1 - received / sent if sent else 0.0
+    print(f"Inviati {sent} campioni, ricevuti {received} (persi {dropped:.3%})")
+    print(f"Simulatore: {simulator.stats()}")
+    print(f"Acquisizione: {connection.stats()}")
+    print(f"Latenza: {percentiles(latencies)}")
+    p99 = float(np.percentile(latencies, 99)) if latencies else float("inf")
+    return dropped, p99
+
+
+def parse_args():
+    """Opzioni da riga di comando"""
+    parser = argparse.ArgumentParser(description="Sensore simulato su pseudo-terminale")
+    parser.add_argument("--link", default=SIMULATOR_LINK, help="percorso stabile del pty simulato")
+    parser.add_argument("--rate", type=int, default=SIMULATOR_RATE, help="campioni al secondo")
+    parser.add_argument("--protocol", choices=["ascii", "binary"], default="ascii")
+    parser.add_argument("--breath-interval", type=float, default=BREATH_INTERVAL,
+                        help="secondi medi tra due soffi (0 = nessun soffio)")
+    parser.add_argument("--noise", type=float, default=SIMULATOR_NOISE, help="deviazione standard del rumore (‰)")
+    parser.add_argument("--garbage-rate", type=float, default=0.5, help="righe spazzatura al secondo")
+    parser.add_argument("--disconnect-every", type=float, default=0.0,
+                        help="secondi tra due disconnessioni simulate (0 = mai)")
+    parser.add_argument("--disconnect-duration", type=float, default=2.0, help="durata di una disconnessione")
+    parser.add_argument("--calibration", metavar="FILE", help="invia conteggi ADC secondo questa curva")
+    parser.add_argument("--device", help="sensore da usare nel file di calibrazione")
+    parser.add_argument("--seed", type=int, help="seme per curve e rumore riproducibili")
+    parser.add_argument("--soak", type=float, metavar="SECONDI",
+                        help="prova di durata con acquisizione nello stesso processo")
+    parser.add_argument("--max-drop", type=float, help="con --soak: esce con errore oltre questa frazione persa")
+    parser.add_argument("--max-latency", type=float, help="con --soak: esce con errore oltre questo p99 (secondi)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    curve = CalibrationCurve.load(args.calibration, args.device) if args.calibration else None
+    model = BreathModel(args.rate, args.breath_interval, args.noise, args.seed)
+    simulator = PtySensorSimulator(args.link, args.rate, args.protocol, model, args.garbage_rate,
+                                   args.disconnect_every, args.disconnect_duration, curve,
+                                   SOAK_MARKER_INTERVAL if args.soak else 0.0, args.seed)
+
+    if args.soak:
+        stage = CalibrationStage(curve) if curve else None
+        max_value = curve.max_raw if curve else 2.5
+        dropped, p99 = soak(simulator, args.soak, max_value, stage, args.protocol)
+        failed = (args.max_drop is not None and dropped > args.max_drop) or \
+                 (args.max_latency is not None and p99 > args.max_latency)
+        raise SystemExit(1 if failed else 0)
+
+    simulator.start()
+    print(f"Sensore simulato su {simulator.link} ({args.rate} Hz, {args.protocol}) - Ctrl+C per uscire")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        print(f"Simulatore: {simulator.stats()}")
+
+
+if __name__ == "__main__":
+    main()
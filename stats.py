@@ -0,0 +1,75 @@
+"""Statistiche incrementali dei risultati: aggregati, classifica e conteggi per categoria"""
+import bisect
+import heapq
+from datetime import datetime, timedelta
+
+# Soglie di stato (‰ BAC): sobrio / attenzione / alterato / pericoloso
+STATUS_THRESHOLDS = (0.5, 1.5, 2.0)
+STATUS_LABELS = ("SOBRIO", "ATTENZIONE", "ALTERATO", "PERICOLOSO")
+
+# Posizioni mostrate in classifica
+LEADERBOARD_SIZE = 10
+
+# Ora locale in cui inizia una nuova serata (le statistiche ripartono da zero)
+NIGHT_RESET_HOUR = 12
+
+
+def status_index(value, thresholds=STATUS_THRESHOLDS):
+    """Categoria di un valore: 0 = sobrio ... len(thresholds) = pericoloso"""
+    return bisect.bisect_right(thresholds, value)
+
+
+def night_start(timestamp, reset_hour=NIGHT_RESET_HOUR):
+    """Inizio (epoch) della serata a cui appartiene timestamp"""
+    moment = datetime.fromtimestamp(timestamp)
+    start = moment.replace(hour=reset_hour, minute=0, second=0, microsecond=0)
+    if start > moment:
+        start -= timedelta(days=1)
+    return start.timestamp()
+
+
+class ResultStats:
+    """Aggregati aggiornati a ogni risultato in O(log n): media, migliori punteggi in un
+    min-heap di dimensione fissa e conteggi per categoria di stato"""
+
+    def __init__(self, since=0.0, top_size=LEADERBOARD_SIZE, thresholds=STATUS_THRESHOLDS):
+        self.since = since
+        self.top_size = top_size
+        self.thresholds = thresholds
+        self.count = 0
+        self.total = 0.0
+        self.heap = []
+        self.buckets = [0] * (len(thresholds) + 1)
+        # Incrementata a ogni risultato: chi disegna le statistiche la usa come chiave di cache
+        self.version = 0
+
+    @classmethod
+    def rebuild(cls, results, **kwargs):
+        """Ricostruisce le statistiche con una sola passata sui risultati salvati"""
+        stats = cls(**kwargs)
+        for result in results:
+            stats.add(result)
+        return stats
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, result):
+        """Aggiunge un risultato; False se precede l'inizio del periodo"""
+        if result.timestamp < self.since:
+            return False
+        self.count += 1
+        self.total += result.peak
+        self.buckets[status_index(result.peak, self.thresholds)] += 1
+        entry = (result.peak, result.timestamp)
+        if len(self.heap) < self.top_size:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+        self.version += 1
+        return True
+
+    def top(self):
+        """Migliori punteggi (picco, timestamp) in ordine decrescente"""
+        return sorted(self.heap, reverse=True)